@@ -0,0 +1,5 @@
+import logging
+
+# Progress is logged to the "lussi" logger, which is silent unless the application configures
+# logging (see lussi.instrumentation.enable_logging)
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,5 @@
+import sys
+
+from lussi.cli import main
+
+sys.exit(main())
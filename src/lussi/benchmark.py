@@ -0,0 +1,530 @@
+"""
+Benchmark the stack pipeline on synthetic survey files, without touching S3.
+
+Run like this:
+(.venv) hurricane:krijudato afraser$ python -m lussi.benchmark --rows 100000 --rows 1000000
+
+Each run appends one JSON line per stage (wall time and peak memory) to the results
+file, so runs on different commits can be compared with summarize_results().
+Use --engine polars to time the Polars engine, and --check-parity to build the stack
+with both engines and check that they write identical partition files.
+--transform-workers runs the pandas wide transforms on row shards in that many
+processes; with --check-parity the sharded build is compared as well.
+--check-imports runs the CLI commands in fresh interpreters and checks that they
+do not import modules they do not need, e.g. selenium for load.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+import filecmp
+import subprocess
+import contextlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from lussi.stackoverflow import (StackType, build_stack, build_wide_stack, databases, extract_vector_cols, languages,
+                                 load_stack, merge_years, platforms, post_build_mutations, stack_partitions,
+                                 stack_years, survey_schema)
+from lussi.instrumentation import max_rss_mb
+from lussi.snapshots import SnapshotStore
+from lussi.ziprecruiter import BASE_URL, JOB_URLS, SNAPSHOT_DIR, ZIP_FILENAME
+
+# Dataframe engines build_stack accepts
+ENGINES = ["pandas", "polars"]
+
+# Seconds between samples of Arrow's memory pool while measuring a stage
+ARROW_SAMPLE_INTERVAL = 0.001
+
+# Default file the benchmark results are appended to
+RESULTS_FN = "benchmark_results.jsonl"
+
+# CLI commands checked by --check-imports, with the modules each must not import
+import_checks = [
+    (["--help"], ["pandas", "selenium", "bs4"]),
+    (["info", "{data_dir}"], ["pandas", "selenium", "bs4"]),
+    (["load", "{data_dir}", "--stack", "wide"], ["selenium", "bs4", "polars"]),
+    (["load", "{data_dir}", "--stack", "zip"], ["selenium", "bs4", "polars"]),
+    (["build-zip", "{data_dir}", "--offline"], ["selenium", "bs4", "polars"])
+]
+
+# ZipRecruiter page saved as the snapshot of every job title, for check_imports' offline build-zip
+fixture_salary_page = """<html><body><table>
+<thead><tr><th>State</th><th>Annual Salary</th><th>Monthly Pay</th><th>Weekly Pay</th><th>Hourly Wage</th></tr></thead>
+<tbody><tr><td><a href="#">New York</a></td><td>$120,000</td><td>$10,000</td><td>$2,307</td><td>$57.69</td></tr>
+<tr><td><a href="#">Texas</a></td><td>$100,500</td><td>$8,375</td><td>$1,932</td><td>$48.32</td></tr></tbody>
+</table></body></html>"""
+
+# Script run in a fresh interpreter by check_imports: runs a CLI command and prints the modules it imported
+import_check_script = """
+import io, sys, json, contextlib
+from lussi.cli import main
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        main(json.loads(sys.argv[1]))
+    except SystemExit:
+        pass
+print(json.dumps(sorted(sys.modules)))
+"""
+
+# Rows generated and written per CSV chunk, to bound the generator's memory
+GENERATOR_CHUNK_ROWS = 500_000
+
+# Number of distinct multi-valued answers drawn from, roughly what a real survey year has
+DISTINCT_COMBINATIONS = 5_000
+
+# Answers for each common-schema column, written under the year's source column name
+value_pools = {
+    "OrgSize": ["2 to 9 employees", "10 to 19 employees", "20 to 99 employees", "100 to 499 employees",
+                "500 to 999 employees", "1,000 to 4,999 employees", "5,000 to 9,999 employees",
+                "10,000 or more employees", "Just me - I am a freelancer, sole proprietor, etc.", "I don't know"],
+    "Country": ["United States", "United States of America", "India", "Germany", "United Kingdom",
+                "United Kingdom of Great Britain and Northern Ireland", "Canada", "France", "Brazil", "Poland",
+                "Netherlands", "Australia", "Spain", "Italy", "Russian Federation", "Sweden", "South Africa"],
+    "Employment": ["Employed full-time", "Employed part-time", "Independent contractor, freelancer, or self-employed",
+                   "Not employed, but looking for work", "Not employed, and not looking for work", "Retired",
+                   "Student, full-time", "I prefer not to say"],
+    "Gender": ["Man", "Woman", "Male", "Female", "Non-binary, genderqueer, or gender non-conforming", "Prefer not to say"],
+    "EdLevel": ["Bachelor’s degree (B.A., B.S., B.Eng., etc.)", "Master’s degree (M.A., M.S., M.Eng., MBA, etc.)",
+                "Some college/university study without earning a degree", "Secondary school (e.g. American high school)",
+                "Associate degree (A.A., A.S., etc.)", "Other doctoral degree (Ph.D., Ed.D., etc.)",
+                "Professional degree (JD, MD, etc.)", "Primary/elementary school", "Something else",
+                "I never completed any formal education"],
+    "US_State": ["California", "New York", "Texas", "Washington", "Massachusetts", "Illinois", "Florida", "Colorado"],
+    "Age": ["Under 18 years old", "18-24 years old", "25-34 years old", "35-44 years old", "45-54 years old",
+            "55-64 years old", "65 years or older", "Prefer not to say"],
+    "DevType": ["Developer, full-stack", "Developer, back-end", "Data scientist or machine learning specialist",
+                "Engineer, data", "Data or business analyst", "Developer, front-end", "DevOps specialist"],
+    "Sexuality": ["Straight / Heterosexual", "Straight or heterosexual", "Bisexual", "Gay or Lesbian", "Queer",
+                  "Asexual", "Prefer not to say", "Prefer to self-describe:"],
+    "Ethnicity": ["White or of European descent", "White", "European", "South Asian", "East Asian",
+                  "Hispanic or Latino/a/x", "Black or of African descent", "Middle Eastern", "Prefer not to say",
+                  "I don’t know", "Multiracial"],
+    "YearsCodePro": ["Less than 1 year", "1", "2", "3", "4", "5", "7", "10", "12", "15", "20", "25", "More than 50 years",
+                     "0-2 years", "3-5 years", "6-8 years", "9-11 years", "12-14 years", "20 or more years"],
+    "LanguageWorkedWith": languages + ["C", "C#", "Go", "TypeScript", "Kotlin", "Bash/Shell/PowerShell", "HTML/CSS",
+                                       "Perl", "Haskell", "MATLAB", "Dart", "Elixir"],
+    "DatabaseWorkedWith": databases + ["Elasticsearch", "Cassandra", "DynamoDB", "Firebase", "Neo4j", "Couchbase"],
+    "PlatformWorkedWith": platforms + ["AWS", "Amazon Web Services (AWS)", "Docker", "Heroku", "DigitalOcean",
+                                       "MacOS", "Android", "Raspberry Pi", "Firebase"],
+}
+
+# Share of missing answers per column
+MISSING_RATE = 0.15
+
+
+def survey_columns(year):
+    """
+    Return (source column, common-schema column) pairs for a synthetic survey year,
+    i.e. the pre-rename names process_year reads for that year.
+    """
+    return list(survey_schema(year).source_columns().items())
+
+
+def generate_survey_chunk(year, rows, rng, missing=()):
+    """
+    Generate rows of one synthetic survey year as a DataFrame with the year's source column
+    names, leaving out the columns whose stack name is in missing.
+    """
+    sep = "; " if year == 2017 else ";"
+    data = {"Respondent": np.arange(rows)}
+    for source, target in survey_columns(year):
+        if target in missing:
+            continue
+        if target == "AnnualSalary":
+            salary = np.round(rng.lognormal(mean=11.1, sigma=0.7, size=rows), 0)
+            salary[rng.random(rows) < 0.35] = np.nan
+            data[source] = salary
+            continue
+        pool = value_pools[target]
+        if target.endswith("WorkedWith"):
+            # Draw from a fixed set of distinct combinations, like the real answers
+            combos = []
+            for _ in range(DISTINCT_COMBINATIONS):
+                picks = rng.choice(len(pool), size=rng.integers(1, 7), replace=False)
+                combos.append(sep.join(pool[i] for i in sorted(picks)))
+            pool = combos
+        values = np.array(pool, dtype=object)[rng.integers(0, len(pool), size=rows)]
+        values[rng.random(rows) < MISSING_RATE] = np.nan
+        data[source] = values
+    # Real surveys have dozens of unused columns; add a few so column pruning has work to do
+    for i in range(8):
+        data[f"Unused{i}"] = rng.integers(0, 5, size=rows)
+    return pd.DataFrame(data)
+
+
+def generate_surveys(root: str, rows: int, years=None, seed: int = 0, missing=None):
+    """
+    Write synthetic survey_results_public.csv files laid out like the S3 bucket,
+    i.e. <root>/y=<year>/survey_results_public.csv.
+
+    Parameters:
+    root (str): Directory to write into. Pass it as build_stack's source_prefix.
+    rows (int): Total number of rows, split evenly across the years.
+    years (list): Survey years to generate. Defaults to stack_years.
+    seed (int): Random seed, so every run generates the same data. Defaults to 0.
+    missing (dict): Year to the stack columns (e.g. "Ethnicity") whose source column is left
+        out of its file, like a question a survey did not ask. Defaults to None.
+
+    Returns:
+    dict: Year to the path of its generated file.
+    """
+    years = list(stack_years if years is None else years)
+    missing = missing or {}
+    rng = np.random.default_rng(seed)
+    paths = {}
+    for year in years:
+        path = os.path.join(root, f"y={year}", "survey_results_public.csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        year_rows = max(rows // len(years), 1)
+        for start in range(0, year_rows, GENERATOR_CHUNK_ROWS):
+            chunk = generate_survey_chunk(year, min(GENERATOR_CHUNK_ROWS, year_rows - start), rng,
+                                          missing.get(year, ()))
+            chunk.to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+        paths[year] = path
+    return paths
+
+
+class ArrowMemorySampler:
+    """
+    Track the peak of Arrow's memory pool while a stage runs, by polling it from a
+    background thread. tracemalloc only sees Python's allocator, not the buffers Arrow
+    allocates, e.g. while read_survey parses a CSV.
+
+    Parameters:
+    interval (float): Seconds between samples. Defaults to ARROW_SAMPLE_INTERVAL.
+    """
+
+    def __init__(self, interval: float = ARROW_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._start = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak = max(self.peak, pa.total_allocated_bytes() - self._start)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._start = pa.total_allocated_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def measure(stage, func, track_memory=True):
+    """
+    Run func once, silencing its output, and measure it.
+
+    Memory is measured three ways: peak_mb is the peak of Python's allocator (tracemalloc),
+    arrow_peak_mb the peak of Arrow's memory pool above its size at the start, and
+    max_rss_mb the process' peak resident set size so far, which includes both plus
+    numpy's buffers but never goes down, so it only bounds the stages run before.
+
+    Returns:
+    tuple: (func's result, {"stage", "seconds", "peak_mb", "arrow_peak_mb", "max_rss_mb"}).
+    """
+    sampler = ArrowMemorySampler() if track_memory else contextlib.nullcontext()
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with sampler, contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    seconds = time.perf_counter() - start
+    memory = {"peak_mb": None, "arrow_peak_mb": None, "max_rss_mb": None}
+    if track_memory:
+        memory["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+        tracemalloc.stop()
+        memory["arrow_peak_mb"] = round(sampler.peak / 1024 ** 2, 2)
+        memory["max_rss_mb"] = max_rss_mb()
+    return result, {"stage": stage, "seconds": round(seconds, 4), **memory}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(rows: int, work_dir: str = None, years=None, seed: int = 0, track_memory: bool = True,
+                  engine: str = "pandas", transform_workers: int = 1):
+    """
+    Generate a synthetic survey of the given size and time the pipeline stages on it:
+    merge_years, post_build_mutations, extract_vector_cols, build_wide_stack, build_stack and load_stack,
+    uncached and from the frame cache.
+
+    Parameters:
+    rows (int): Total number of survey rows across the years.
+    work_dir (str): Directory for the generated surveys and caches. Defaults to a temporary directory.
+    years (list): Survey years to generate. Defaults to stack_years.
+    seed (int): Random seed for the generator. Defaults to 0.
+    track_memory (bool): Measure peak memory (see measure); tracemalloc slows the stages down. Defaults to True.
+    engine (str): Dataframe engine for merge_years, build_wide_stack and build_stack. Defaults to "pandas".
+    transform_workers (int): Processes for the pandas wide transforms of build_wide_stack and
+        build_stack. Defaults to 1.
+
+    Returns:
+    list: One result dict per stage.
+    """
+    years = list(stack_years if years is None else years)
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lussi-benchmark-")
+    data_dir = os.path.join(work_dir, f"data-{rows}-{engine}")
+    try:
+        survey_prefix = ensure_surveys(work_dir, rows, years, seed)
+        sources = {year: os.path.join(survey_prefix, f"y={year}", "survey_results_public.csv") for year in years}
+
+        results = []
+        raw, result = measure("merge_years", lambda: merge_years(years, sources=sources, engine=engine), track_memory)
+        results.append(result)
+        _, result = measure("post_build_mutations", lambda: post_build_mutations(raw.copy()), track_memory)
+        results.append(result)
+        _, result = measure("extract_vector_cols",
+                            lambda: extract_vector_cols(raw.copy(), "LanguageWorkedWith", languages), track_memory)
+        results.append(result)
+        _, result = measure("build_wide_stack", lambda: build_wide_stack(raw.copy(), engine, transform_workers),
+                            track_memory)
+        results.append(result)
+        del raw
+
+        shutil.rmtree(data_dir, ignore_errors=True)
+        _, result = measure("build_stack", lambda: build_stack(data_dir, years=years, source_prefix=survey_prefix,
+                                                               force=True, engine=engine,
+                                                               transform_workers=transform_workers), track_memory)
+        results.append(result)
+        for stack_type in StackType:
+            _, result = measure(f"load_stack_{stack_type.value}", lambda: load_stack(data_dir, stack_type, cache=False),
+                                track_memory)
+            results.append(result)
+            # A repeat load is served from the frame cache
+            load_stack(data_dir, stack_type)
+            _, result = measure(f"load_stack_{stack_type.value}_cached", lambda: load_stack(data_dir, stack_type),
+                                track_memory)
+            results.append(result)
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for result in results:
+        result.update({"rows": rows, "years": len(years), "seed": seed, "engine": engine,
+                       "transform_workers": transform_workers})
+    return results
+
+
+def ensure_surveys(work_dir: str, rows: int, years, seed: int, missing=None):
+    """
+    Generate the synthetic surveys for (rows, seed, missing) under work_dir unless they
+    already exist, and return the source_prefix build_stack reads them from.
+    """
+    survey_dir = os.path.join(work_dir, f"surveys-{rows}-{seed}")
+    for year, columns in sorted((missing or {}).items()):
+        survey_dir += f"-{year}without{'-'.join(columns)}"
+    if not os.path.exists(survey_dir):
+        print(f"Generating {rows} synthetic survey rows in {survey_dir}")
+        generate_surveys(survey_dir, rows, years, seed, missing)
+    return survey_dir + os.sep
+
+
+def check_engine_parity(rows: int, work_dir: str = None, years=None, seed: int = 0, engines=None,
+                        transform_workers: int = 1, shard_rows: int = None, missing=None):
+    """
+    Build the stack from the same synthetic surveys with each engine and compare the
+    partition files byte for byte against the first engine's. With transform_workers > 1
+    the pandas engine is also built with its wide transforms sharded across processes.
+
+    Parameters:
+    rows (int): Total number of survey rows across the years.
+    work_dir (str): Directory for the generated surveys and caches. Defaults to a temporary directory.
+    years (list): Survey years to generate. Defaults to stack_years.
+    seed (int): Random seed for the generator. Defaults to 0.
+    engines (list): Engines to compare. Defaults to ENGINES.
+    transform_workers (int): Processes of the sharded pandas build. Defaults to 1 (no sharded build).
+    shard_rows (int): Rows per shard of the sharded build. Defaults to a tenth of rows, so
+        that every year is split.
+    missing (dict): Year to stack columns left out of its survey, see generate_surveys.
+        Defaults to leaving Ethnicity out of the first year, so that the engines are also
+        compared on a column a survey lacks.
+
+    Returns:
+    list: Paths (relative to the data directory) of partitions that differ; empty if all engines agree.
+    """
+    years = list(stack_years if years is None else years)
+    engines = engines or ENGINES
+    missing = {years[0]: ["Ethnicity"]} if missing is None else missing
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lussi-parity-")
+    mismatches = []
+    try:
+        survey_prefix = ensure_surveys(work_dir, rows, years, seed, missing)
+        builds = {engine: {"engine": engine} for engine in engines}
+        if transform_workers > 1:
+            builds[f"pandas x{transform_workers}"] = {"engine": "pandas", "transform_workers": transform_workers,
+                                                      "shard_rows": shard_rows or max(rows // 10, 1)}
+        data_dirs = {}
+        for name, kwargs in builds.items():
+            data_dirs[name] = os.path.join(work_dir, f"parity-{rows}-{name.replace(' ', '-')}")
+            shutil.rmtree(data_dirs[name], ignore_errors=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_stack(data_dirs[name], years=years, source_prefix=survey_prefix, **kwargs)
+
+        reference = engines[0]
+        for stack_type in StackType:
+            for _, _, path in stack_partitions(data_dirs[reference], stack_type):
+                relative = os.path.relpath(path, data_dirs[reference])
+                for name in list(builds)[1:]:
+                    other = os.path.join(data_dirs[name], relative)
+                    if not os.path.exists(other) or not filecmp.cmp(path, other, shallow=False):
+                        mismatches.append(f"{name}: {relative}")
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return mismatches
+
+
+def check_imports(rows: int = 1000, work_dir: str = None, seed: int = 0):
+    """
+    Build a small stack, ZipRecruiter file and ZipRecruiter page snapshots, run each of
+    import_checks' CLI commands on them in a fresh interpreter, and check which modules the
+    command imported.
+
+    Parameters:
+    rows (int): Total number of survey rows of the stack the commands read. Defaults to 1000.
+    work_dir (str): Directory for the generated surveys and caches. Defaults to a temporary directory.
+    seed (int): Random seed for the generator. Defaults to 0.
+
+    Returns:
+    list: One result dict per command with its "command", "seconds" (including interpreter startup)
+    and the "forbidden" modules it imported.
+    """
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lussi-imports-")
+    data_dir = os.path.join(work_dir, f"imports-{rows}")
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [src_dir, os.environ.get("PYTHONPATH")]))}
+    results = []
+    try:
+        survey_prefix = ensure_surveys(work_dir, rows, [stack_years[-1]], seed)
+        build_stack(data_dir, years=[stack_years[-1]], source_prefix=survey_prefix)
+        pd.DataFrame({"State": ["Texas"], "Annual Salary": [100500], "Job Title": ["Data Engineer"],
+                      "Abbreviation": ["TX"], "state_code": [43]}).to_csv(os.path.join(data_dir, ZIP_FILENAME), index=False)
+        snapshots = SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR))
+        for url_suffix, _ in JOB_URLS:
+            snapshots.save(BASE_URL + url_suffix, fixture_salary_page)
+
+        for argv, forbidden in import_checks:
+            argv = [arg.format(data_dir=data_dir) for arg in argv]
+            # Timed from the outside, so interpreter startup is included as it is for a user
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", import_check_script, json.dumps(argv)],
+                                       capture_output=True, text=True, env=env)
+            seconds = time.perf_counter() - start
+            if completed.returncode != 0:
+                raise RuntimeError(f"python -m lussi {' '.join(argv)} failed:\n{completed.stderr}")
+            modules = set(json.loads(completed.stdout.strip().splitlines()[-1]))
+            imported = sorted(module for module in forbidden if module in modules)
+            results.append({"command": " ".join(argv[:1] + argv[2:]), "seconds": round(seconds, 3),
+                            "forbidden": imported})
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def write_results(results, results_fn: str = RESULTS_FN):
+    """
+    Append benchmark results to a JSON lines file, tagged with the run's time and environment.
+    """
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count()
+    }
+    with open(results_fn, "a") as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + "\n")
+
+
+def summarize_results(results_fn: str = RESULTS_FN):
+    """
+    Load a results file as a DataFrame of seconds per (rows, stage), one column per run.
+    """
+    df = pd.read_json(results_fn, lines=True)
+    if "engine" not in df:
+        df["engine"] = "pandas"
+    df["run"] = (df["timestamp"].astype(str) + " " + df["commit"].fillna("").astype(str)
+                 + " " + df["engine"].fillna("pandas").astype(str))
+    return df.pivot_table(index=["rows", "stage"], columns="run", values="seconds")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stack pipeline on synthetic survey data.")
+    parser.add_argument("--rows", type=int, action="append",
+                        help="Total survey rows to generate; repeat for several scales (default 100000)")
+    parser.add_argument("--years", type=int, nargs="+", help="Survey years to generate (default: all stack years)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep generated surveys and caches here instead of a temporary directory")
+    parser.add_argument("--results", default=RESULTS_FN, help=f"Results file to append to (default {RESULTS_FN})")
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory tracking")
+    parser.add_argument("--engine", choices=ENGINES, action="append",
+                        help="Dataframe engine to time; repeat to compare engines (default pandas)")
+    parser.add_argument("--transform-workers", type=int, default=1,
+                        help="Processes for the pandas wide transforms (default 1)")
+    parser.add_argument("--check-parity", action="store_true",
+                        help="Instead of timing, check that every engine writes identical partitions")
+    parser.add_argument("--check-imports", action="store_true",
+                        help="Instead of timing, check that the CLI commands only import what they need")
+    args = parser.parse_args(argv)
+
+    if args.check_imports:
+        results = check_imports(work_dir=args.work_dir, seed=args.seed)
+        for result in results:
+            status = f"imports {', '.join(result['forbidden'])}" if result["forbidden"] else "ok"
+            print(f"{result['command']:<24} {result['seconds']:>7.3f}s  {status}")
+        return 1 if any(result["forbidden"] for result in results) else 0
+
+    if args.check_parity:
+        failed = False
+        for rows in args.rows or [100_000]:
+            mismatches = check_engine_parity(rows, args.work_dir, args.years, args.seed, args.engine,
+                                             args.transform_workers)
+            for mismatch in mismatches:
+                print(f"{rows:>10} partition differs from {(args.engine or ENGINES)[0]}: {mismatch}")
+            print(f"{rows:>10} {'parity FAILED' if mismatches else 'engines agree'}")
+            failed = failed or bool(mismatches)
+        return 1 if failed else 0
+
+    for rows in args.rows or [100_000]:
+        for engine in args.engine or ["pandas"]:
+            results = run_benchmark(rows, args.work_dir, args.years, args.seed, track_memory=not args.no_memory,
+                                    engine=engine, transform_workers=args.transform_workers)
+            write_results(results, args.results)
+            for result in results:
+                print(f"{rows:>10} {engine:<7} {result['stage']:<22} {result['seconds']:>9.3f}s  "
+                      f"peak {result['peak_mb']} MB, Arrow {result['arrow_peak_mb']} MB, max RSS {result['max_rss_mb']} MB")
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
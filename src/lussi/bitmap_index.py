@@ -0,0 +1,299 @@
+"""
+Bitmap inverted index over the multi-valued technology columns of the stack.
+
+build_stack writes one index partition per survey year mapping every distinct token of
+LanguageWorkedWith, DatabaseWorkedWith and PlatformWorkedWith to a bitmap of the rows
+that list it, one bit per row packed eight to a byte. Tokens are named after their
+column, e.g. "language:Rust", "database:PostgreSQL" or "platform:Windows".
+
+Bitmaps combine with &, |, ^, - (and not) and ~, so co-occurrence questions are
+answered without touching the strings:
+
+    index = load_technology_index(data_dir)
+    hits = index["language:Rust"] & index["database:PostgreSQL"] & ~index["platform:Windows"]
+    hits.count()                                          # number of respondents
+    hits.select(load_stack(data_dir, StackType.WIDE))     # their rows
+
+Row ids are positions in the stack as returned by load_stack without filters, i.e. the
+year partitions in year order.
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from lussi.stackoverflow import (CacheFormat, StackType, code_version, csv_na_values, load_partition_versions,
+                                 read_stack_file, save_partition_version, stack_code_modules, stack_partitions)
+
+logger = logging.getLogger(__name__)
+
+# Token prefix to the multi-valued column it is taken from
+index_columns = {
+    "language": "LanguageWorkedWith",
+    "database": "DatabaseWorkedWith",
+    "platform": "PlatformWorkedWith"
+}
+
+# Directory name of the index partitions under data_dir
+INDEX_DIR = "technology_index"
+
+# Modules whose code shapes the index partitions
+index_code_modules = stack_code_modules + ["bitmap_index.py"]
+
+# Number of set bits in each byte value
+popcount_table = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+
+class Bitmap:
+    """
+    A set of row ids stored as packed bits.
+
+    Parameters:
+    bits (np.ndarray): The bits, packed with np.packbits.
+    size (int): The number of rows the bitmap covers.
+    """
+
+    def __init__(self, bits, size: int):
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.size = size
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        Build a bitmap from a boolean array with one entry per row.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask), len(mask))
+
+    def mask(self):
+        """
+        Return the bitmap as a boolean array with one entry per row.
+        """
+        return np.unpackbits(self.bits, count=self.size).astype(bool)
+
+    def rows(self):
+        """
+        Return the row ids in the bitmap, in ascending order.
+        """
+        return np.flatnonzero(self.mask())
+
+    def count(self):
+        """
+        Return the number of rows in the bitmap.
+        """
+        return int(popcount_table[self.bits].sum())
+
+    def select(self, df):
+        """
+        Select the bitmap's rows of a DataFrame loaded with load_stack.
+
+        Raises:
+        ValueError: If df does not have one row per bit.
+        """
+        if len(df) != self.size:
+            raise ValueError(f"Bitmap covers {self.size} rows but the DataFrame has {len(df)}. "
+                             "Select from the full stack as returned by load_stack without filters.")
+        return df.iloc[self.rows()]
+
+    def _check(self, other):
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        if other.size != self.size:
+            raise ValueError(f"Cannot combine bitmaps over {self.size} and {other.size} rows.")
+        return other
+
+    def __and__(self, other):
+        other = self._check(other)
+        return other if other is NotImplemented else Bitmap(self.bits & other.bits, self.size)
+
+    def __or__(self, other):
+        other = self._check(other)
+        return other if other is NotImplemented else Bitmap(self.bits | other.bits, self.size)
+
+    def __xor__(self, other):
+        other = self._check(other)
+        return other if other is NotImplemented else Bitmap(self.bits ^ other.bits, self.size)
+
+    def __sub__(self, other):
+        other = self._check(other)
+        return other if other is NotImplemented else Bitmap(self.bits & ~other.bits, self.size)
+
+    def __invert__(self):
+        bits = ~self.bits
+        # Keep the padding bits after the last row cleared
+        padding = len(bits) * 8 - self.size
+        if padding:
+            bits[-1] &= (0xFF << padding) & 0xFF
+        return Bitmap(bits, self.size)
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and self.size == other.size and np.array_equal(self.bits, other.bits)
+
+    def __repr__(self):
+        return f"Bitmap({self.count()} of {self.size} rows)"
+
+
+class TechnologyIndex:
+    """
+    Token to Bitmap mapping over a whole stack, as returned by load_technology_index.
+
+    Index it with a prefixed token such as "language:Rust", or with a bare token such as
+    "Rust" to get the rows listing it in any of the indexed columns.
+
+    Parameters:
+    bitmaps (dict): Prefixed token to Bitmap.
+    size (int): The number of rows in the stack.
+    years (list): The survey years covered, in row order.
+    """
+
+    def __init__(self, bitmaps, size: int, years):
+        self.bitmaps = bitmaps
+        self.size = size
+        self.years = list(years)
+
+    def __getitem__(self, token: str):
+        if token in self.bitmaps:
+            return self.bitmaps[token]
+        matches = [bitmap for name, bitmap in self.bitmaps.items() if name.split(":", 1)[1] == token]
+        if not matches:
+            raise KeyError(f"Technology '{token}' is not in the index. See TechnologyIndex.tokens().")
+        result = matches[0]
+        for bitmap in matches[1:]:
+            result = result | bitmap
+        return result
+
+    def __contains__(self, token: str):
+        return token in self.bitmaps or any(name.split(":", 1)[1] == token for name in self.bitmaps)
+
+    def all(self):
+        """
+        Return the bitmap of every row.
+        """
+        return ~Bitmap.from_mask(np.zeros(self.size, dtype=bool))
+
+    def tokens(self, prefix: str = None):
+        """
+        List the indexed tokens, optionally only those of one prefix such as "language".
+        """
+        return sorted(name for name in self.bitmaps if prefix is None or name.startswith(f"{prefix}:"))
+
+    def counts(self, prefix: str = None):
+        """
+        Return the number of rows listing each token, most common first.
+        """
+        counts = {name: self.bitmaps[name].count() for name in self.tokens(prefix)}
+        return pd.Series(counts, dtype=np.int64).sort_values(ascending=False, kind="stable")
+
+
+def technology_bitmaps(df):
+    """
+    Build the bitmap of every token in the indexed columns of a stack (or one year of it).
+
+    Each column is factorized and only its distinct values are split into tokens; a
+    token's rows are then found with one lookup over the factorized codes.
+
+    Returns:
+    dict: Prefixed token to packed bits (np.packbits), in order of first appearance.
+    """
+    bitmaps = {}
+    for prefix, column in index_columns.items():
+        if column not in df:
+            continue
+        codes, uniques = pd.factorize(df[column])
+        tokens = pd.Series(uniques, dtype=object).astype(str).str.split(";").explode().str.strip()
+        tokens = tokens[(tokens != "") & ~tokens.isin(csv_na_values)]
+        owners = tokens.index.to_numpy()
+        token_codes, distinct_tokens = pd.factorize(tokens)
+        order = np.argsort(token_codes, kind="stable")
+        starts = np.searchsorted(token_codes[order], np.arange(len(distinct_tokens) + 1))
+        for i, token in enumerate(distinct_tokens):
+            # One extra False slot for missing values, whose code is -1
+            lookup = np.zeros(len(uniques) + 1, dtype=bool)
+            lookup[owners[order[starts[i]:starts[i + 1]]]] = True
+            bitmaps[f"{prefix}:{token}"] = np.packbits(lookup[codes])
+    return bitmaps
+
+
+def index_partition_path(data_dir: str, year: int):
+    """
+    Build the path of one year's index partition, e.g. <data_dir>/technology_index/2023.npz.
+    """
+    return os.path.join(data_dir, INDEX_DIR, f"{year}.npz")
+
+
+def write_index_partition(df, data_dir: str, year: int):
+    """
+    Index one year of a stack and write it, compressed, recording the code version that built it.
+
+    Returns:
+    str: The path of the written index partition.
+    """
+    bitmaps = technology_bitmaps(df)
+    file_name = index_partition_path(data_dir, year)
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    width = (len(df) + 7) // 8
+    bits = np.stack(list(bitmaps.values())) if bitmaps else np.zeros((0, width), dtype=np.uint8)
+    with open(file_name, "wb") as f:
+        np.savez_compressed(f, tokens=np.array(list(bitmaps), dtype=str), bits=bits, size=len(df))
+    save_partition_version(os.path.dirname(file_name), year, code_version(index_code_modules))
+    return file_name
+
+
+def remove_index_partition(data_dir: str, year: int):
+    """
+    Delete a year's index partition.
+    """
+    file_name = index_partition_path(data_dir, year)
+    if os.path.exists(file_name):
+        os.remove(file_name)
+
+
+def update_technology_index(data_dir: str, years):
+    """
+    Build the index partitions that are missing, or were written by a different version of
+    the code, for years whose wide partition exists, reading only the indexed columns.
+    """
+    columns = list(index_columns.values())
+    versions = load_partition_versions(os.path.join(data_dir, INDEX_DIR))
+    version = code_version(index_code_modules)
+    for year, fmt, file_name in stack_partitions(data_dir, StackType.WIDE):
+        current = versions.get(str(year)) == version and os.path.exists(index_partition_path(data_dir, year))
+        if year in years and not current:
+            df = read_stack_file(file_name, StackType.WIDE, fmt, columns if fmt != CacheFormat.CSV else None)
+            logger.info(f"Technology index saved to {write_index_partition(df, data_dir, year)}")
+
+
+def load_technology_index(data_dir: str, years=None):
+    """
+    Load the technology index of the stack, joining the year partitions in year order.
+
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    years (list): Only index these years; row ids then refer to load_stack(filters=[("Year", "in", years)]).
+        Defaults to every year with a wide partition.
+
+    Returns:
+    TechnologyIndex: The index.
+
+    Raises:
+    FileNotFoundError: If a year's index partition is missing.
+    """
+    partitions = []
+    for year, _, _ in stack_partitions(data_dir, StackType.WIDE):
+        if years is not None and year not in years:
+            continue
+        file_name = index_partition_path(data_dir, year)
+        if not os.path.exists(file_name):
+            raise FileNotFoundError(f"Technology index '{file_name}' not found. Please run build_stack() to generate the data.")
+        with np.load(file_name) as npz:
+            partitions.append((year, dict(zip(npz["tokens"].tolist(), npz["bits"])), int(npz["size"])))
+
+    size = sum(year_size for _, _, year_size in partitions)
+    tokens = list(dict.fromkeys(token for _, year_bitmaps, _ in partitions for token in year_bitmaps))
+    bitmaps = {}
+    for token in tokens:
+        # Years whose rows never list the token contribute zeros
+        masks = [np.unpackbits(year_bitmaps[token], count=year_size) if token in year_bitmaps
+                 else np.zeros(year_size, dtype=np.uint8) for _, year_bitmaps, year_size in partitions]
+        bitmaps[token] = Bitmap(np.packbits(np.concatenate(masks)), size)
+    return TechnologyIndex(bitmaps, size, [year for year, _, _ in partitions])
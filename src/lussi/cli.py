@@ -0,0 +1,258 @@
+"""
+Command line entry point of the lussi package.
+
+Run like this:
+(.venv) hurricane:krijudato afraser$ python -m lussi build-stack 622data_nogit
+(.venv) hurricane:krijudato afraser$ python -m lussi build-zip 622data_nogit
+(.venv) hurricane:krijudato afraser$ python -m lussi load 622data_nogit --stack wide --year 2023 --head 10
+(.venv) hurricane:krijudato afraser$ python -m lussi info 622data_nogit
+
+Startup only imports argparse and this module. Each command imports the modules it
+needs when it runs: load and info never import selenium or BeautifulSoup, info does
+not import pandas, and --help imports neither.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Data directory used by the notebooks and run.py
+DEFAULT_DATA_DIR = "622data_nogit"
+
+# Choices of the build-stack options, matching CacheFormat and transform_engine
+CACHE_FORMATS = ["parquet", "feather", "csv"]
+ENGINES = ["pandas", "polars"]
+
+# Tables the load command reads
+LOAD_TABLES = ["raw", "wide", "zip"]
+
+# stack_manifest_fn of lussi.stackoverflow, named here so that info does not import pandas
+STACK_MANIFEST_FN = "merged_stack_manifest.json"
+
+
+def configure_logging(verbose: int):
+    """
+    Print warnings, plus progress messages with -v and per-stage details with -vv.
+    """
+    from lussi.instrumentation import enable_logging
+    enable_logging(max(logging.WARNING - 10 * verbose, logging.DEBUG))
+
+
+def parse_sample(text: str):
+    """
+    Parse a --sample value: a whole number of rows per year (e.g. 1000) or a fraction (e.g. 0.05).
+    """
+    try:
+        sample = int(text) if text.isdigit() else float(text)
+    except ValueError:
+        sample = None
+    if sample is None or not (sample >= 1 if isinstance(sample, int) else 0 < sample <= 1):
+        raise argparse.ArgumentTypeError(f"invalid sample '{text}', use a fraction such as 0.05 or rows such as 1000")
+    return sample
+
+
+def build_stack_command(args):
+    from lussi.stackoverflow import CacheFormat, build_stack, sample_data_dir, wide_shard_rows
+    args.shard_rows = args.shard_rows or wide_shard_rows
+    # A sampled build reports next to its own cache, leaving the full build's report alone
+    report_dir = sample_data_dir(args.data_dir, args.sample, args.seed) if args.sample is not None else args.data_dir
+    report_file = args.report or os.path.join(report_dir, "build_stack_report.json")
+    report = build_stack(args.data_dir, cache_format=CacheFormat(args.format), export_csv=args.export_csv,
+                         workers=args.workers, use_processes=args.processes, years=args.years, force=args.force,
+                         download_dir=args.download_dir, offline=args.offline, source_prefix=args.source_prefix,
+                         compact=args.compact, engine=args.engine, report_file=report_file,
+                         track_memory=args.track_memory, feature_store=args.feature_store, sample=args.sample,
+                         seed=args.seed, transform_workers=args.transform_workers, shard_rows=args.shard_rows)
+    print(f"Stack built in {report.seconds:.1f}s; run report written to {report_file}")
+    return 0
+
+
+def build_zip_command(args):
+    from lussi.ziprecruiter import build_zip, http_fetcher
+    report_file = args.report or os.path.join(args.data_dir, "build_zip_report.json")
+    kwargs = {"base_url": args.base_url} if args.base_url else {}
+    report = build_zip(args.data_dir, workers=args.workers, report_file=report_file, track_memory=args.track_memory,
+                       fetch_page=http_fetcher() if args.http else None, requests_per_second=args.rate,
+                       retries=args.retries, resume=not args.no_resume, offline=args.offline,
+                       snapshot_ttl=args.snapshot_ttl * 3600, **kwargs)
+    print(f"ZipRecruiter scrape finished in {report.seconds:.1f}s; run report written to {report_file}")
+    # build_zip has logged the titles that failed; a non-zero exit lets scripts retry
+    return 1 if report.params.get("failed_titles") else 0
+
+
+def load_table(args):
+    """
+    Load the table the load command asks for, applying its column and year selection.
+    """
+    if args.stack == "zip":
+        from lussi.ziprecruiter import load_zip
+        df = load_zip(args.data_dir)
+        if args.columns:
+            df = df[args.columns]
+        return df
+
+    from lussi.stackoverflow import StackType, load_stack, sample_data_dir
+    data_dir = sample_data_dir(args.data_dir, args.sample, args.seed) if args.sample is not None else args.data_dir
+    filters = [("Year", "in", args.year)] if args.year else None
+    return load_stack(data_dir, StackType(args.stack), columns=args.columns, compact=args.compact, filters=filters)
+
+
+def load_command(args):
+    df = load_table(args)
+    if args.output:
+        if args.output.endswith(".parquet"):
+            df.to_parquet(args.output, index=False)
+        else:
+            df.to_csv(args.output, index=False)
+        print(f"Wrote {len(df)} rows to {args.output}")
+        return 0
+
+    import pandas as pd
+    with pd.option_context("display.max_columns", None, "display.width", None):
+        print(df.head(args.head) if args.head > 0 else df)
+    print(f"[{len(df)} rows x {len(df.columns)} columns]")
+    return 0
+
+
+def directory_summary(path: str):
+    """
+    Return the number of files and total bytes under a directory.
+    """
+    files = [os.path.join(root, file_name) for root, _, file_names in os.walk(path) for file_name in file_names]
+    return {"files": len(files), "bytes": sum(os.path.getsize(file_name) for file_name in files)}
+
+
+def data_dir_info(data_dir: str):
+    """
+    Describe the caches in a data directory from the stack manifest and a file listing,
+    without reading any data.
+
+    Returns:
+    dict: The manifest's years, the files and bytes of each cache file or directory, and
+    when each run report was written.
+
+    Raises:
+    FileNotFoundError: If data_dir does not exist.
+    """
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Data directory '{data_dir}' not found. Please run build-stack to generate the data.")
+    info = {"data_dir": os.path.abspath(data_dir), "years": {}, "artifacts": {}, "reports": {}}
+    for file_name in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, file_name)
+        if os.path.isdir(path):
+            info["artifacts"][file_name] = directory_summary(path)
+        elif file_name == STACK_MANIFEST_FN:
+            with open(path) as f:
+                info["years"] = json.load(f).get("years", {})
+        elif file_name.endswith("_report.json"):
+            with open(path) as f:
+                report = json.load(f)
+            info["reports"][file_name] = {"started_at": report.get("started_at"), "seconds": report.get("seconds")}
+        else:
+            info["artifacts"][file_name] = {"files": 1, "bytes": os.path.getsize(path)}
+    return info
+
+
+def info_command(args):
+    info = data_dir_info(args.data_dir)
+    if args.json:
+        print(json.dumps(info, indent=2))
+        return 0
+
+    print(f"Data directory: {info['data_dir']}")
+    if info["years"]:
+        print("Stack years:")
+        for year, entry in info["years"].items():
+            print(f"  {year}: {entry.get('rows')} rows, {entry.get('cache_format')}"
+                  f"{', compact' if entry.get('compact') else ''}, code {entry.get('code_version')}")
+    else:
+        print("Stack years: none (run build-stack)")
+    print("Artifacts:")
+    for name, summary in info["artifacts"].items():
+        print(f"  {name}: {summary['files']} files, {summary['bytes'] / 1024 ** 2:.1f} MB")
+    if not info["artifacts"]:
+        print("  none")
+    for name, report in info["reports"].items():
+        print(f"Last {name[:-len('_report.json')]}: {report['started_at']}, {report['seconds']}s")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m lussi",
+                                     description="Build and load the Stack Overflow and ZipRecruiter caches.")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Print progress messages; repeat for per-stage details")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, func, help):
+        command = commands.add_parser(name, help=help, description=help)
+        command.add_argument("data_dir", nargs="?", default=DEFAULT_DATA_DIR,
+                             help=f"Directory where the data files are stored (default {DEFAULT_DATA_DIR})")
+        command.set_defaults(func=func)
+        return command
+
+    command = add_command("build-stack", build_stack_command, "Download the surveys and build the stack caches.")
+    command.add_argument("--format", choices=CACHE_FORMATS, default="parquet", help="Cache format (default parquet)")
+    command.add_argument("--years", type=int, nargs="+", help="Survey years to include (default all)")
+    command.add_argument("--workers", type=int, default=1, help="Years processed in parallel (default 1)")
+    command.add_argument("--processes", action="store_true", help="Process years in processes instead of threads")
+    command.add_argument("--force", action="store_true", help="Rebuild every year even if its partition is current")
+    command.add_argument("--offline", action="store_true", help="Use only previously downloaded surveys")
+    command.add_argument("--download-dir", help="Where downloaded surveys are kept (default <data_dir>/downloads)")
+    command.add_argument("--source-prefix", help="Read the surveys from this URL or directory instead of S3")
+    command.add_argument("--compact", action="store_true", help="Write the compact representation")
+    command.add_argument("--engine", choices=ENGINES, default="pandas", help="Dataframe engine (default pandas)")
+    command.add_argument("--transform-workers", type=int, default=1,
+                         help="Processes running the pandas wide transforms on row shards (default 1)")
+    command.add_argument("--shard-rows", type=int, help="Rows per wide transform shard (default 250000)")
+    command.add_argument("--export-csv", action="store_true", help="Also export the stacks as single CSV files")
+    command.add_argument("--feature-store", action="store_true", help="Also write the memory-mapped feature matrix")
+    command.add_argument("--sample", type=parse_sample,
+                         help="Build a small dev cache from a stratified sample of each year: a fraction such as "
+                              "0.05 or rows per year such as 1000, written to <data_dir>/sample-...")
+    command.add_argument("--seed", type=int, default=0, help="Seed of --sample (default 0)")
+    command.add_argument("--report", help="Run report path (default <data_dir>/build_stack_report.json)")
+    command.add_argument("--track-memory", action="store_true", help="Record peak memory per stage (slower)")
+
+    command = add_command("build-zip", build_zip_command, "Scrape the ZipRecruiter salaries by state.")
+    command.add_argument("--workers", type=int, default=1, help="Pages loaded at once (default 1)")
+    command.add_argument("--rate", type=float, default=1.0, help="Maximum requests per second (default 1)")
+    command.add_argument("--retries", type=int, default=2, help="Retries of a failed page (default 2)")
+    command.add_argument("--no-resume", action="store_true", help="Ignore checkpoints and scrape every title again")
+    command.add_argument("--base-url", help="URL the job title suffixes are appended to (default ZipRecruiter)")
+    command.add_argument("--http", action="store_true", help="Fetch pages with plain HTTP instead of a browser")
+    command.add_argument("--snapshot-ttl", type=float, default=168,
+                         help="Hours a saved page is reused instead of fetched again; 0 fetches every page (default 168)")
+    command.add_argument("--offline", action="store_true",
+                         help="Rebuild from the saved pages only, without fetching or starting a browser")
+    command.add_argument("--report", help="Run report path (default <data_dir>/build_zip_report.json)")
+    command.add_argument("--track-memory", action="store_true", help="Record peak memory per stage (slower)")
+
+    command = add_command("load", load_command, "Load a cached table and print its first rows or save it.")
+    command.add_argument("--stack", choices=LOAD_TABLES, default="wide", help="Table to load (default wide)")
+    command.add_argument("--columns", nargs="+", help="Only load these columns")
+    command.add_argument("--year", type=int, nargs="+", help="Only load these survey years")
+    command.add_argument("--compact", action="store_true", help="Load the compact representation")
+    command.add_argument("--sample", type=parse_sample, help="Load the stack built with build-stack --sample")
+    command.add_argument("--seed", type=int, default=0, help="Seed of --sample (default 0)")
+    command.add_argument("--head", type=int, default=5, help="Rows to print; 0 prints the whole table (default 5)")
+    command.add_argument("--output", help="Write the table to this .csv or .parquet file instead of printing it")
+
+    command = add_command("info", info_command, "Describe the caches in the data directory without loading them.")
+    command.add_argument("--json", action="store_true", help="Print the description as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.verbose)
+    try:
+        return args.func(args)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
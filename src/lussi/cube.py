@@ -0,0 +1,292 @@
+"""
+Materialized salary cube over the wide stack.
+
+build_stack writes one cube partition per survey year next to the stack partitions.
+Each row holds the respondent count and AnnualSalary count, sum, sum of squares, min
+and max for one (Year, Country, EdLevel, technology) cell, where technology is an
+indicator column such as "python" or "aws", or "(all)" for every respondent. A second
+file per year holds a log-binned histogram of salaries per cell, a quantile sketch
+with a bounded relative error that can be merged by adding counts.
+
+query_cube answers group-by questions from these files, rolling the cells up to any
+subset of the dimensions, e.g.:
+
+    query_cube(data_dir, by=["Year", "technology"], filters=[("Country", "==", "Germany")])
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from lussi.stackoverflow import (CacheFormat, StackType, code_version, csv_na_values, filter_mask, indicator_cols,
+                                 load_partition_versions, normalize_filters, read_stack_file, save_partition_version,
+                                 stack_code_modules, stack_partitions)
+
+logger = logging.getLogger(__name__)
+
+# Cell dimensions of the cube, coarsest first
+cube_dimensions = ["Year", "Country", "EdLevel", "technology"]
+
+# Value of the technology dimension for the cells covering every respondent
+ALL_TECHNOLOGIES = "(all)"
+
+# Relative accuracy of the salary quantile sketch: estimates are within 2% of the true value
+SKETCH_ACCURACY = 0.02
+sketch_gamma = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Directory names of the cube partitions under data_dir
+CUBE_DIR = "salary_cube"
+SKETCH_DIR = "salary_cube_sketch"
+
+# Modules whose code shapes the cube partitions
+cube_code_modules = stack_code_modules + ["cube.py"]
+
+
+def sketch_bins(salaries):
+    """
+    Map salaries to sketch bins. Bin i > 0 holds values in (gamma^(i-1), gamma^i]; salaries
+    of 1 or less share bin 0.
+    """
+    return np.ceil(np.log(np.maximum(salaries, 1)) / np.log(sketch_gamma)).astype(np.int32)
+
+
+def sketch_bin_values(bins):
+    """
+    Return the representative salary of each bin, within SKETCH_ACCURACY of every value in it.
+    """
+    bins = np.asarray(bins, dtype=float)
+    return np.where(bins > 0, 2 * sketch_gamma ** bins / (sketch_gamma + 1), 0.0)
+
+
+def dimension_values(series):
+    """
+    Return a text column as an object array with every missing value as None, the same
+    whether it came from the build ("nan" strings), a cache file or a categorical.
+    """
+    values = series.astype(object)
+    return values.where(values.notna() & ~values.isin(csv_na_values), None).to_numpy()
+
+
+def technology_frame(wide_df):
+    """
+    Turn a wide stack into one row per (respondent, technology): every respondent once with
+    technology "(all)", and again for each indicator column answered "yes".
+    """
+    dims = pd.DataFrame({
+        "Year": wide_df["Year"].astype(np.int64).to_numpy(),
+        "Country": dimension_values(wide_df["Country"]),
+        "EdLevel": dimension_values(wide_df["EdLevel"]),
+        "AnnualSalary": wide_df["AnnualSalary"].astype(np.float64).to_numpy()
+    })
+    # Compact stacks hold the indicators as booleans, the others as "yes"/"no"
+    indicators = [col for col in indicator_cols if col in wide_df]
+    matches = np.column_stack([wide_df[col].isin(["yes", True]).to_numpy() for col in indicators])
+    rows, technologies = np.nonzero(matches)
+    per_technology = dims.iloc[rows].assign(technology=np.array(indicators, dtype=object)[technologies])
+    return pd.concat([dims.assign(technology=ALL_TECHNOLOGIES), per_technology], ignore_index=True)
+
+
+def build_salary_cube(wide_df):
+    """
+    Aggregate a wide stack (or one year of it) into salary cube cells.
+
+    Parameters:
+    wide_df (pd.DataFrame): The wide stack, in the regular or compact representation.
+
+    Returns:
+    tuple: (cube, sketch) DataFrames. cube has one row per cell with respondents, salary_count,
+    salary_sum, salary_sumsq, salary_min and salary_max; sketch has one row per (cell, bin)
+    with the number of salaries in that bin.
+    """
+    long_df = technology_frame(wide_df)
+    long_df["salary_sq"] = long_df["AnnualSalary"] ** 2
+    cube = long_df.groupby(cube_dimensions, dropna=False).agg(
+        respondents=("AnnualSalary", "size"),
+        salary_count=("AnnualSalary", "count"),
+        salary_sum=("AnnualSalary", "sum"),
+        salary_sumsq=("salary_sq", "sum"),
+        salary_min=("AnnualSalary", "min"),
+        salary_max=("AnnualSalary", "max")
+    ).reset_index()
+
+    salaries = long_df[long_df["AnnualSalary"].notna()]
+    salaries = salaries[cube_dimensions].assign(bin=sketch_bins(salaries["AnnualSalary"].to_numpy()))
+    sketch = salaries.groupby(cube_dimensions + ["bin"], dropna=False).size().rename("count").reset_index()
+    return cube, sketch
+
+
+def cube_partition_path(data_dir: str, year: int, sketch: bool = False):
+    """
+    Build the path of one year's cube partition, e.g. <data_dir>/salary_cube/2023.parquet.
+    """
+    return os.path.join(data_dir, SKETCH_DIR if sketch else CUBE_DIR, f"{year}.parquet")
+
+
+def write_cube_partition(cube, data_dir: str, year: int):
+    """
+    Write one year of the cube, as returned by build_salary_cube, and record the code version that built it.
+
+    Returns:
+    str: The path of the written cube partition.
+    """
+    for df, sketch in zip(cube, [False, True]):
+        file_name = cube_partition_path(data_dir, year, sketch)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        df.to_parquet(file_name, index=False)
+    save_partition_version(os.path.join(data_dir, CUBE_DIR), year, code_version(cube_code_modules))
+    return cube_partition_path(data_dir, year)
+
+
+def remove_cube_partitions(data_dir: str, year: int):
+    """
+    Delete a year's cube partitions.
+    """
+    for sketch in [False, True]:
+        file_name = cube_partition_path(data_dir, year, sketch)
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+
+def update_salary_cube(data_dir: str, years):
+    """
+    Build the cube partitions that are missing, or were written by a different version of
+    the code, for years whose wide partition exists, e.g. for stacks cached before the cube
+    was added, reading only the columns the cube needs.
+    """
+    columns = ["Year", "Country", "EdLevel", "AnnualSalary"] + indicator_cols
+    versions = load_partition_versions(os.path.join(data_dir, CUBE_DIR))
+    version = code_version(cube_code_modules)
+    for year, fmt, file_name in stack_partitions(data_dir, StackType.WIDE):
+        if year not in years:
+            continue
+        if versions.get(str(year)) == version and all(os.path.exists(cube_partition_path(data_dir, year, sketch))
+                                                      for sketch in [False, True]):
+            continue
+        wide_df = read_stack_file(file_name, StackType.WIDE, fmt, columns if fmt != CacheFormat.CSV else None)
+        logger.info(f"Salary cube saved to {write_cube_partition(build_salary_cube(wide_df), data_dir, year)}")
+
+
+def load_cube(data_dir: str, sketch: bool = False, years=None):
+    """
+    Load the cube (or its sketch) partitions of the given years, all years by default.
+
+    Raises:
+    FileNotFoundError: If no cube has been built.
+    """
+    cube_dir = os.path.join(data_dir, SKETCH_DIR if sketch else CUBE_DIR)
+    if not os.path.isdir(cube_dir):
+        raise FileNotFoundError(f"Salary cube '{cube_dir}' not found. Please run build_stack() to generate the data.")
+    file_names = sorted(file_name for file_name in os.listdir(cube_dir) if file_name.endswith(".parquet"))
+    if not file_names:
+        raise FileNotFoundError(f"Salary cube '{cube_dir}' has no partitions. Please run build_stack() to generate the data.")
+    selected = [file_name for file_name in file_names if years is None or int(file_name.split(".")[0]) in years]
+    if not selected:
+        return pd.read_parquet(os.path.join(cube_dir, file_names[0])).iloc[0:0]
+    return pd.concat([pd.read_parquet(os.path.join(cube_dir, file_name)) for file_name in selected],
+                     ignore_index=True)
+
+
+def select_cells(df, by, filters):
+    """
+    Apply the filters to cube cells and pick the technology cells to roll up: only the
+    "(all)" cells unless technology is grouped on or filtered.
+    """
+    if filters:
+        df = df[filter_mask(df, filters)]
+    if "technology" not in by and not any(column == "technology" for group in filters or [] for column, _, _ in group):
+        df = df[df["technology"] == ALL_TECHNOLOGIES]
+    elif "technology" not in by and df["technology"].nunique() > 1:
+        raise ValueError("A respondent is counted once per technology, so several technologies can only be "
+                         "queried with 'technology' in by.")
+    return df
+
+
+def query_cube(data_dir: str, by=("Year",), filters=None, quantiles=(0.5,)):
+    """
+    Answer a group-by question about AnnualSalary from the salary cube instead of the wide stack.
+
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    by (list): Dimensions to group by, any subset of Year, Country, EdLevel and technology;
+        the others are rolled up. Defaults to ["Year"].
+    filters (list): Predicates on the dimensions, as for load_stack, e.g.
+        [("technology", "==", "python"), ("Year", ">=", 2020)]. Without a technology filter or
+        grouping, every respondent is counted once; grouping by technology includes "(all)".
+    quantiles (list): Salary quantiles to estimate from the sketch, e.g. [0.25, 0.5, 0.75].
+
+    Returns:
+    pd.DataFrame: One row per group with respondents, salary_count, salary_sum, salary_mean,
+    salary_std, salary_min, salary_max and one salary_p<q> column per quantile.
+
+    Raises:
+    ValueError: If by holds an unknown dimension, or several technologies would be rolled up together.
+    FileNotFoundError: If the cube has not been built.
+    """
+    by = list(by)
+    unknown = [column for column in by if column not in cube_dimensions]
+    if unknown:
+        raise ValueError(f"Invalid cube dimensions {unknown}. Choose from {cube_dimensions}.")
+    filters = normalize_filters(filters)
+    years = filtered_years(filters)
+    # Without technology in by the cells are down to one technology, so grouping on it rolls up everything
+    keys = by or ["technology"]
+
+    cube = select_cells(load_cube(data_dir, years=years), by, filters)
+    result = cube.groupby(keys, dropna=False).agg(
+        respondents=("respondents", "sum"),
+        salary_count=("salary_count", "sum"),
+        salary_sum=("salary_sum", "sum"),
+        salary_sumsq=("salary_sumsq", "sum"),
+        salary_min=("salary_min", "min"),
+        salary_max=("salary_max", "max")
+    )
+    count = result["salary_count"].where(result["salary_count"] > 0)
+    result["salary_mean"] = result["salary_sum"] / count
+    variance = (result["salary_sumsq"] - result["salary_sum"] ** 2 / count) / (count - 1)
+    result["salary_std"] = np.sqrt(variance.clip(lower=0).where(count > 1))
+
+    if quantiles:
+        sketch = select_cells(load_cube(data_dir, sketch=True, years=years), by, filters)
+        sketch = sketch.groupby(keys + ["bin"], dropna=False)["count"].sum().reset_index()
+        for q in quantiles:
+            result[f"salary_p{q * 100:g}"] = sketch_quantile(sketch, keys, q, result)
+
+    result = result.drop(columns="salary_sumsq")
+    columns = ["respondents", "salary_count", "salary_sum", "salary_mean", "salary_std", "salary_min", "salary_max"]
+    result = result[columns + [col for col in result.columns if col not in columns]]
+    return result.reset_index(drop=not by)
+
+
+def filtered_years(filters):
+    """
+    Return the years the filters restrict Year to with == or in, or None if any OR-ed group
+    can match every year. Only those years' partitions need to be opened.
+    """
+    if not filters:
+        return None
+    years = set()
+    for group in filters:
+        group_years = [set(value) if op == "in" else {value} for column, op, value in group
+                       if column == "Year" and op in ["==", "=", "in"]]
+        if not group_years:
+            return None
+        years |= set.intersection(*group_years)
+    return years
+
+
+def sketch_quantile(sketch, by, q, result):
+    """
+    Estimate the q quantile of each group from its merged sketch, clipped to the group's min and max.
+
+    Returns:
+    pd.Series: The estimates, aligned with result's index.
+    """
+    sketch = sketch.sort_values(by + ["bin"])
+    groups = sketch.groupby(by, dropna=False)["count"]
+    cumulative = groups.cumsum()
+    total = groups.transform("sum")
+    # The first bin whose cumulative count passes the quantile's rank holds the quantile
+    passed = sketch[cumulative > q * (total - 1)]
+    first = passed.groupby(by, dropna=False)["bin"].first()
+    estimates = pd.Series(sketch_bin_values(first.to_numpy()), index=first.index).reindex(result.index)
+    return estimates.clip(lower=result["salary_min"], upper=result["salary_max"])
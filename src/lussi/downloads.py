@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import logging
+import hashlib
+import urllib.request
+import urllib.error
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per network/disk read while streaming a download
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# An S3 ETag for a single-part upload is the MD5 of the object
+MD5_ETAG = re.compile(r'^"?([0-9a-f]{32})"?$')
+
+
+def is_remote(url: str):
+    """
+    Return True for http(s) URLs, False for local paths.
+    """
+    return url.startswith(("http://", "https://"))
+
+
+class DownloadCache:
+    """
+    Content-addressed local cache for remote source files.
+
+    Files are stored once under objects/<sha256>, and index/<hash of url>.json remembers
+    which object a URL resolved to together with its ETag and Last-Modified headers.
+    A cached URL is revalidated with a conditional GET, an interrupted download is
+    resumed with a Range request, and every completed download is verified against
+    its Content-Length and (for S3) its MD5 ETag before it is added to the cache.
+    In offline mode no request is made and only cached files are served.
+
+    Parameters:
+    cache_dir (str): Directory holding the cache.
+    offline (bool): Serve from the cache only, never touch the network. Defaults to False.
+    timeout (int): Socket timeout in seconds for each request. Defaults to 60.
+    verify (bool): Re-hash cached objects before serving them. Defaults to False.
+    """
+
+    def __init__(self, cache_dir: str, offline: bool = False, timeout: int = 60, verify: bool = False):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.timeout = timeout
+        self.verify = verify
+
+    def _key(self, url: str):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _index_path(self, url: str):
+        return os.path.join(self.cache_dir, "index", f"{self._key(url)}.json")
+
+    def _partial_path(self, url: str):
+        return os.path.join(self.cache_dir, "partial", f"{self._key(url)}.part")
+
+    def object_path(self, sha256: str):
+        return os.path.join(self.cache_dir, "objects", sha256)
+
+    def entry(self, url: str):
+        """
+        Return the index entry of a URL if its object is in the cache, otherwise None.
+        """
+        index_path = self._index_path(url)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            entry = json.load(f)
+        object_path = self.object_path(entry["sha256"])
+        if not os.path.exists(object_path) or os.path.getsize(object_path) != entry["size"]:
+            return None
+        if self.verify and file_sha256(object_path) != entry["sha256"]:
+            logger.warning(f"Cached copy of {url} failed checksum verification, discarding it")
+            os.remove(object_path)
+            return None
+        return entry
+
+    def fetch(self, url: str):
+        """
+        Return a local path holding the current content of url, downloading it only if
+        the cached copy is missing or out of date. Local paths are returned unchanged.
+
+        Parameters:
+        url (str): The URL to fetch.
+
+        Returns:
+        str: Path of the file in the cache.
+
+        Raises:
+        FileNotFoundError: In offline mode, if the URL is not cached.
+        """
+        if not is_remote(url):
+            return url
+
+        entry = self.entry(url)
+        if self.offline:
+            if entry is None:
+                raise FileNotFoundError(f"{url} is not in the download cache at {self.cache_dir} (offline mode)")
+            return self.object_path(entry["sha256"])
+
+        try:
+            entry = self._download(url, entry)
+        except (urllib.error.URLError, OSError) as e:
+            if entry is None:
+                raise
+            logger.warning(f"Could not revalidate {url} ({e}), using the cached copy")
+        return self.object_path(entry["sha256"])
+
+    def _download(self, url: str, entry):
+        headers = {}
+        if entry is not None:
+            # Conditional GET: the server answers 304 if our copy is still current
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        partial_path = self._partial_path(url)
+        partial_meta_path = partial_path + ".json"
+        offset = 0
+        if os.path.exists(partial_path) and os.path.exists(partial_meta_path):
+            with open(partial_meta_path) as f:
+                partial_meta = json.load(f)
+            validator = partial_meta.get("etag") or partial_meta.get("last_modified")
+            if validator:
+                # Resume, but only if the remote file is still the one we started on
+                offset = os.path.getsize(partial_path)
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                logger.info(f"Cached copy of {url} is up to date")
+                return entry
+            if e.code == 416 and offset:
+                # The partial file already holds every byte (the run stopped before moving it into
+                # place) or the remote file shrank; start over, which no longer sends a Range
+                logger.warning(f"Server rejected resuming {url} at byte {offset}, downloading it again")
+                os.remove(partial_path)
+                os.remove(partial_meta_path)
+                return self._download(url, entry)
+            raise
+
+        with response:
+            if response.status != 206:
+                offset = 0
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            content_length = response.headers.get("Content-Length")
+            expected_size = offset + int(content_length) if content_length is not None else None
+
+            os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+            with open(partial_meta_path, "w") as f:
+                json.dump({"url": url, "etag": etag, "last_modified": last_modified}, f)
+
+            sha256 = hashlib.sha256()
+            md5 = hashlib.md5()
+            if offset:
+                logger.info(f"Resuming download of {url} at byte {offset}")
+                with open(partial_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                        sha256.update(chunk)
+                        md5.update(chunk)
+            else:
+                logger.info(f"Downloading {url}")
+            with open(partial_path, "ab" if offset else "wb") as f:
+                for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    md5.update(chunk)
+
+        size = os.path.getsize(partial_path)
+        if expected_size is not None and size < expected_size:
+            # The connection dropped; keep the partial file so the next fetch resumes it
+            raise OSError(f"Download of {url} interrupted at byte {size} of {expected_size}")
+        md5_etag = MD5_ETAG.match(etag or "")
+        if (expected_size is not None and size != expected_size) or (md5_etag and md5_etag.group(1) != md5.hexdigest()):
+            # Start from scratch next time rather than resuming a corrupt file
+            os.remove(partial_path)
+            os.remove(partial_meta_path)
+            raise OSError(f"Checksum verification failed for {url}")
+
+        digest = sha256.hexdigest()
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(partial_path, object_path)
+        os.remove(partial_meta_path)
+
+        entry = {
+            "url": url,
+            "sha256": digest,
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time()
+        }
+        index_path = self._index_path(url)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+        logger.info(f"Downloaded {url} ({size} bytes, sha256 {digest[:12]})")
+        return entry
+
+
+def file_sha256(path: str):
+    """
+    Return the SHA-256 hex digest of a file.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -0,0 +1,232 @@
+"""
+Memory-mapped numeric feature matrix of the wide stack, for modeling.
+
+build_stack(feature_store=True) writes <data_dir>/features/features.npy, a float32
+matrix with one row per respondent (in load_stack order) and one column per feature,
+plus features.json describing it:
+
+- columns: the feature names, in matrix column order
+- kinds: "indicator" (1.0/0.0), "numeric" (NaN if missing) or "category" (integer code, NaN if missing)
+- categories: the values behind each category column's codes
+- years: the [start, stop) row range of each survey year
+
+load_feature_store opens the matrix with np.load(mmap_mode="r"), so nothing is parsed
+or copied: worker processes that open the same file share one copy through the page cache.
+
+    features = load_feature_store(data_dir)
+    X = features.matrix[:, features.columns.index("python")]     # a view, no copy
+    X_2023 = features.year_rows(2023)                              # also a view
+"""
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+from lussi.stackoverflow import (StackType, categorical_cols, code_version, indicator_cols, read_stack_file,
+                                 stack_code_modules, stack_partitions)
+
+logger = logging.getLogger(__name__)
+
+# Directory and file names of the feature store under data_dir
+FEATURES_DIR = "features"
+MATRIX_FN = "features.npy"
+SCHEMA_FN = "features.json"
+
+# Modules whose code shapes the feature store
+feature_code_modules = stack_code_modules + ["feature_store.py"]
+
+# Element type of the matrix; xgboost and catboost take float32 without converting
+FEATURE_DTYPE = np.float32
+
+# Numeric columns of the wide stack that become features as they are
+numeric_features = ["AnnualSalary", "YearsCodeProAvg", "OrgSizeAvg", "AgeAvg"]
+
+# Low-cardinality text columns that become integer category codes
+category_features = categorical_cols
+
+
+class FeatureStore:
+    """
+    A feature matrix opened by load_feature_store.
+
+    Parameters:
+    matrix (np.ndarray): The (rows, features) matrix, usually a read-only np.memmap.
+    schema (dict): The parsed features.json.
+    """
+
+    def __init__(self, matrix, schema):
+        self.matrix = matrix
+        self.schema = schema
+        self.columns = list(schema["columns"])
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def column(self, name: str):
+        """
+        Return one feature as a view of the matrix.
+        """
+        return self.matrix[:, self.columns.index(name)]
+
+    def categories(self, name: str):
+        """
+        Return the values behind a category feature's codes, code i being categories[i].
+        """
+        return self.schema["categories"][name]
+
+    def year_rows(self, year: int):
+        """
+        Return the rows of one survey year as a view of the matrix.
+        """
+        start, stop = self.schema["years"][str(year)]
+        return self.matrix[start:stop]
+
+    def to_frame(self, decode: bool = False):
+        """
+        Copy the matrix into a DataFrame, optionally decoding category codes back to their values.
+        """
+        df = pd.DataFrame(np.asarray(self.matrix), columns=self.columns)
+        if decode:
+            for name, values in self.schema["categories"].items():
+                df[name] = pd.Categorical.from_codes(df[name].fillna(-1).astype(int), categories=values)
+        return df
+
+
+def feature_columns():
+    """
+    Return the feature names in matrix column order, with their kind.
+    """
+    return ([(col, "indicator") for col in indicator_cols]
+            + [(col, "numeric") for col in numeric_features]
+            + [(col, "category") for col in category_features])
+
+
+def feature_block(df, categories):
+    """
+    Convert wide stack rows to a float32 feature block.
+
+    Parameters:
+    df (pd.DataFrame): Rows of the wide stack, regular or compact.
+    categories (dict): Category feature to its list of values.
+
+    Returns:
+    np.ndarray: Array of shape (len(df), number of features).
+    """
+    block = np.empty((len(df), len(feature_columns())), dtype=FEATURE_DTYPE)
+    for i, (col, kind) in enumerate(feature_columns()):
+        if kind == "indicator":
+            block[:, i] = df[col].isin(["yes", True]).to_numpy()
+        elif kind == "numeric":
+            block[:, i] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            codes = pd.Categorical(df[col].astype(object), categories=categories[col]).codes
+            block[:, i] = np.where(codes >= 0, codes, np.nan)
+    return block
+
+
+def feature_store_dir(data_dir: str):
+    return os.path.join(data_dir, FEATURES_DIR)
+
+
+def feature_store_current(data_dir: str, manifest):
+    """
+    Check whether the feature store was built from the partitions the manifest describes,
+    by the current version of the code.
+    """
+    schema_fn = os.path.join(feature_store_dir(data_dir), SCHEMA_FN)
+    if not os.path.exists(schema_fn) or not os.path.exists(os.path.join(feature_store_dir(data_dir), MATRIX_FN)):
+        return False
+    with open(schema_fn) as f:
+        schema = json.load(f)
+    return (schema.get("partitions") == manifest and schema.get("columns") == [col for col, _ in feature_columns()]
+            and schema.get("code_version") == code_version(feature_code_modules))
+
+
+def write_feature_store(data_dir: str, manifest=None):
+    """
+    Write the feature matrix and its schema from the wide partitions, one year at a time.
+
+    A first pass reads only the category columns to fix the category codes across years;
+    the second writes each year's rows straight into the memory-mapped file, so the
+    whole stack is never held in memory.
+
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    manifest (dict): The stack manifest the partitions were built from; the store is
+        skipped if it was already written from the same partitions. Defaults to None (always write).
+
+    Returns:
+    str: The path of the matrix file.
+    """
+    out_dir = feature_store_dir(data_dir)
+    matrix_fn = os.path.join(out_dir, MATRIX_FN)
+    if manifest is not None and feature_store_current(data_dir, manifest):
+        logger.info(f"Feature store {matrix_fn} is up to date")
+        return matrix_fn
+
+    partitions = stack_partitions(data_dir, StackType.WIDE)
+    values = {col: set() for col in category_features}
+    rows = {}
+    for year, fmt, file_name in partitions:
+        df = read_stack_file(file_name, StackType.WIDE, fmt, category_features)
+        rows[year] = len(df)
+        for col in category_features:
+            values[col].update(df[col].dropna().astype(str).unique())
+    categories = {col: sorted(values[col]) for col in category_features}
+
+    os.makedirs(out_dir, exist_ok=True)
+    columns = feature_columns()
+    shape = (sum(rows.values()), len(columns))
+    # Write to a temporary file so readers never map a half-written matrix
+    matrix = np.lib.format.open_memmap(matrix_fn + ".tmp", mode="w+", dtype=FEATURE_DTYPE, shape=shape)
+    offsets = {}
+    start = 0
+    needed = [col for col, _ in columns]
+    for year, fmt, file_name in partitions:
+        df = read_stack_file(file_name, StackType.WIDE, fmt, needed)
+        matrix[start:start + len(df)] = feature_block(df, categories)
+        offsets[str(year)] = [start, start + len(df)]
+        start += len(df)
+    matrix.flush()
+    del matrix
+    os.replace(matrix_fn + ".tmp", matrix_fn)
+
+    schema = {
+        "dtype": np.dtype(FEATURE_DTYPE).name,
+        "shape": list(shape),
+        "columns": [col for col, _ in columns],
+        "kinds": {col: kind for col, kind in columns},
+        "categories": categories,
+        "years": offsets,
+        "partitions": manifest,
+        "code_version": code_version(feature_code_modules)
+    }
+    with open(os.path.join(out_dir, SCHEMA_FN), "w") as f:
+        json.dump(schema, f, indent=2)
+    logger.info(f"Feature store saved to {matrix_fn}, shape {shape}")
+    return matrix_fn
+
+
+def load_feature_store(data_dir: str, mmap_mode: str = "r"):
+    """
+    Open the feature matrix written by build_stack(feature_store=True) without copying it.
+
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    mmap_mode (str): Memory-map mode passed to np.load; None reads the matrix into memory. Defaults to "r".
+
+    Returns:
+    FeatureStore: The matrix and its schema.
+
+    Raises:
+    FileNotFoundError: If the feature store has not been built.
+    """
+    out_dir = feature_store_dir(data_dir)
+    matrix_fn = os.path.join(out_dir, MATRIX_FN)
+    if not os.path.exists(matrix_fn):
+        raise FileNotFoundError(f"Feature store '{matrix_fn}' not found. Please run build_stack(feature_store=True) to generate it.")
+    with open(os.path.join(out_dir, SCHEMA_FN)) as f:
+        schema = json.load(f)
+    return FeatureStore(np.load(matrix_fn, mmap_mode=mmap_mode), schema)
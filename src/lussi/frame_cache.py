@@ -0,0 +1,198 @@
+"""
+Process-wide LRU cache of the frames returned by load_stack and load_zip.
+
+Notebooks and report jobs load the same tables over and over, e.g. once per chart cell.
+load_stack and load_zip keep what they read here, keyed on the call's arguments and the
+path, modification time and size of every file it read, so a repeat load returns in
+microseconds and a file rewritten by build_stack or build_zip (in this process or any
+other) is read again. The cache is bounded by the estimated size of the frames it holds,
+evicting the least recently used first.
+
+Every load returns its own copy of the cached frame, so changing it, in place or not,
+never changes the cache. The copy is a deep one, which takes a fraction of the time a
+read does. Two options make repeat loads free instead: with pandas Copy-on-Write
+enabled the copy is a shallow one, which pandas copies lazily on the first write, and
+copy=False returns the cached frame itself, which the caller must treat as read-only:
+
+    pd.options.mode.copy_on_write = True                       # safe, makes loads free
+    wide = load_stack(data_dir, StackType.WIDE)
+    wide = load_stack(data_dir, StackType.WIDE, copy=False)    # shared, do not modify
+    frame_cache.info()                                         # hits, misses, entries, bytes
+
+The default bound is a quarter of the machine's memory, and at least enough for the
+full wide stack; frame_cache.resize changes it.
+"""
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Share of the machine's physical memory the cache holds by default
+MEMORY_FRACTION = 0.25
+
+# Smallest default bound, above the full wide stack's 1.55 GB, and the bound where
+# physical memory is unknown
+DEFAULT_MAX_BYTES = 2 << 30
+
+# Values sampled per text column to estimate its size
+SIZE_SAMPLE = 1000
+
+
+def file_signature(file_names):
+    """
+    Return (path, modification time in ns, size) of each file, which changes whenever a file is rewritten.
+    """
+    signature = []
+    for file_name in file_names:
+        stat = os.stat(file_name)
+        signature.append((os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def frame_nbytes(df):
+    """
+    Estimate a DataFrame's memory use. Text columns are estimated from a sample of their
+    values, since measuring every string (memory_usage(deep=True)) takes about as long as reading them.
+    """
+    nbytes = int(df.memory_usage(index=True, deep=False).sum())
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].to_numpy()
+        if len(values):
+            sample = values[::max(len(values) // SIZE_SAMPLE, 1)]
+            nbytes += int(np.mean([sys.getsizeof(value) for value in sample]) * len(values))
+    return nbytes
+
+
+def default_max_bytes():
+    """
+    Return MEMORY_FRACTION of the physical memory, but at least DEFAULT_MAX_BYTES, which
+    is also the bound where os.sysconf cannot report the memory (Windows).
+    """
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return DEFAULT_MAX_BYTES
+    return max(int(memory * MEMORY_FRACTION), DEFAULT_MAX_BYTES)
+
+
+def private_copy(df):
+    """
+    Copy a cached frame for a caller: shallow under pandas Copy-on-Write, which keeps
+    writes to either frame from reaching the other, deep otherwise.
+    """
+    return df.copy(deep=pd.options.mode.copy_on_write is not True)
+
+
+class FrameCache:
+    """
+    A size-bounded LRU cache of DataFrames read from files.
+
+    Parameters:
+    max_bytes (int): Bound on the estimated size of the cached frames; 0 disables caching.
+        Defaults to default_max_bytes().
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, key, data_dir: str, file_names, loader, copy: bool = True):
+        """
+        Return the frame cached for key and the current state of file_names, or call loader
+        to read it and cache the result.
+
+        Parameters:
+        key (tuple): The load's arguments, hashable.
+        data_dir (str): Directory the files are in, for invalidate.
+        file_names (list): Every file loader reads. Without any, loader is called uncached
+            (and is expected to raise FileNotFoundError).
+        loader (callable): Reads the frame.
+        copy (bool): Return a copy of a cached frame (see private_copy). False returns the
+            cached frame itself, which must not be modified. Defaults to True.
+
+        Returns:
+        pd.DataFrame: The frame. A frame too large to cache is returned as loaded, uncopied.
+        """
+        if not file_names or self.max_bytes <= 0:
+            return loader()
+        data_dir = os.path.abspath(data_dir)
+        key = ((data_dir, key), file_signature(file_names))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            df = loader()
+            entry = (df, frame_nbytes(df), data_dir)
+            if not self._store(key, entry):
+                return df
+        return private_copy(entry[0]) if copy else entry[0]
+
+    def _store(self, key, entry):
+        """
+        Cache entry under key, evicting the least recently used frames to fit. Returns False
+        if the frame alone is over the bound and was not cached.
+        """
+        with self._lock:
+            if entry[1] > self.max_bytes:
+                logger.debug(f"Not caching a {entry[1] / 1024 ** 2:.1f} MB frame, over the cache bound")
+                return False
+            # Drop older versions of the same load, whose files have since changed
+            for stale in [other for other in self._entries if other[0] == key[0]]:
+                self._nbytes -= self._entries.pop(stale)[1]
+            self._entries[key] = entry
+            self._nbytes += entry[1]
+            while self._nbytes > self.max_bytes:
+                _, (_, nbytes, _) = self._entries.popitem(last=False)
+                self._nbytes -= nbytes
+        return True
+
+    def invalidate(self, data_dir: str = None):
+        """
+        Drop the frames loaded from data_dir, or every frame if data_dir is None.
+        """
+        data_dir = os.path.abspath(data_dir) if data_dir is not None else None
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if data_dir is None or entry[2] == data_dir]:
+                self._nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """
+        Drop every frame and reset the hit and miss counts.
+        """
+        self.invalidate()
+        self.hits = self.misses = 0
+
+    def resize(self, max_bytes: int):
+        """
+        Change the size bound, evicting the least recently used frames to fit it.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._entries and self._nbytes > max(max_bytes, 0):
+                _, (_, nbytes, _) = self._entries.popitem(last=False)
+                self._nbytes -= nbytes
+
+    def info(self):
+        """
+        Return the cache's hits, misses, number of entries, estimated bytes held and bound.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._nbytes, "max_bytes": self.max_bytes}
+
+
+# The cache load_stack and load_zip use
+frame_cache = FrameCache()
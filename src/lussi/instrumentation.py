@@ -0,0 +1,206 @@
+"""
+Stage-level instrumentation for the build pipelines.
+
+build_stack and build_zip run inside a RunReport and wrap each stage of their work
+(download, parse, rename/select, averaging, mutations, vectorization, write, ...) in
+stage(). Each stage records its wall time, rows processed, throughput and memory, and
+the report can be written as JSON to track builds over time:
+
+    build_stack(data_dir, report_file="build_report.json", track_memory=True)
+
+Progress messages go to the "lussi" logger, which is silent unless configured, e.g.
+with enable_logging().
+"""
+import sys
+import json
+import time
+import logging
+import platform
+import threading
+import tracemalloc
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger("lussi")
+
+# The report stages are recorded into, set by run_report
+_active_report = None
+
+
+def enable_logging(level=logging.INFO):
+    """
+    Print the pipeline's progress messages (and warnings) to stderr.
+
+    Parameters:
+    level (int): Lowest level printed, e.g. logging.DEBUG for per-column details. Defaults to logging.INFO.
+    """
+    if not any(isinstance(handler, logging.StreamHandler) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+def max_rss_mb():
+    """
+    Return the process' peak resident set size so far in MB, or None where unsupported.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(max_rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+class RunReport:
+    """
+    Collects stage records for one pipeline run.
+
+    Parameters:
+    name (str): Name of the run, e.g. "build_stack".
+    track_memory (bool): Trace Python allocations with tracemalloc to record each stage's
+        peak memory. This slows the run down noticeably. Defaults to False.
+    """
+
+    def __init__(self, name: str, track_memory: bool = False):
+        self.name = name
+        self.track_memory = track_memory
+        self.params = {}
+        self.stages = []
+        self.started_at = time.time()
+        self.seconds = None
+        self._start = time.perf_counter()
+        self._open = []
+        self._lock = threading.Lock()
+
+    def _fold_peak(self):
+        # Credit the traced peak since the last reset to every stage still running
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._open:
+            record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = None, **fields):
+        """
+        Time a stage. The yielded record can be updated inside the block, e.g. to set
+        record["rows"] once the number of rows is known.
+        """
+        record = {"stage": name, **fields, "rows": rows}
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        with self._lock:
+            if tracing:
+                self._fold_peak()
+                record["_peak"] = tracemalloc.get_traced_memory()[0]
+            self._open.append(record)
+        start = time.perf_counter()
+        record["status"] = "error"
+        try:
+            yield record
+            record["status"] = "ok"
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                if tracing:
+                    self._fold_peak()
+                self._open.remove(record)
+                peak = record.pop("_peak", None)
+                record["seconds"] = round(seconds, 4)
+                rows = record["rows"]
+                record["rows_per_second"] = round(rows / seconds) if rows and seconds > 0 else None
+                record["peak_mb"] = round(peak / 1024 ** 2, 1) if peak is not None else None
+                record["max_rss_mb"] = max_rss_mb()
+                self.stages.append(record)
+            logger.debug(f"Stage {name} took {seconds:.3f}s" + (f" for {rows} rows" if rows else ""))
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self._start, 4)
+
+    def totals(self):
+        """
+        Return the total seconds and rows of each stage name, in order of first appearance.
+        """
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"seconds": 0.0, "rows": 0, "count": 0})
+            total["seconds"] = round(total["seconds"] + record["seconds"], 4)
+            total["rows"] += record["rows"] or 0
+            total["count"] += 1
+        return totals
+
+    def to_dict(self):
+        import pandas as pd
+        import numpy as np
+        return {
+            "run": self.name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "seconds": self.seconds,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "track_memory": self.track_memory,
+            "max_rss_mb": max_rss_mb(),
+            "params": self.params,
+            "totals": self.totals(),
+            "stages": self.stages
+        }
+
+    def write(self, file_name: str):
+        """
+        Write the report as JSON.
+        """
+        with open(file_name, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+
+@contextlib.contextmanager
+def run_report(name: str, report_file: str = None, track_memory: bool = False, **params):
+    """
+    Record the stages run inside the block into a new RunReport, and write it to
+    report_file (if given) when the block exits, also on failure.
+
+    Parameters:
+    name (str): Name of the run.
+    report_file (str): Path of the JSON report to write. Defaults to None (not written).
+    track_memory (bool): Record peak memory per stage with tracemalloc. Defaults to False.
+    params: Parameters of the run, stored in the report.
+
+    Yields:
+    RunReport: The report.
+    """
+    global _active_report
+    report = RunReport(name, track_memory)
+    report.params = params
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    previous, _active_report = _active_report, report
+    try:
+        yield report
+    finally:
+        _active_report = previous
+        if started_tracing:
+            tracemalloc.stop()
+        report.finish()
+        if report_file:
+            report.write(report_file)
+            logger.info(f"Run report written to {report_file}")
+
+
+@contextlib.contextmanager
+def stage(name: str, rows: int = None, **fields):
+    """
+    Time a stage into the active run report; outside of a run this only yields a record
+    that is discarded. Stages in process pool workers are not recorded.
+    """
+    report = _active_report
+    if report is None:
+        yield {"stage": name, **fields, "rows": rows}
+    else:
+        with report.stage(name, rows, **fields) as record:
+            yield record
@@ -0,0 +1,125 @@
+"""
+Polars implementation of the stack transforms, selected with engine="polars" in
+build_stack, merge_years and build_wide_stack.
+
+Every rule is still evaluated by the pandas code in lussi.stackoverflow, but only
+once per distinct value; Polars does the per-row work (splitting, lookups and
+broadcasting) lazily and on all cores. The result is converted back to pandas and
+written exactly as the pandas engine's output is.
+"""
+import re
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from lussi.stackoverflow import (aws_entries, cached_extract_and_average, classify_distinct, databases,
+                                 indicator_column_name, languages, mutation_rules, platforms)
+
+
+def add_average_columns(df):
+    """
+    Polars version of stackoverflow.add_average_columns. Only the averaged columns go
+    through Polars, so the other columns keep their pandas values, e.g. NaN and None stay
+    apart for the mutation rules (see mutation_expression).
+    """
+    averages = pl.from_pandas(df[["YearsCodePro", "OrgSize", "Age"]]).lazy().select([
+        average_expression("YearsCodePro", df).alias("YearsCodeProAvg"),
+        average_expression("OrgSize", df).alias("OrgSizeAvg"),
+        average_expression("Age", df).alias("AgeAvg")
+    ]).collect()
+    for col in averages.columns:
+        df[col] = averages.get_column(col).to_numpy()
+    return df
+
+
+def average_expression(colname, df):
+    # Missing values average to NaN, as str(NaN) = "nan" has no digits
+    uniques = [value for value in pd.unique(df[colname]) if not pd.isna(value)]
+    averages = [cached_extract_and_average(str(value)) for value in uniques]
+    return pl.col(colname).cast(pl.String).replace_strict(
+        [str(value) for value in uniques], averages, default=None, return_dtype=pl.Float64
+    ).fill_null(np.nan)
+
+
+def token_match_expression(colname, distinct_tokens, pattern, sep=";"):
+    """
+    Build a boolean expression that is true where any token of colname matches pattern.
+    The regex only runs over distinct_tokens; the rows are matched by set membership.
+    """
+    regex = re.compile(pattern, re.IGNORECASE)
+    matching = [token for token in distinct_tokens if regex.search(token)]
+    return (
+        pl.col(colname).cast(pl.String).str.split(sep)
+        .list.eval(pl.element().str.strip_chars().is_in(matching))
+        .list.any()
+        .fill_null(False)
+    )
+
+
+def indicator_expressions(df, colname, patterns, names):
+    distinct_tokens = (
+        df.select(pl.col(colname).cast(pl.String).str.split(";").explode().str.strip_chars().drop_nulls().unique())
+        .get_column(colname).to_list()
+    )
+    return [
+        pl.when(token_match_expression(colname, distinct_tokens, pattern)).then(pl.lit("yes")).otherwise(pl.lit("no")).alias(name)
+        for pattern, name in zip(patterns, names)
+    ]
+
+
+def vector_expressions(df, colname, values_to_search):
+    patterns = [fr"\b{re.escape(value)}\b" for value in values_to_search]
+    return indicator_expressions(df, colname, patterns, [indicator_column_name(value) for value in values_to_search])
+
+
+def list_expressions(df, colname, values_to_search):
+    new_col = list(values_to_search.keys())[0]
+    pattern = fr"\b({'|'.join(values_to_search[new_col])})\b"
+    return indicator_expressions(df, colname, [pattern], [new_col])
+
+
+def none_mask_name(source):
+    """
+    Name of the temporary column marking the rows where source is None rather than NaN.
+    """
+    return f"__none__{source}"
+
+
+def mutation_expression(df, source, target, rules, default):
+    """
+    Polars version of one post_build_mutations rule table: classify_distinct runs over
+    the distinct values of source and the result is looked up for each row.
+
+    Polars has a single null, but the pandas engine tells NaN (a missing answer, from
+    read_survey) from None (a column the year's survey lacks, added by rename_and_select),
+    so df carries the none_mask_name column marking the None rows.
+    """
+    uniques = df.get_column(source).unique().drop_nulls().to_list()
+    classified = classify_distinct(pd.Series(uniques + [np.nan, None], dtype=object), rules, default)
+    values = [None if pd.isna(value) else str(value) for value in classified]
+    return (
+        pl.when(pl.col(none_mask_name(source))).then(pl.lit(values[-1], dtype=pl.String))
+        .when(pl.col(source).is_null()).then(pl.lit(values[-2], dtype=pl.String))
+        .otherwise(pl.col(source).cast(pl.String).replace_strict(
+            [str(value) for value in uniques], values[:-2], default=None, return_dtype=pl.String))
+        .alias(target)
+    )
+
+
+def build_wide_stack(raw_stack):
+    """
+    Polars version of stackoverflow.build_wide_stack, with the same columns in the same order.
+    """
+    sources = list(dict.fromkeys(source for source, _, _, _ in mutation_rules))
+    none_masks = [pl.Series(none_mask_name(source), np.equal(raw_stack[source].to_numpy(dtype=object), None))
+                  for source in sources]
+    df = pl.from_pandas(raw_stack).with_columns(none_masks)
+    frame = df.lazy()
+    frame = frame.with_columns(vector_expressions(df, "LanguageWorkedWith", languages)
+                               + vector_expressions(df, "DatabaseWorkedWith", databases)
+                               + vector_expressions(df, "PlatformWorkedWith", platforms))
+    for source, target, rules, default in mutation_rules:
+        frame = frame.with_columns(mutation_expression(df, source, target, rules, default))
+    frame = frame.with_columns(list_expressions(df, "PlatformWorkedWith", aws_entries))
+    frame = frame.drop([none_mask_name(source) for source in sources])
+    return frame.collect().to_pandas()
@@ -1,21 +1,18 @@
-from lussi.stackoverflow import *
-from lussi.ziprecruiter import *
-
 """
 Run like this: 
 (.venv) hurricane:krijudato afraser$ python ./src/lussi/run.py
+
+This builds out your caches (only what is missing or stale) and prints the head of each
+table. For anything else use the command line interface, e.g.:
+(.venv) hurricane:krijudato afraser$ python -m lussi --help
 """
+from lussi.cli import main
 
 # run this to build out your caches.
 nogit_data_dir = "622data_nogit"
-build_stack(data_dir=nogit_data_dir)
-build_zip(data_dir=nogit_data_dir)
-
-# this is how you load.
-raw_stack  = load_stack(data_dir = nogit_data_dir, stack_type=StackType.RAW)
-wide_stack = load_stack(data_dir = nogit_data_dir, stack_type=StackType.WIDE)
-ziprecruiter = load_zip(data_dir = nogit_data_dir)
+main(["-v", "build-stack", nogit_data_dir])
+main(["-v", "build-zip", nogit_data_dir])
 
-print(raw_stack.head())
-print(wide_stack.head())
-print(ziprecruiter.head())
\ No newline at end of file
+# this is how you load; in python, use load_stack(nogit_data_dir, StackType.WIDE) and load_zip(nogit_data_dir).
+for table in ["raw", "wide", "zip"]:
+    main(["load", nogit_data_dir, "--stack", table])
@@ -0,0 +1,118 @@
+import os
+import re
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Seconds a snapshot stays fresh by default
+SNAPSHOT_TTL = 7 * 24 * 3600
+
+# File name of a snapshot: its UTC fetch time, which sorts in time order
+SNAPSHOT_TIME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+class SnapshotStore:
+    """
+    Timestamped store of fetched web pages.
+
+    Every page saved for a URL is kept as <root>/<URL name>/<fetch time>.html, so pages
+    can be parsed again later without fetching them, e.g. after the parsing or cleaning
+    code changes. The newest snapshot of a URL is fresh until it is ttl seconds old;
+    get returns fresh snapshots only, unless asked for the newest one whatever its age.
+
+    Parameters:
+    root (str): Directory holding the snapshots.
+    ttl (float): Seconds a snapshot stays fresh; None keeps snapshots fresh forever and 0
+        makes every snapshot stale. Defaults to SNAPSHOT_TTL.
+    """
+
+    def __init__(self, root: str, ttl: float = SNAPSHOT_TTL):
+        self.root = root
+        self.ttl = ttl
+
+    def url_dir(self, url: str):
+        """
+        Return the directory of a URL's snapshots, named after the end of the URL plus a hash
+        of all of it, e.g. <root>/What-Is-the-Average-Data-Engineer-Salary-by-State-3f2a9c01d4.
+        """
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", url.rstrip("/").rsplit("/", 1)[-1])[-80:]
+        return os.path.join(self.root, f"{name}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]}")
+
+    def latest(self, url: str):
+        """
+        Return (path, fetch time as a Unix timestamp) of the newest snapshot of a URL, or None if there is none.
+        """
+        url_dir = self.url_dir(url)
+        if not os.path.isdir(url_dir):
+            return None
+        file_names = sorted(file_name for file_name in os.listdir(url_dir) if file_name.endswith(".html"))
+        if not file_names:
+            return None
+        fetched_at = datetime.strptime(file_names[-1][:-len(".html")], SNAPSHOT_TIME_FORMAT)
+        return os.path.join(url_dir, file_names[-1]), fetched_at.replace(tzinfo=timezone.utc).timestamp()
+
+    def is_fresh(self, fetched_at: float):
+        """
+        Check whether a snapshot fetched at this Unix timestamp is still within the TTL.
+        """
+        if self.ttl is None:
+            return True
+        return datetime.now(timezone.utc).timestamp() - fetched_at < self.ttl
+
+    def get(self, url: str, fresh_only: bool = True):
+        """
+        Return the HTML of the newest snapshot of a URL.
+
+        Parameters:
+        url (str): The page's URL.
+        fresh_only (bool): Ignore a snapshot older than the TTL. Defaults to True.
+
+        Returns:
+        str: The page's HTML, or None if there is no (fresh) snapshot.
+        """
+        latest = self.latest(url)
+        if latest is None:
+            return None
+        path, fetched_at = latest
+        if fresh_only and not self.is_fresh(fetched_at):
+            logger.debug(f"Snapshot {path} of {url} has expired")
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def save(self, url: str, html: str):
+        """
+        Save a page fetched just now as the newest snapshot of its URL.
+
+        Returns:
+        str: Path of the snapshot.
+        """
+        url_dir = self.url_dir(url)
+        os.makedirs(url_dir, exist_ok=True)
+        path = os.path.join(url_dir, f"{datetime.now(timezone.utc).strftime(SNAPSHOT_TIME_FORMAT)}.html")
+        # Write to a temporary file so a killed run never leaves a truncated snapshot
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(path + ".tmp", path)
+        logger.debug(f"Saved snapshot of {url} to {path}")
+        return path
+
+    def prune(self, keep: int = 1):
+        """
+        Delete all but the newest keep snapshots of every URL.
+
+        Returns:
+        int: Number of snapshots deleted.
+        """
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for name in os.listdir(self.root):
+            url_dir = os.path.join(self.root, name)
+            file_names = sorted(file_name for file_name in os.listdir(url_dir) if file_name.endswith(".html"))
+            for file_name in file_names[:max(len(file_names) - keep, 0)]:
+                os.remove(os.path.join(url_dir, file_name))
+                removed += 1
+        return removed
@@ -2,7 +2,24 @@ import pandas as pd
 import numpy as np
 import re
 import os
+import sys
+import json
+import logging
+import csv
+import numbers
+import hashlib
+import urllib.request
+import contextlib
+import multiprocessing
 from enum import Enum
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lussi.downloads import DownloadCache
+from lussi.frame_cache import frame_cache
+from lussi.instrumentation import run_report, stage
+from lussi.states import STATE_CODE_DTYPE, encode_states
+
+logger = logging.getLogger(__name__)
 
 
 # Define URLs
@@ -13,13 +30,201 @@ select_cols = ["Year", "OrgSize", "Country", "Employment", "Gender", "EdLevel",
                "Sexuality", "Ethnicity", "DatabaseWorkedWith", "LanguageWorkedWith", "PlatformWorkedWith", 
                "YearsCodePro", "AnnualSalary"]
 
+# Columns a sampled build stratifies on, so every year keeps its mix of countries
+sample_strata = ["Year", "Country"]
+
+# Rows per shard when the wide transforms run in a process pool
+wide_shard_rows = 250_000
+
+# Bytes of survey CSV per block; a survey is read one block at a time, which bounds the
+# memory ingestion needs beyond the selected columns themselves
+ingest_block_size = 16 << 20
+
 raw_stack_fn = "merged_stack_raw.csv"
 wide_stack_fn = "merged_stack_wide.csv"
+stack_manifest_fn = "merged_stack_manifest.json"
+
+# Modules whose code shapes the stack partitions; editing any of them rebuilds the partitions
+stack_code_modules = ["stackoverflow.py", "states.py", "polars_engine.py"]
+
+# File in a derived artifact's directory recording the code version of each year's partition
+partition_versions_fn = "versions.json"
+
+# Technologies turned into indicator columns of the wide stack
+languages = ["Python", "SQL", "Java", "JavaScript", "Ruby", "PHP", "C++", "Swift", "Scala", "R", "Rust", "Julia"]
+databases = ["MySQL", "Microsoft SQL Server", "MongoDB", "PostgreSQL", "Oracle", "IBM DB2", "Redis", "SQLite", "MariaDB"]
+platforms = ["Microsoft Azure", "Google Cloud", "IBM Cloud or Watson", "Kubernetes", "Linux", "Windows"]
+aws_entries = {"aws": ["AWS", "aws", "Amazon Web Services", "Amazon Web Services (AWS)"]}
+
+# Value of an indicator column for a row without and with the technology, by match (0 or 1)
+indicator_values = np.array(["no", "yes"], dtype=object)
+
+def indicator_column_name(value):
+    # Create a cleaned column name based on the value, e.g. "Microsoft SQL Server" -> "microsoftsqlserver"
+    return re.sub(r"[^a-zA-Z0-9]", "", value.lower())
+
+# The yes/no indicator columns of the wide stack
+indicator_cols = [indicator_column_name(value) for value in languages + databases + platforms] + list(aws_entries)
+
+# Normalization rules applied by post_build_mutations, as (source, target, rules, default).
+# See classify_distinct: a string matcher is a case-insensitive regex, a list matches exact values.
+mutation_rules = [
+    # Group 'EdLevel' into education levels, kept as a string otherwise
+    ("EdLevel", "EdLevel", [
+        ("master", "Masters"),
+        ("associate", "Associates"),
+        ("bachelor", "Bachelors"),
+        ("doctoral", "Doctorate"),
+        ("professional", "Professional"),
+        ("primary", "Primary"),
+        ("secondary", "Secondary"),
+        ("college", "Some College"),
+        ("never", "No Education"),
+        ("else", "Something Else")
+    ], "source_str"),
+    ("Sexuality", "sexuality_grouped", [
+        ("Straight / Heterosexual|Straight or heterosexual", "straight"),
+        ("Bisexual|Gay or Lesbian|Queer|Asexual|Prefer", "lgbtq")
+    ], np.nan),
+    ("Ethnicity", "ethnicity_grouped", [
+        ("White|European", "non-minority"),
+        ([np.nan, "Prefer not to say", "Or, in your own words:", "I don’t know", "I prefer not to say"], np.nan)
+    ], "minority"),
+    # Map 'Gender' to standard categories
+    ("Gender", "Gender", [
+        (["Woman"], "Female"),
+        (["Man"], "Male")
+    ], "source"),
+    ("Employment", "Employment", [
+        ("full", "Full-Time"),
+        ("retired", "Retired"),
+        ("part", "Part-Time"),
+        ("independent", "Self-Employed")
+    ], "source"),
+    # Replace "America" with "United States"
+    ("Country", "Country", [
+        ("america", "United States")
+    ], "source")
+]
+
+# Row predicate operators accepted by query_stack and load_stack
+filter_ops = {
+    "==": lambda series, value: series == value,
+    "=": lambda series, value: series == value,
+    "!=": lambda series, value: series != value,
+    "<": lambda series, value: series < value,
+    "<=": lambda series, value: series <= value,
+    ">": lambda series, value: series > value,
+    ">=": lambda series, value: series >= value,
+    "in": lambda series, value: series.isin(value),
+    "not in": lambda series, value: ~series.isin(value)
+}
+
+# Rows per Parquet row group, so filtered reads can skip parts of a year
+parquet_row_group_size = 50_000
+
+# Low-cardinality text columns stored as categoricals in a compact stack
+categorical_cols = ["Country", "EdLevel", "Employment", "Gender", "sexuality_grouped", "ethnicity_grouped"]
+
+# Numeric columns downcast in a compact stack. AnnualSalary stays float64, as float32
+# cannot hold every whole-dollar salary above 16.7M exactly
+downcast_dtype_dict = {
+    'Year': 'int16',
+    'YearsCodeProAvg': 'float32',
+    'OrgSizeAvg': 'float32',
+    'AgeAvg': 'float32'
+}
 
 class StackType(Enum):
     RAW = 'raw'
     WIDE = 'wide'
 
+class CacheFormat(Enum):
+    PARQUET = 'parquet'
+    FEATHER = 'feather'  # Arrow IPC
+    CSV = 'csv'
+
+# Strings pandas.read_csv treats as missing by default
+csv_na_values = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                 "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+# Define data types for the raw and wide stacks
+raw_dtype_dict = {
+    'Year': 'int64',
+    'OrgSize': 'str',
+    'Country': 'str',
+    'Employment': 'str',
+    'Gender': 'str',
+    'EdLevel': 'str',
+    'US_State': 'str',
+    'Age': 'str',
+    'DevType': 'str',
+    'Sexuality': 'str',
+    'Ethnicity': 'str',
+    'DatabaseWorkedWith': 'str',
+    'LanguageWorkedWith': 'str',
+    'PlatformWorkedWith': 'str',
+    'YearsCodePro': 'str',
+    'AnnualSalary': 'float64',
+    'YearsCodeProAvg': 'float64',
+    'OrgSizeAvg': 'float64',
+    'AgeAvg': 'float64'
+}
+
+wide_dtype_dict = {
+    'Year': 'int64',
+    'OrgSize': 'str',
+    'Country': 'str',
+    'Employment': 'str',
+    'Gender': 'str',
+    'EdLevel': 'str',
+    'US_State': 'str',
+    'Age': 'str',
+    'DevType': 'str',
+    'Sexuality': 'str',
+    'Ethnicity': 'str',
+    'DatabaseWorkedWith': 'str',
+    'LanguageWorkedWith': 'str',
+    'PlatformWorkedWith': 'str',
+    'YearsCodePro': 'str',
+    'AnnualSalary': 'float64',
+    'YearsCodeProAvg': 'float64',
+    'OrgSizeAvg': 'float64',
+    'AgeAvg': 'float64',
+    # Additional binary columns for wide format
+    'python': 'str',
+    'sql': 'str',
+    'java': 'str',
+    'javascript': 'str',
+    'ruby': 'str',
+    'php': 'str',
+    'c': 'str',
+    'swift': 'str',
+    'scala': 'str',
+    'r': 'str',
+    'rust': 'str',
+    'julia': 'str',
+    'mysql': 'str',
+    'microsoftsqlserver': 'str',
+    'mongodb': 'str',
+    'postgresql': 'str',
+    'oracle': 'str',
+    'ibmdb2': 'str',
+    'redis': 'str',
+    'sqlite': 'str',
+    'mariadb': 'str',
+    'microsoftazure': 'str',
+    'googlecloud': 'str',
+    'ibmcloudorwatson': 'str',
+    'kubernetes': 'str',
+    'linux': 'str',
+    'windows': 'str',
+    'sexuality_grouped': 'str',
+    'ethnicity_grouped': 'str',
+    'aws': 'str',
+    'state_code': STATE_CODE_DTYPE
+}
+
 # Function to extract numbers and take the average
 def extract_and_average(year_string):
     # print(f"Extracting and averaging values from: {year_string}")
@@ -27,10 +232,38 @@ def extract_and_average(year_string):
     numbers = list(map(int, re.findall(r"\d+", year_string)))
     return np.mean(numbers) if numbers else np.nan
 
+# The memoized version is shared by every year and every build in the process
+@lru_cache(maxsize=None)
+def cached_extract_and_average(value_string):
+    return extract_and_average(value_string)
+
+def average_column(series):
+    """
+    Apply extract_and_average to a column, parsing each distinct value only once.
+    
+    Parameters:
+    series (pd.Series): A range column such as Age ("25-34 years old").
+    
+    Returns:
+    np.ndarray: The averages, one per row, as float64.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    averages = np.array([cached_extract_and_average(str(value)) for value in uniques], dtype="float64")
+    return averages[codes]
+
+def add_average_columns(df):
+    """
+    Add the YearsCodeProAvg, OrgSizeAvg and AgeAvg columns to a stack.
+    """
+    df["YearsCodeProAvg"] = average_column(df["YearsCodePro"])
+    df["OrgSizeAvg"] = average_column(df["OrgSize"])
+    df["AgeAvg"] = average_column(df["Age"])
+    return df
+
 # Function to construct URLs based on year
-def construct_url(year):
-    url = f"{url_prefix}y={year}/survey_results_public.csv"
-    print(f"Constructed URL for {year}: {url}")
+def construct_url(year, prefix: str = None):
+    url = f"{prefix or url_prefix}y={year}/survey_results_public.csv"
+    logger.debug(f"Constructed URL for {year}: {url}")
     return url
 
 
@@ -39,7 +272,7 @@ def rename_and_select(df, rename_dict, add_columns=[]):
     # Add any missing columns from add_columns with NaN values
     for col in add_columns:
         if col not in df.columns:
-            print(f"Adding missing column: {col}")
+            logger.debug(f"Adding missing column: {col}")
             df[col] = None
 
     # Rename columns using the provided dictionary
@@ -53,238 +286,924 @@ def rename_and_select(df, rename_dict, add_columns=[]):
     # Add any missing columns from select_cols to the DataFrame with NaN values for consistency
     for col in select_cols:
         if col not in df.columns:
-            print(f"Adding missing column for consistency: {col}")
+            logger.debug(f"Adding missing column for consistency: {col}")
             df[col] = None
 
-    # Print columns before selection for debugging
-    print(f"Columns before selection for year {df['Year'].unique()}: {df.columns.tolist()}")
+    # Log columns before selection for debugging
+    logger.debug(f"Columns before selection for year {df['Year'].unique()}: {df.columns.tolist()}")
 
     # Return the dataframe with only the selected columns (filtered by select_cols)
     return df[select_cols]
 
 
-# Function to merge years' data
-# Function to merge years' data
-def merge_years(years):
-    print("Starting merge process for years:", years)
+class SurveySchema:
+    """
+    How one survey year's file maps onto the common raw schema (select_cols).
     
-    def process_year(year):
-        print(f"Processing data for year: {year}")
-        url = construct_url(year)
-        print(f"Loading data for year {year} from URL...")
-        try:
-            df = pd.read_csv(url)  # Load the full dataset for each year
-            print(f"Data for year {year} loaded successfully, shape: {df.shape}")
-        except Exception as e:
-            print(f"Error loading data for year {year} from {url}: {e}")
-            return None
+    Parameters:
+    renames (dict): Source column name to common-schema name, for the columns this year's
+        survey names differently. Defaults to none.
+    missing (list): Common-schema columns this year's survey does not have; they are added empty.
+    dtypes (dict): Common-schema column to dtype, for columns this year's survey stores
+        differently from raw_dtype_dict. Defaults to none.
+    """
 
-        df["Year"] = year
-        print(f"Added 'Year' column to data for {year}")
-
-        # Handle column renaming for each year
-        if year == 2017:
-            rename_dict = {
-                "FormalEducation": "EdLevel",
-                "CompanySize": "OrgSize",
-                "DeveloperType": "DevType",
-                "EmploymentStatus": "Employment",
-                "HaveWorkedDatabase": "DatabaseWorkedWith",
-                "HaveWorkedLanguage": "LanguageWorkedWith",
-                "YearsProgram": "YearsCodePro",
-                "Salary": "AnnualSalary",
-                "HaveWorkedPlatform": "PlatformWorkedWith",
-                "Race": "Ethnicity"
-            }
-            add_columns = ["Age", "US_State", "Sexuality"]
-        elif year == 2018:
-            rename_dict = {
-                "FormalEducation": "EdLevel",
-                "CompanySize": "OrgSize",
-                "YearsCoding": "YearsCodePro",
-                "ConvertedSalary": "AnnualSalary",
-                "SexualOrientation": "Sexuality",
-                "RaceEthnicity": "Ethnicity"
-            }
-            add_columns = ["US_State"]
-        elif year in [2021, 2022, 2023, 2024]:
-            rename_dict = {
-                "ConvertedCompYearly": "AnnualSalary",
-                "LanguageHaveWorkedWith": "LanguageWorkedWith",
-                "DatabaseHaveWorkedWith": "DatabaseWorkedWith",
-                "PlatformHaveWorkedWith": "PlatformWorkedWith"
-            }
-            add_columns = ["US_State"]
-        else:
-            rename_dict = {}
-            add_columns = []
+    def __init__(self, renames=None, missing=(), dtypes=None):
+        self.renames = dict(renames or {})
+        self.missing = list(missing)
+        self.dtypes = dict(dtypes or {})
 
-        print(f"Renaming and selecting columns for year {year} with rename_dict: {rename_dict} and add_columns: {add_columns}")
-        try:
-            df = rename_and_select(df, rename_dict, add_columns=add_columns)
-            print(f"Columns renamed and selected for {year}, shape: {df.shape}")
-        except KeyError as ke:
-            print(f"Error selecting columns for year {year}: {ke}")
-            return None
+    def source_columns(self):
+        """
+        Return the survey's source column name of each common-schema column it has, in select_cols order.
+        
+        Returns:
+        dict: Source column name to common-schema column name.
+        """
+        source_names = {target: source for source, target in self.renames.items()}
+        return {source_names.get(col, col): col for col in select_cols if col != "Year" and col not in self.missing}
+
+    def column_types(self):
+        """
+        Return the Arrow type each source column is parsed as.
+        """
+        import pyarrow as pa
+        types = {}
+        for source, target in self.source_columns().items():
+            dtype = self.dtypes.get(target, raw_dtype_dict[target])
+            types[source] = pa.string() if dtype == "str" else pa.from_numpy_dtype(np.dtype(dtype))
+        return types
+
+    def __repr__(self):
+        return f"SurveySchema(renames={self.renames}, missing={self.missing}, dtypes={self.dtypes})"
 
+
+# Renames shared by the surveys since 2021, which added "Have" to the technology column names
+renames_since_2021 = {
+    "ConvertedCompYearly": "AnnualSalary",
+    "LanguageHaveWorkedWith": "LanguageWorkedWith",
+    "DatabaseHaveWorkedWith": "DatabaseWorkedWith",
+    "PlatformHaveWorkedWith": "PlatformWorkedWith"
+}
+
+# Schema of each survey year; adding a year to the stack means adding its entry here
+survey_schemas = {
+    2017: SurveySchema(
+        renames={
+            "FormalEducation": "EdLevel",
+            "CompanySize": "OrgSize",
+            "DeveloperType": "DevType",
+            "EmploymentStatus": "Employment",
+            "HaveWorkedDatabase": "DatabaseWorkedWith",
+            "HaveWorkedLanguage": "LanguageWorkedWith",
+            "YearsProgram": "YearsCodePro",
+            "Salary": "AnnualSalary",
+            "HaveWorkedPlatform": "PlatformWorkedWith",
+            "Race": "Ethnicity"
+        },
+        missing=["Age", "US_State", "Sexuality"]
+    ),
+    2018: SurveySchema(
+        renames={
+            "FormalEducation": "EdLevel",
+            "CompanySize": "OrgSize",
+            "YearsCoding": "YearsCodePro",
+            "ConvertedSalary": "AnnualSalary",
+            "SexualOrientation": "Sexuality",
+            "RaceEthnicity": "Ethnicity"
+        },
+        missing=["US_State"]
+    ),
+    2019: SurveySchema(),
+    2020: SurveySchema(),
+    2021: SurveySchema(renames=renames_since_2021, missing=["US_State"]),
+    2022: SurveySchema(renames=renames_since_2021, missing=["US_State"]),
+    2023: SurveySchema(renames=renames_since_2021, missing=["US_State"]),
+    2024: SurveySchema(renames=renames_since_2021, missing=["US_State"])
+}
+
+# Survey years included in the stack
+stack_years = sorted(survey_schemas)
+
+def survey_schema(year):
+    """
+    Return a survey year's SurveySchema.
+    
+    Raises:
+    ValueError: If the year has no entry in survey_schemas.
+    """
+    if year not in survey_schemas:
+        raise ValueError(f"No survey schema for year {year}. Add it to survey_schemas to include it in the stack.")
+    return survey_schemas[year]
+
+def read_survey_batches(source: str, schema: SurveySchema, block_size: int = ingest_block_size):
+    """
+    Stream a survey file through Arrow's CSV reader, one block of block_size bytes at a
+    time, so only one block's worth of parsed rows is held beyond what the caller keeps.
+    Only the schema's source columns are parsed, each straight into its type, with the
+    values pandas.read_csv treats as missing read as NaN.
+    
+    Parameters:
+    source (str): Path or URL of the survey file.
+    schema (SurveySchema): The year's schema.
+    block_size (int): Bytes of CSV per batch. Defaults to ingest_block_size.
+    
+    Yields:
+    pd.DataFrame: The rows of one block, with the source columns the file has under their
+        source names. A file without rows yields one empty frame.
+    """
+    import pyarrow.csv as pacsv
+    with (urllib.request.urlopen(source) if source.startswith(("http://", "https://")) else open(source, "rb")) as f:
+        # Read the header ourselves so that columns the file lacks are left out instead of
+        # read as nulls, and the same stream carries on with the rows
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]))
+        column_types = {col: dtype for col, dtype in schema.column_types().items() if col in header}
+        read_options = pacsv.ReadOptions(column_names=header, block_size=block_size)
+        # Free-text answers can hold quoted line breaks, which a block boundary may fall inside
+        parse_options = pacsv.ParseOptions(newlines_in_values=True)
+        convert_options = pacsv.ConvertOptions(column_types=column_types, include_columns=list(column_types),
+                                               null_values=csv_na_values, strings_can_be_null=True)
+        reader = pacsv.open_csv(f, read_options=read_options, parse_options=parse_options,
+                                convert_options=convert_options)
+        empty = True
+        for batch in reader:
+            empty = False
+            yield survey_frame(batch)
+        if empty:
+            yield survey_frame(reader.schema.empty_table())
+
+def survey_frame(batch):
+    """
+    Convert a batch of survey rows from Arrow to pandas, as pandas.read_csv would read them.
+    """
+    df = batch.to_pandas()
+    # Arrow hands missing strings over as None; pandas.read_csv, and the mutation rules, use NaN
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def read_survey(source: str, schema: SurveySchema, block_size: int = ingest_block_size):
+    """
+    Parse a whole survey file into one DataFrame; see read_survey_batches.
+    """
+    return pd.concat(read_survey_batches(source, schema, block_size), axis=0, ignore_index=True)
+
+def sample_label(sample, seed: int = 0):
+    """
+    Name a sampled build, e.g. "sample-frac0.05-seed0" or "sample-rows1000-seed0".
+    
+    Raises:
+    ValueError: If sample is neither a fraction in (0, 1] nor a positive number of rows.
+    """
+    if isinstance(sample, numbers.Integral) and not isinstance(sample, bool) and sample >= 1:
+        return f"sample-rows{int(sample)}-seed{seed}"
+    if isinstance(sample, numbers.Real) and not isinstance(sample, (bool, numbers.Integral)) and 0 < sample <= 1:
+        return f"sample-frac{sample:g}-seed{seed}"
+    raise ValueError(f"Invalid sample {sample!r}. Use a fraction in (0, 1] or a number of rows per year.")
+
+def sample_data_dir(data_dir: str, sample, seed: int = 0):
+    """
+    Return the directory build_stack(sample=sample, seed=seed) writes its cache to, inside
+    data_dir next to the full cache, e.g. <data_dir>/sample-frac0.05-seed0. Pass it to
+    load_stack to load the sampled stack.
+    """
+    return os.path.join(data_dir, sample_label(sample, seed))
+
+def stratified_sample(df, sample, seed=0, by=sample_strata):
+    """
+    Draw a deterministic sample of rows that keeps each stratum's share of the frame.
+    
+    Every row gets a seeded random key and each stratum keeps its rows with the smallest
+    keys. Strata get their proportional share of the sample, with the rows left over by
+    rounding going to the strata with the largest remainders.
+    
+    Parameters:
+    df (pd.DataFrame): Rows to sample.
+    sample (float or int): Fraction of the rows in (0, 1], or a number of rows.
+    seed (int or tuple): Seed of the random keys; the same seed draws the same rows. Defaults to 0.
+    by (list): Columns whose combinations are the strata. Defaults to sample_strata.
+    
+    Returns:
+    pd.DataFrame: The sampled rows, in their original order.
+    """
+    sample_label(sample)
+    rows = len(df)
+    target = min(int(sample), rows) if isinstance(sample, numbers.Integral) else round(sample * rows)
+    if target >= rows:
         return df
+
+    strata = df.groupby(by, dropna=False, sort=False).ngroup().to_numpy()
+    counts = np.bincount(strata)
+    quotas = counts * target / rows
+    shares = np.floor(quotas).astype(np.int64)
+    leftover = np.argsort(-(quotas - shares), kind="stable")[:target - shares.sum()]
+    shares[leftover] += 1
+
+    keys = np.random.default_rng(seed).random(rows)
+    order = np.lexsort((keys, strata))
+    # Position of each row within its stratum, in key order
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ranks = np.arange(rows) - starts[strata[order]]
+    return df.iloc[np.sort(order[ranks < shares[strata[order]]])]
+
+def process_year(year, block_size: int = ingest_block_size, source: str = None, sample=None, seed: int = 0):
+    """
+    Download one survey year, rename its columns to the common schema and select them.
+    Only the columns in the year's survey_schemas entry are parsed, already typed, one
+    block of the file at a time (see read_survey_batches); each block is renamed and
+    selected before the next is parsed.
+    
+    Parameters:
+    year (int): The survey year.
+    block_size (int): Bytes of CSV per parse block. Defaults to ingest_block_size.
+    source (str): Path or URL of the survey file, e.g. from a DownloadCache. Defaults to construct_url(year).
+    sample (float or int): Keep only a stratified_sample of the year, a fraction or a number
+        of rows. Defaults to None (every row).
+    seed (int): Seed of the sample. Defaults to 0.
+    
+    Returns:
+    pd.DataFrame: The year's data with select_cols, or None if it could not be loaded.
+    """
+    url = source or construct_url(year)
+    logger.info(f"Loading data for year {year} from {url}")
+    schema = survey_schema(year)
+    frames = []
+    try:
+        batches = read_survey_batches(url, schema, block_size)
+        while True:
+            with stage("parse", year=year) as record:
+                df = next(batches, None)
+                record["rows"] = len(df) if df is not None else 0
+            if df is None:
+                break
+            df["Year"] = year
+            with stage("rename_select", rows=len(df), year=year):
+                frames.append(rename_and_select(df, schema.renames, add_columns=schema.missing))
+    except KeyError as ke:
+        logger.warning(f"Error selecting columns for year {year}: {ke}")
+        return None
+    except Exception as e:
+        logger.warning(f"Error loading data for year {year} from {url}: {e}")
+        return None
+    df = pd.concat(frames, axis=0, ignore_index=True)
+    logger.debug(f"Data for year {year} loaded, renamed and selected with {schema}, shape: {df.shape}")
+
+    if sample is not None:
+        with stage("sample", rows=len(df), year=year):
+            # Seeding with the year as well draws each year's rows independently of the others
+            df = stratified_sample(df, sample, seed=(seed, year)).reset_index(drop=True)
+        logger.debug(f"Sampled {len(df)} rows for {year}")
+
+    return df
+
+
+def process_years_parallel(years, workers: int, use_processes: bool = False, block_size: int = ingest_block_size,
+                           sources=None, sample=None, seed: int = 0):
+    """
+    Run process_year for several years concurrently.
     
-    print("Processing each year individually...")
-    list_of_dfs = [process_year(year) for year in years]
-    print(f"Number of valid DataFrames: {len([df for df in list_of_dfs if df is not None])} out of {len(years)} years")
+    Parameters:
+    years (list): Survey years to process.
+    workers (int): Size of the worker pool.
+    use_processes (bool): Use a process pool instead of a thread pool.
+    block_size (int): Bytes of CSV per parse block.
+    sources (dict): Optional year to path/URL mapping passed on to process_year.
+    sample (float or int): Sample of each year to keep, passed on to process_year.
+    seed (int): Seed of the sample.
+    
+    Returns:
+    list: One DataFrame (or None for a failed year) per year, in the order of years.
+    """
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        sources = sources or {}
+        futures = [executor.submit(process_year, year, block_size, sources.get(year), sample, seed) for year in years]
+        list_of_dfs = []
+        # Collect in year order; a failing year only loses its own result
+        for year, future in zip(years, futures):
+            try:
+                list_of_dfs.append(future.result())
+            except Exception as e:
+                logger.warning(f"Error processing year {year}: {e}")
+                list_of_dfs.append(None)
+    return list_of_dfs
+
+
+# Function to merge years' data
+def merge_years(years, workers: int = 1, use_processes: bool = False, block_size: int = ingest_block_size,
+                sources=None, engine: str = "pandas", sample=None, seed: int = 0, strict: bool = False):
+    """
+    Load each survey year and combine them, adding the averaged range columns.
+    
+    Parameters:
+    years (list): Survey years to merge.
+    workers (int): Number of years to ingest concurrently. Defaults to 1 (serial).
+    use_processes (bool): Use a process pool instead of a thread pool when workers > 1.
+    block_size (int): Bytes of survey CSV per parse block. Defaults to ingest_block_size.
+    sources (dict): Optional year to path/URL mapping, e.g. files already fetched into a DownloadCache.
+    engine (str): Dataframe engine for the averaged columns, "pandas" or "polars". Defaults to "pandas".
+    sample (float or int): Keep a stratified sample of each year, a fraction or a number of rows.
+        Defaults to None (every row).
+    seed (int): Seed of the sample. Defaults to 0.
+    strict (bool): Raise if any year fails to load, instead of leaving it out. Defaults to False.
+    
+    Returns:
+    pd.DataFrame: The combined DataFrame, in the order of years.
+    
+    Raises:
+    RuntimeError: With strict=True, if a year could not be loaded.
+    """
+    logger.info(f"Starting merge process for years: {years}")
+    
+    if workers > 1 and len(years) > 1:
+        logger.debug(f"Processing {len(years)} years with {workers} workers")
+        list_of_dfs = process_years_parallel(years, workers, use_processes, block_size, sources, sample, seed)
+    else:
+        sources = sources or {}
+        list_of_dfs = [process_year(year, block_size, sources.get(year), sample, seed) for year in years]
+    logger.info(f"Number of valid DataFrames: {len([df for df in list_of_dfs if df is not None])} out of {len(years)} years")
+    failed_years = [year for year, df in zip(years, list_of_dfs) if df is None]
+    if strict and failed_years:
+        raise RuntimeError(f"Could not load survey years {failed_years}; see the log for the errors")
     
-    print("Combining all years' data into a single DataFrame...")
-    combined_df = pd.concat([df for df in list_of_dfs if df is not None], axis=0)
-    print(f"Combined DataFrame shape: {combined_df.shape}")
-    print(f"Unique years in combined DataFrame: {combined_df['Year'].unique()}")
+    valid_dfs = [df for df in list_of_dfs if df is not None]
+    if not valid_dfs:
+        logger.warning("No data was loaded for any year.")
+        return add_average_columns(pd.DataFrame(columns=select_cols))
+
+    with stage("combine") as record:
+        combined_df = pd.concat(valid_dfs, axis=0)
+        record["rows"] = len(combined_df)
+    logger.debug(f"Combined DataFrame shape: {combined_df.shape}")
     
     # Apply average functions for certain columns
-    print("Calculating averages for YearsCodePro, OrgSize, and Age columns...")
-    combined_df["YearsCodeProAvg"] = combined_df["YearsCodePro"].apply(lambda x: extract_and_average(str(x)))
-    combined_df["OrgSizeAvg"] = combined_df["OrgSize"].apply(lambda x: extract_and_average(str(x)))
-    combined_df["AgeAvg"] = combined_df["Age"].apply(lambda x: extract_and_average(str(x)))
-    print("Averages calculated and columns added.")
+    with stage("averaging", rows=len(combined_df), engine=engine):
+        combined_df = transform_engine(engine).add_average_columns(combined_df)
     
     return combined_df
 
-def post_build_mutations(df):
-    # Ensure the 'EdLevel' column is a string for consistency in condition matching
-    df["EdLevel"] = df["EdLevel"].astype(str)
+def classify_distinct_codes(series, rules, default="source"):
+    """
+    Classify a column through a list of rules once per distinct value; see classify_distinct.
+    
+    Returns:
+    tuple: (codes, classified), where classified[codes] is the classified value of each row.
+    """
+    values = series.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values)
 
-    # Create a list of boolean conditions for 'EdLevel'
+    # Keep NaN and None apart, since exact-value rules can tell them apart
+    uniques = pd.Series(list(uniques) + [np.nan, None], dtype=object)
+    missing_code = np.where(np.equal(values, None), len(uniques) - 1, len(uniques) - 2)
+    codes = np.where(codes >= 0, codes, missing_code).astype(np.int32)
+
+    text = uniques.astype(str)
     conditions = [
-        df["EdLevel"].str.contains("(?i)master", na=False), 
-        df["EdLevel"].str.contains("(?i)associate", na=False), 
-        df["EdLevel"].str.contains("(?i)bachelor", na=False), 
-        df["EdLevel"].str.contains("(?i)doctoral", na=False),
-        df["EdLevel"].str.contains("(?i)professional", na=False), 
-        df["EdLevel"].str.contains("(?i)primary", na=False),
-        df["EdLevel"].str.contains("(?i)secondary", na=False), 
-        df["EdLevel"].str.contains("(?i)college", na=False),
-        df["EdLevel"].str.contains("(?i)never", na=False), 
-        df["EdLevel"].str.contains("(?i)else", na=False)
+        uniques.isin(matcher) if isinstance(matcher, list) else text.str.contains(matcher, case=False, regex=True)
+        for matcher, _ in rules
     ]
+    if isinstance(default, str) and default == "source":
+        default = uniques
+    elif isinstance(default, str) and default == "source_str":
+        default = text
+    classified = np.select(conditions, [value for _, value in rules], default=default)
+    return codes, classified
 
-    # Define the corresponding choices for 'EdLevel'
-    choices = [
-        "Masters", "Associates", "Bachelors", "Doctorate", "Professional", 
-        "Primary", "Secondary", "Some College", "No Education", "Something Else"
-    ]
+def classify_distinct(series, rules, default="source"):
+    """
+    Map a column through a list of rules, evaluating them once per distinct value
+    and broadcasting the result back to the rows.
+    
+    Parameters:
+    series (pd.Series): The column to classify.
+    rules (list): (matcher, value) pairs; the first matching rule gives the value. A string
+        matcher is a regex searched case-insensitively in str(x), a list matches those exact values.
+    default: Value when no rule matches: a constant, "source" for the original value, or
+        "source_str" for the original value as a string. Defaults to "source".
+    
+    Returns:
+    np.ndarray: The classified values, one per row.
+    """
+    codes, classified = classify_distinct_codes(series, rules, default)
+    return classified[codes]
 
-    # Apply the conditions to create the 'EdLevel' groups
-    df["EdLevel"] = np.select(conditions, choices, default=df["EdLevel"])
-
-    # Handle other groupings similarly, ensuring they are converted to booleans
-    df["sexuality_grouped"] = np.where(
-        df["Sexuality"].astype(str).str.contains("Straight / Heterosexual|Straight or heterosexual", case=False, na=False), 
-        "straight", 
-        np.where(
-            df["Sexuality"].astype(str).str.contains("Bisexual|Gay or Lesbian|Queer|Asexual|Prefer", case=False, na=False), 
-            "lgbtq", 
-            np.nan
-        )
-    )
-
-    df["ethnicity_grouped"] = np.where(
-        df["Ethnicity"].astype(str).str.contains("White|European", case=False, na=False), 
-        "non-minority", 
-        np.where(
-            df["Ethnicity"].isin([np.nan, "Prefer not to say", "Or, in your own words:", "I don’t know", "I prefer not to say"]), 
-            np.nan, 
-            "minority"
-        )
-    )
+def post_build_mutations(df):
+    # Each rule table turns a source column into a (new or replaced) target column
+    for source, target, rules, default in mutation_rules:
+        df[target] = classify_distinct(df[source], rules, default)
+    return df
 
-    # Map 'Gender' to standard categories
-    df["Gender"] = np.where(df["Gender"] == "Woman", "Female", 
-                            np.where(df["Gender"] == "Man", "Male", df["Gender"]))
-
-    # Ensure Employment categories are matched correctly
-    df["Employment"] = np.select(
-        [
-            df["Employment"].astype(str).str.contains("(?i)full", na=False), 
-            df["Employment"].astype(str).str.contains("(?i)retired", na=False),
-            df["Employment"].astype(str).str.contains("(?i)part", na=False), 
-            df["Employment"].astype(str).str.contains("(?i)independent", na=False)
-        ],
-        ["Full-Time", "Retired", "Part-Time", "Self-Employed"], 
-        default=df["Employment"]
-    )
+def indicator_columns(df):
+    """
+    Compute the technology indicator columns, factorized (see wide_phases).
+    """
+    columns = []
+    for colname, values_to_search in [("LanguageWorkedWith", languages), ("DatabaseWorkedWith", databases),
+                                      ("PlatformWorkedWith", platforms)]:
+        matches = match_tokens(df[colname], vector_patterns(values_to_search))
+        for i, value in enumerate(values_to_search):
+            columns.append((indicator_column_name(value), matches[:, i].astype(np.int8), indicator_values))
+    return columns
 
-    # Replace "America" with "United States"
-    df["Country"] = np.where(df["Country"].str.contains("(?i)america", na=False), "United States", df["Country"])
+def mutation_columns(df):
+    """
+    Compute the post_build_mutations targets, factorized (see wide_phases).
+    """
+    return [(target, *classify_distinct_codes(df[source], rules, default))
+            for source, target, rules, default in mutation_rules]
 
-    return df
+def aws_columns(df):
+    """
+    Compute the aws indicator column, factorized (see wide_phases).
+    """
+    columns = []
+    for new_col, search_terms in aws_entries.items():
+        matches = match_tokens(df["PlatformWorkedWith"], [list_pattern(search_terms)])
+        columns.append((new_col, matches[:, 0].astype(np.int8), indicator_values))
+    return columns
+
+# The phases of the wide transforms in the order build_wide_stack assigns their columns,
+# as (stage name, stage fields, function). No phase reads a column an earlier one writes.
+# Each function returns the columns it computes as (column name, codes, values) tuples,
+# factorized since that is cheap to send between processes and to concatenate;
+# values[codes] is the column itself.
+wide_phases = [
+    ("vectorization", {}, indicator_columns),
+    ("mutations", {}, mutation_columns),
+    ("vectorization", {"column": "aws"}, aws_columns)
+]
+
+# The frame being sharded, inherited by the forked pool workers so rows are never pickled to them
+_shard_frame = None
+
+def shard_columns(phase, start: int, stop: int):
+    """
+    Run a wide_phases function on rows [start, stop) of the frame being sharded.
+    """
+    return phase(_shard_frame.iloc[start:stop])
+
+def concat_wide_columns(shards):
+    """
+    Join the factorized columns of consecutive row shards, offsetting each shard's codes past
+    the values of the shards before it.
+    """
+    columns = []
+    for parts in zip(*shards):
+        codes, offset = [], 0
+        for _, shard_codes, values in parts:
+            codes.append(shard_codes.astype(np.int64) + offset)
+            offset += len(values)
+        # As objects, since shards can classify to text of different widths
+        values = np.concatenate([values.astype(object) for _, _, values in parts])
+        columns.append((parts[0][0], np.concatenate(codes), values))
+    return columns
+
+@contextlib.contextmanager
+def shard_pool(df, workers: int, shard_rows: int = wide_shard_rows):
+    """
+    Run a pool of processes forked from this one, which read the rows of df they work on
+    from the memory they share with it copy-on-write; see sharded_columns. The pool forks
+    its workers on the first task, and df stays _shard_frame until the pool shuts down.
+    
+    Parameters:
+    df (pd.DataFrame): The frame to shard.
+    workers (int): Number of worker processes.
+    shard_rows (int): Rows per shard. Defaults to wide_shard_rows.
+    
+    Yields:
+    tuple: (executor, shard bounds), or None where processes cannot be forked (Windows).
+        Spawned workers would re-import the package and need every shard pickled to them,
+        so the caller runs in this process instead.
+    """
+    global _shard_frame
+    if "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Processes cannot be forked on this platform, computing the wide columns in one process")
+        yield None
+        return
+    bounds = [(start, min(start + shard_rows, len(df))) for start in range(0, len(df), shard_rows)]
+    _shard_frame = df
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(bounds)),
+                                 mp_context=multiprocessing.get_context("fork")) as executor:
+            yield executor, bounds
+    finally:
+        _shard_frame = None
+
+def sharded_columns(pool, phase):
+    """
+    Run a wide_phases function over the row shards of a shard_pool, in its workers. Only
+    the shard bounds go to the workers and only the factorized columns come back.
+    
+    Returns:
+    list: (column name, codes, values) tuples for the whole frame.
+    """
+    executor, bounds = pool
+    futures = [executor.submit(shard_columns, phase, start, stop) for start, stop in bounds]
+    # Shards are collected in row order
+    return concat_wide_columns([future.result() for future in futures])
+
+def transform_engine(engine: str):
+    """
+    Return the module implementing add_average_columns and build_wide_stack for an engine:
+    "pandas" (this module) or "polars" (lussi.polars_engine, multithreaded).
+    """
+    if engine == "pandas":
+        return sys.modules[__name__]
+    elif engine == "polars":
+        from lussi import polars_engine
+        return polars_engine
+    else:
+        raise ValueError("Invalid engine. Choose either 'pandas' or 'polars'.")
+
+def build_wide_stack(raw_stack, engine: str = "pandas", workers: int = 1, shard_rows: int = wide_shard_rows):
+    """
+    Turn the raw stack into the wide stack: technology indicator columns, the grouped
+    and normalized columns from post_build_mutations and US_State encoded as state_code
+    (see lussi.states). With the pandas engine the raw stack is modified in place.
+    
+    The transforms only look at one row at a time, so with workers > 1 the pandas engine
+    runs them on shards of shard_rows rows in a process pool (see shard_pool)
+    and puts the shards back together in row order. The result is the same for any
+    number of workers and shard size.
+    
+    Parameters:
+    raw_stack (pd.DataFrame): The raw stack, as returned by merge_years.
+    engine (str): Dataframe engine, "pandas" or "polars". Defaults to "pandas".
+    workers (int): Worker processes for the pandas engine's transforms. The polars engine
+        is multithreaded and ignores it. Defaults to 1 (in this process).
+    shard_rows (int): Rows per shard when workers > 1. Defaults to wide_shard_rows.
+    
+    Returns:
+    pd.DataFrame: The wide stack.
+    """
+    if engine != "pandas":
+        with stage("wide_transforms", rows=len(raw_stack), engine=engine):
+            wide_stack = transform_engine(engine).build_wide_stack(raw_stack)
+        wide_stack["state_code"] = encode_states(wide_stack["US_State"])
+        return wide_stack
+
+    wide_stack = raw_stack
+    shards = -(-len(wide_stack) // shard_rows)
+    sharded = workers > 1 and shards > 1
+    with shard_pool(wide_stack, workers, shard_rows) if sharded else contextlib.nullcontext() as pool:
+        for name, fields, phase in wide_phases:
+            fields = {**fields, "workers": workers, "shards": shards} if pool else fields
+            with stage(name, rows=len(wide_stack), **fields):
+                columns = sharded_columns(pool, phase) if pool else phase(wide_stack)
+                for colname, codes, values in columns:
+                    wide_stack[colname] = values[codes]
 
+    wide_stack["state_code"] = encode_states(wide_stack["US_State"])
+    return wide_stack
 
-def build_stack(data_dir: str):
+def build_stack(data_dir: str, cache_format: CacheFormat = CacheFormat.PARQUET, export_csv: bool = False,
+                workers: int = 1, use_processes: bool = False, years=None, force: bool = False,
+                download_dir: str = None, offline: bool = False, source_prefix: str = None, compact: bool = False,
+                engine: str = "pandas", report_file: str = None, track_memory: bool = False,
+                feature_store: bool = False, sample=None, seed: int = 0, transform_workers: int = 1,
+                shard_rows: int = wide_shard_rows):
     """
     Build the stack data by merging multiple years' data and applying transformations.
-    Existing cache files will be deleted, and new files will be created.
+    
+    The raw and wide stacks are stored as one partition per year, and a manifest records
+    the source fingerprint and code version each partition was built from. Only years that
+    are new, whose source file changed, or that were built by different code are
+    downloaded and processed again; the other partitions are reused. Each year's salary
+    cube (see lussi.cube) and technology index (see lussi.bitmap_index) are written next
+    to its wide partition.
     
     Parameters:
     data_dir (str): Directory where the data files should be saved.
+    cache_format (CacheFormat): Format of the cache read by load_stack. Defaults to CacheFormat.PARQUET.
+    export_csv (bool): Also write merged_stack_raw.csv and merged_stack_wide.csv. Defaults to False.
+    workers (int): Number of survey years to download and parse concurrently. Defaults to 1.
+    use_processes (bool): Ingest years in a process pool instead of a thread pool.
+    years (list): Survey years to include. Defaults to stack_years.
+    force (bool): Rebuild every year, ignoring the manifest. Defaults to False.
+    download_dir (str): Directory of the local download cache. Defaults to <data_dir>/downloads.
+    offline (bool): Build only from files already in the download cache. Defaults to False.
+    source_prefix (str): URL or path prefix of the survey files. Defaults to url_prefix.
+    compact (bool): Store the compact_stack types (boolean indicators, categoricals, downcast
+        numerics) in columnar caches and print a memory usage report. Defaults to False.
+    engine (str): Dataframe engine for the transforms, "pandas" or "polars" (multithreaded).
+        Both produce the same output. Defaults to "pandas".
+    report_file (str): Write a JSON report of each stage's time, rows and memory here. Defaults to None.
+    track_memory (bool): Record each stage's peak memory with tracemalloc (slower). Defaults to False.
+    feature_store (bool): Also write the memory-mapped feature matrix read by
+        lussi.feature_store.load_feature_store. Defaults to False.
+    sample (float or int): Build a small development cache from a stratified sample of each
+        year (by Year and Country): a fraction such as 0.05, or a number of rows per year such
+        as 1000. It is written to sample_data_dir(data_dir, sample, seed), e.g.
+        <data_dir>/sample-frac0.05-seed0, and reuses data_dir's downloads. Defaults to None (full build).
+    seed (int): Seed of the sample; the same seed and sources give the same rows. Defaults to 0.
+    transform_workers (int): Processes running the pandas engine's wide transforms on row
+        shards, see build_wide_stack. Defaults to 1.
+    shard_rows (int): Rows per wide transform shard. Defaults to wide_shard_rows.
+    
+    Returns:
+    RunReport: The stages of the build, see lussi.instrumentation.
+    
+    Raises:
+    RuntimeError: If a survey year that has a source file fails to load or parse. Nothing
+        is written in that case, so the existing partitions are left as they were.
+    """
+    years = list(stack_years if years is None else years)
+    if sample is not None:
+        # The sampled cache sits beside the full one and shares its downloads
+        download_dir = download_dir or os.path.join(data_dir, "downloads")
+        data_dir = sample_data_dir(data_dir, sample, seed)
+    with run_report("build_stack", report_file, track_memory, data_dir=data_dir, years=years,
+                    cache_format=cache_format.value, workers=workers, engine=engine, compact=compact,
+                    sample=sample, seed=seed, transform_workers=transform_workers) as report:
+        from lussi.cube import build_salary_cube, remove_cube_partitions, update_salary_cube, write_cube_partition
+        from lussi.bitmap_index import remove_index_partition, update_technology_index, write_index_partition
+
+        # Ensure the data directory exists
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+            logger.info(f"Created directory: {data_dir}")
+
+        manifest = {} if force else load_stack_manifest(data_dir)
+        code_version = stack_code_version()
+
+        # Fetch (or revalidate) every source through the local download cache
+        download_cache = DownloadCache(download_dir or os.path.join(data_dir, "downloads"), offline=offline)
+        sources = fetch_sources(years, download_cache, workers, source_prefix)
+
+        # Work out which years need to be (re)built
+        stale_years = []
+        fingerprints = {}
+        for year in years:
+            fingerprints[year] = source_fingerprint(sources[year]) if sources[year] else None
+            entry = manifest.get(str(year))
+            if stale_partition(data_dir, year, entry, fingerprints[year], code_version, cache_format, compact):
+                stale_years.append(year)
+            else:
+                logger.info(f"Reusing cached partitions for year {year}")
+
+        if stale_years:
+            logger.info(f"Generating raw data by merging years: {stale_years}")
+            raw_stack = merge_years([year for year in stale_years if sources[year]], workers=workers,
+                                    use_processes=use_processes, sources=sources, engine=engine,
+                                    sample=sample, seed=seed, strict=True)
+            built_years = [year for year in stale_years if (raw_stack["Year"] == year).any()]
 
+            # Save the raw partitions before the wide transforms modify the frame
+            for year, year_df in raw_stack.groupby("Year", sort=False):
+                with stage("write", rows=len(year_df), year=year, stack_type=StackType.RAW.value):
+                    file_name = write_stack_partition(year_df, data_dir, StackType.RAW, year, cache_format, compact)
+                logger.info(f"Raw data saved to {file_name}")
+
+            if built_years:
+                wide_stack = build_wide_stack(raw_stack, engine, transform_workers, shard_rows)
+                for year, year_df in wide_stack.groupby("Year", sort=False):
+                    with stage("write", rows=len(year_df), year=year, stack_type=StackType.WIDE.value):
+                        file_name = write_stack_partition(year_df, data_dir, StackType.WIDE, year, cache_format, compact)
+                    logger.info(f"Wide data saved to {file_name}")
+                    with stage("cube", rows=len(year_df), year=year):
+                        file_name = write_cube_partition(build_salary_cube(year_df), data_dir, year)
+                    logger.info(f"Salary cube saved to {file_name}")
+                    with stage("index", rows=len(year_df), year=year):
+                        file_name = write_index_partition(year_df, data_dir, year)
+                    logger.info(f"Technology index saved to {file_name}")
+
+            for year in built_years:
+                manifest[str(year)] = {
+                    "source": fingerprints[year],
+                    "code_version": code_version,
+                    "cache_format": cache_format.value,
+                    "compact": compact,
+                    "sample": sample_label(sample, seed) if sample is not None else None,
+                    "rows": int((raw_stack["Year"] == year).sum())
+                }
+            for year in set(stale_years) - set(built_years):
+                logger.warning(f"Could not rebuild year {year}; keeping any existing partition")
+
+        # Drop partitions of years that are no longer part of the stack
+        for year in [int(year) for year in manifest if int(year) not in years]:
+            remove_stack_partitions(data_dir, year)
+            remove_cube_partitions(data_dir, year)
+            remove_index_partition(data_dir, year)
+            del manifest[str(year)]
+            logger.info(f"Removed partitions for year {year}")
+        save_stack_manifest(data_dir, manifest)
+        update_salary_cube(data_dir, years)
+        update_technology_index(data_dir, years)
+
+        if feature_store:
+            from lussi.feature_store import write_feature_store
+            with stage("features", rows=sum(entry["rows"] for entry in manifest.values())):
+                write_feature_store(data_dir, manifest)
+
+        # Single-file caches from before partitioning would shadow nothing but go stale, so remove them
+        for stack_type in StackType:
+            for fmt in CacheFormat:
+                file_name = stack_file_path(data_dir, stack_type, fmt)
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+                    logger.info(f"Deleted existing file: {file_name}")
+
+        if compact and stack_partitions(data_dir, StackType.WIDE):
+            usage = memory_usage_report(load_stack(data_dir, StackType.WIDE, compact=True, cache=False))
+            logger.info(f"Compact wide stack uses {usage.loc['Total', 'MB']:.1f} MB in memory")
+
+        if export_csv:
+            for stack_type in StackType:
+                with stage("export_csv", stack_type=stack_type.value) as record:
+                    df = conform_types(load_stack(data_dir, stack_type, cache=False), stack_dtypes(stack_type))
+                    df.to_csv(stack_file_path(data_dir, stack_type, CacheFormat.CSV), index=False)
+                    record["rows"] = len(df)
+                logger.info(f"{stack_type.value.capitalize()} data exported to {stack_file_path(data_dir, stack_type, CacheFormat.CSV)}")
+
+        # Frames loaded before the rebuild would be reloaded anyway, as their files changed; free them now
+        frame_cache.invalidate(data_dir)
+    return report
+
+
+def code_version(module_files):
+    """
+    Return a short hash of the source of lussi modules, given by file name, e.g. ["cube.py"].
     """
-    # Ensure the data directory exists
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"Created directory: {data_dir}")
+    digest = hashlib.sha256()
+    for module_file in module_files:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module_file), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def stack_code_version():
+    """
+    Return a short hash of the source of stack_code_modules. Partitions built by a
+    different version of the pipeline code are rebuilt.
+    """
+    return code_version(stack_code_modules)
+
+def load_partition_versions(partition_dir: str):
+    """
+    Return the year to code version mapping recorded for the partitions of a derived
+    artifact (the salary cube, the technology index), or {} if none was recorded.
+    """
+    versions_fn = os.path.join(partition_dir, partition_versions_fn)
+    if not os.path.exists(versions_fn):
+        return {}
+    with open(versions_fn) as f:
+        return json.load(f)
+
+def save_partition_version(partition_dir: str, year: int, version: str):
+    """
+    Record the code version a derived artifact's partition of a year was written by.
+    """
+    versions = load_partition_versions(partition_dir)
+    versions[str(year)] = version
+    versions_fn = os.path.join(partition_dir, partition_versions_fn)
+    with open(versions_fn + ".tmp", "w") as f:
+        json.dump(versions, f, indent=2, sort_keys=True)
+    os.replace(versions_fn + ".tmp", versions_fn)
+
+def fetch_sources(years, download_cache: DownloadCache, workers: int = 1, prefix: str = None):
+    """
+    Fetch each year's survey file into the download cache, a few at a time.
+    
+    Parameters:
+    years (list): Survey years to fetch.
+    download_cache (DownloadCache): The cache to fetch through.
+    workers (int): Number of concurrent downloads.
+    prefix (str): URL or path prefix of the survey files. Defaults to url_prefix.
     
-    # Define file paths using the data directory
-    raw_stack_fn = os.path.join(data_dir, "merged_stack_raw.csv")
-    wide_stack_fn = os.path.join(data_dir, "merged_stack_wide.csv")
+    Returns:
+    dict: Year to local path, or None for a year that could not be fetched.
+    """
+    def fetch(year):
+        url = construct_url(year, prefix)
+        try:
+            with stage("download", year=year) as record:
+                path = download_cache.fetch(url)
+                record["bytes"] = os.path.getsize(path) if os.path.exists(path) else None
+            return path
+        except Exception as e:
+            logger.warning(f"Error fetching data for year {year} from {url}: {e}")
+            return None
 
-    # Delete existing cache files if they exist
-    if os.path.exists(raw_stack_fn):
-        os.remove(raw_stack_fn)
-        print(f"Deleted existing file: {raw_stack_fn}")
-    if os.path.exists(wide_stack_fn):
-        os.remove(wide_stack_fn)
-        print(f"Deleted existing file: {wide_stack_fn}")
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return dict(zip(years, executor.map(fetch, years)))
 
-    # Regenerate the data
-    years = list(range(2017, 2024))
-    print("Generating raw data by merging years...")
-    raw_stack = merge_years(years)
+def source_fingerprint(path):
+    """
+    Identify the content of a fetched survey file. Files in the download cache are
+    content-addressed, so their name is their SHA-256; other local files fall back to size and mtime.
+    
+    Parameters:
+    path (str): Local path of the survey file.
+    
+    Returns:
+    str: The fingerprint, or None if the file does not exist.
+    """
+    if os.path.basename(os.path.dirname(path)) == "objects":
+        return f"sha256:{os.path.basename(path)}"
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
 
-    # Save the raw data to CSV
-    raw_stack.to_csv(raw_stack_fn, index=False)
-    print(f"Raw data saved to {raw_stack_fn}")
+def stale_partition(data_dir, year, entry, fingerprint, code_version, cache_format, compact=False):
+    """
+    Decide whether a year's partitions have to be rebuilt.
+    
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    year (int): The survey year.
+    entry (dict): The year's manifest entry, or None.
+    fingerprint (str): The current source fingerprint, or None if unknown.
+    code_version (str): The current stack_code_version().
+    cache_format (CacheFormat): The requested cache format.
+    compact (bool): Whether compact partitions are requested.
+    
+    Returns:
+    bool: True if the year must be rebuilt.
+    """
+    if entry is None:
+        return True
+    if entry.get("code_version") != code_version or entry.get("cache_format") != cache_format.value:
+        return True
+    if entry.get("compact", False) != compact:
+        return True
+    # An unreachable source keeps the partitions we already have
+    if fingerprint is not None and entry.get("source") != fingerprint:
+        return True
+    return not all(os.path.exists(stack_partition_path(data_dir, stack_type, year, cache_format)) for stack_type in StackType)
 
-    # Process the raw data into wide format
-    wide_stack = raw_stack
+def load_stack_manifest(data_dir: str):
+    """
+    Load the partition manifest, keyed by year as a string. Returns an empty dict if there is none.
+    """
+    manifest_fn = os.path.join(data_dir, stack_manifest_fn)
+    if not os.path.exists(manifest_fn):
+        return {}
+    with open(manifest_fn) as f:
+        return json.load(f).get("years", {})
+
+def save_stack_manifest(data_dir: str, manifest):
+    """
+    Write the partition manifest.
+    """
+    manifest_fn = os.path.join(data_dir, stack_manifest_fn)
+    years = {year: manifest[year] for year in sorted(manifest)}
+    with open(manifest_fn, "w") as f:
+        json.dump({"years": years}, f, indent=2)
 
-    # Process specific columns like languages, databases, platforms, etc.
-    languages = ["Python", "SQL", "Java", "JavaScript", "Ruby", "PHP", "C++", "Swift", "Scala", "R", "Rust", "Julia"]
-    wide_stack = extract_vector_cols(wide_stack, "LanguageWorkedWith", languages)
+def match_tokens(series, patterns, sep=";"):
+    """
+    Match several regex patterns against a multi-valued column such as
+    "Python;SQL;Rust" in one pass, case-insensitively.
+    
+    The column is factorized, its distinct values are split into tokens on sep, and each
+    pattern is searched only once per distinct token. A pattern that does not contain sep
+    and is anchored on word boundaries matches a token exactly when it matches the whole
+    string, so the result is the same as re.search over str(x) for every row.
+    
+    Parameters:
+    series (pd.Series): The multi-valued column.
+    patterns (list): Regex patterns to search for.
+    sep (str): The separator between values. Defaults to ";".
+    
+    Returns:
+    np.ndarray: Boolean array of shape (len(series), len(patterns)).
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    text = pd.Series([str(value) for value in uniques], dtype=object)
 
-    databases = ["MySQL", "Microsoft SQL Server", "MongoDB", "PostgreSQL", "Oracle", "IBM DB2", "Redis", "SQLite", "MariaDB"]
-    wide_stack = extract_vector_cols(wide_stack, "DatabaseWorkedWith", databases)
+    # One row per (distinct value, token), then the distinct tokens themselves
+    tokens = text.str.split(sep).explode()
+    owners = tokens.index.to_numpy()
+    token_codes, distinct_tokens = pd.factorize(tokens.str.strip())
 
-    platforms = ["Microsoft Azure", "Google Cloud", "IBM Cloud or Watson", "Kubernetes", "Linux", "Windows"]
-    wide_stack = extract_vector_cols(wide_stack, "PlatformWorkedWith", platforms)
+    matches = np.zeros((len(uniques), len(patterns)), dtype=bool)
+    for i, pattern in enumerate(patterns):
+        regex = re.compile(pattern, re.IGNORECASE)
+        token_hits = np.array([regex.search(token) is not None for token in distinct_tokens], dtype=bool)
+        if token_hits.any():
+            matches[owners[token_hits[token_codes]], i] = True
 
-    # Process AWS-related platforms
-    aws_entries = {"aws": ["AWS", "aws", "Amazon Web Services", "Amazon Web Services (AWS)"]}
-    wide_stack = post_build_mutations(wide_stack)
-    wide_stack = extract_list_cols(wide_stack, "PlatformWorkedWith", aws_entries)
+    # Broadcast the per-distinct-value result back to the rows
+    return matches[codes]
 
-    # Save the wide data to CSV
-    wide_stack.to_csv(wide_stack_fn, index=False)
-    print(f"Wide data saved to {wide_stack_fn}")
+def vector_patterns(values_to_search):
+    # Use \b (word boundary) instead of look-behind/look-ahead assertions
+    # Escape the value to handle special characters
+    return [fr"\b{re.escape(value)}\b" for value in values_to_search]
 
+def list_pattern(search_terms):
+    # Instead of look-behind, use a word boundary or simpler pattern to match whole words
+    return fr"\b({'|'.join(search_terms)})\b"
 
 def extract_vector_cols(df, colname, values_to_search):
-    for value in values_to_search:
-        # Create a cleaned column name based on the value
-        new_col = re.sub(r"[^a-zA-Z0-9]", "", value.lower())
+    matches = match_tokens(df[colname], vector_patterns(values_to_search))
 
-        # Use \b (word boundary) instead of look-behind/look-ahead assertions
-        search_pattern = fr"\b{re.escape(value)}\b"  # Escape the value to handle special characters
+    for i, value in enumerate(values_to_search):
+        new_col = indicator_column_name(value)
 
-        # Apply the pattern and create the new column with "yes" or "no"
-        df[new_col] = df[colname].apply(lambda x: "yes" if re.search(search_pattern, str(x), re.IGNORECASE) else "no")
+        # Create the new column with "yes" or "no"
+        df[new_col] = indicator_values[matches[:, i].astype(np.int8)]
 
     return df
 # Function to extract list columns
@@ -292,120 +1211,448 @@ def extract_list_cols(df, colname, values_to_search):
     new_col = list(values_to_search.keys())[0]
     search_terms = values_to_search[new_col]
     
-    # Instead of look-behind, use a word boundary or simpler pattern to match whole words
-    search_pattern = fr"\b({'|'.join(search_terms)})\b"
-    
     # Apply the new regex pattern
-    df[new_col] = df[colname].apply(lambda x: "yes" if re.search(search_pattern, str(x), re.IGNORECASE) else "no")
+    matches = match_tokens(df[colname], [list_pattern(search_terms)])
+    df[new_col] = indicator_values[matches[:, 0].astype(np.int8)]
     
     return df
 
-def load_stack(data_dir: str, stack_type: StackType = StackType.RAW):
+def stack_file_path(data_dir: str, stack_type: StackType, cache_format: CacheFormat):
     """
-    Load either the raw or wide stack file from the cache (filesystem).
+    Build the path of a stack cache file, e.g. <data_dir>/merged_stack_wide.parquet.
     
     Parameters:
     data_dir (str): Directory where the data files are stored.
-    stack_type (StackType): StackType Enum, either StackType.RAW or StackType.WIDE. Defaults to StackType.RAW.
+    stack_type (StackType): StackType.RAW or StackType.WIDE.
+    cache_format (CacheFormat): The on-disk format of the file.
     
     Returns:
-    pd.DataFrame: The loaded DataFrame (either raw or wide).
+    str: The path of the cache file.
+    """
+    return os.path.join(data_dir, f"merged_stack_{stack_type.value}.{cache_format.value}")
+
+def stack_partition_path(data_dir: str, stack_type: StackType, year: int, cache_format: CacheFormat):
+    """
+    Build the path of one year's partition, e.g. <data_dir>/merged_stack_wide/2023.parquet.
+    """
+    return os.path.join(data_dir, f"merged_stack_{stack_type.value}", f"{year}.{cache_format.value}")
+
+def stack_partitions(data_dir: str, stack_type: StackType, cache_format: CacheFormat = None):
+    """
+    List the partitions of a stack in year order.
     
-    Raises:
-    FileNotFoundError: If the specified stack file is not found on the filesystem.
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    stack_type (StackType): StackType.RAW or StackType.WIDE.
+    cache_format (CacheFormat): Only list partitions in this format. Defaults to any format.
+    
+    Returns:
+    list: (year, CacheFormat, path) tuples, sorted by year.
+    """
+    partition_dir = os.path.join(data_dir, f"merged_stack_{stack_type.value}")
+    if not os.path.isdir(partition_dir):
+        return []
+    partitions = []
+    for file_name in os.listdir(partition_dir):
+        year, _, extension = file_name.partition(".")
+        if not year.isdigit() or extension not in [fmt.value for fmt in CacheFormat]:
+            continue
+        fmt = CacheFormat(extension)
+        if cache_format is None or fmt == cache_format:
+            partitions.append((int(year), fmt, os.path.join(partition_dir, file_name)))
+    return sorted(partitions)
+
+def write_stack_partition(df, data_dir: str, stack_type: StackType, year: int, cache_format: CacheFormat,
+                          compact: bool = False):
+    """
+    Write one year of a stack, replacing that year's partition in any other format.
+    
+    Returns:
+    str: The path of the written partition.
+    """
+    remove_stack_partitions(data_dir, year, stack_type)
+    file_name = stack_partition_path(data_dir, stack_type, year, cache_format)
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    write_stack_file(df, file_name, stack_type, cache_format, compact)
+    return file_name
+
+def remove_stack_partitions(data_dir: str, year: int, stack_type: StackType = None):
+    """
+    Delete a year's partitions, for one stack type or both.
+    """
+    for st in [stack_type] if stack_type is not None else list(StackType):
+        for fmt in CacheFormat:
+            file_name = stack_partition_path(data_dir, st, year, fmt)
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+def stack_dtypes(stack_type: StackType):
+    """
+    Return the dtype dictionary for the given stack type.
     """
-    # Define file paths using the data directory
-    raw_stack_fn = os.path.join(data_dir, "merged_stack_raw.csv")
-    wide_stack_fn = os.path.join(data_dir, "merged_stack_wide.csv")
-
-    # Define data types for the raw and wide stacks
-    raw_dtype_dict = {
-        'Year': 'int64',
-        'OrgSize': 'str',
-        'Country': 'str',
-        'Employment': 'str',
-        'Gender': 'str',
-        'EdLevel': 'str',
-        'US_State': 'str',
-        'Age': 'str',
-        'DevType': 'str',
-        'Sexuality': 'str',
-        'Ethnicity': 'str',
-        'DatabaseWorkedWith': 'str',
-        'LanguageWorkedWith': 'str',
-        'PlatformWorkedWith': 'str',
-        'YearsCodePro': 'str',
-        'AnnualSalary': 'float64',
-        'YearsCodeProAvg': 'float64',
-        'OrgSizeAvg': 'float64',
-        'AgeAvg': 'float64'
-    }
-    
-    wide_dtype_dict = {
-        'Year': 'int64',
-        'OrgSize': 'str',
-        'Country': 'str',
-        'Employment': 'str',
-        'Gender': 'str',
-        'EdLevel': 'str',
-        'US_State': 'str',
-        'Age': 'str',
-        'DevType': 'str',
-        'Sexuality': 'str',
-        'Ethnicity': 'str',
-        'DatabaseWorkedWith': 'str',
-        'LanguageWorkedWith': 'str',
-        'PlatformWorkedWith': 'str',
-        'YearsCodePro': 'str',
-        'AnnualSalary': 'float64',
-        'YearsCodeProAvg': 'float64',
-        'OrgSizeAvg': 'float64',
-        'AgeAvg': 'float64',
-        # Additional binary columns for wide format
-        'python': 'str',
-        'sql': 'str',
-        'java': 'str',
-        'javascript': 'str',
-        'ruby': 'str',
-        'php': 'str',
-        'c': 'str',
-        'swift': 'str',
-        'scala': 'str',
-        'r': 'str',
-        'rust': 'str',
-        'julia': 'str',
-        'mysql': 'str',
-        'microsoftsqlserver': 'str',
-        'mongodb': 'str',
-        'postgresql': 'str',
-        'oracle': 'str',
-        'ibmdb2': 'str',
-        'redis': 'str',
-        'sqlite': 'str',
-        'mariadb': 'str',
-        'microsoftazure': 'str',
-        'googlecloud': 'str',
-        'ibmcloudorwatson': 'str',
-        'kubernetes': 'str',
-        'linux': 'str',
-        'windows': 'str',
-        'sexuality_grouped': 'str',
-        'ethnicity_grouped': 'str',
-        'aws': 'str'
-    }
-
-    # Select the appropriate file name and data types based on the stack type
     if stack_type == StackType.RAW:
-        file_name = raw_stack_fn
-        dtype_dict = raw_dtype_dict
+        return raw_dtype_dict
     elif stack_type == StackType.WIDE:
-        file_name = wide_stack_fn
-        dtype_dict = wide_dtype_dict
+        return wide_dtype_dict
     else:
         raise ValueError("Invalid stack_type. Choose either StackType.RAW or StackType.WIDE.")
+
+def conform_types(df, dtype_dict):
+    """
+    Cast the columns of a stack to the types declared in dtype_dict, so a columnar
+    cache stores exactly the types load_stack would have parsed from CSV.
+    String columns keep their missing values as NaN, and the strings pandas reads
+    back as missing from a CSV (e.g. "nan") become NaN as well. This also undoes compact_stack.
+    
+    Parameters:
+    df (pd.DataFrame): The stack to conform.
+    dtype_dict (dict): Column name to dtype, e.g. raw_dtype_dict.
+    
+    Returns:
+    pd.DataFrame: The conformed DataFrame.
+    """
+    for col, dtype in dtype_dict.items():
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        if dtype == 'str' and pd.api.types.is_bool_dtype(df[col]):
+            # Compact indicators go back to "yes"/"no"
+            df[col] = np.where(df[col], "yes", "no").astype(object)
+        elif dtype == 'str':
+            text = df[col].where(df[col].isna(), df[col].astype(str))
+            # Strings like "nan" left behind by astype(str) come back as NaN from a CSV round trip
+            df[col] = text.mask(text.isin(csv_na_values)).astype(object)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def compact_stack(df):
+    """
+    Shrink a stack in memory: indicator columns become booleans, the low-cardinality
+    text columns become categoricals and Year and the averages are downcast.
+    Columns that are already compact are left as they are.
+    
+    Parameters:
+    df (pd.DataFrame): The raw or wide stack (or a projection of it).
+    
+    Returns:
+    pd.DataFrame: The compact DataFrame.
+    """
+    for col in indicator_cols:
+        if col in df.columns and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = (df[col] == "yes").to_numpy()
+    for col in categorical_cols:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col, dtype in downcast_dtype_dict.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def expand_stack(df, stack_type: StackType):
+    """
+    Undo compact_stack, so a stack read from compact partitions has the same types as one
+    built without compact: boolean indicators go back to "yes"/"no", categoricals to
+    objects and the downcast columns to their stack_dtypes types. The averages keep their
+    float32 precision. Columns that are not compact are left as they are.
+    
+    Parameters:
+    df (pd.DataFrame): The raw or wide stack (or a projection of it).
+    stack_type (StackType): StackType.RAW or StackType.WIDE.
+    
+    Returns:
+    pd.DataFrame: The expanded DataFrame.
+    """
+    dtype_dict = stack_dtypes(stack_type)
+    for col in indicator_cols:
+        if col in df.columns and pd.api.types.is_bool_dtype(df[col]):
+            df[col] = np.where(df[col], "yes", "no").astype(object)
+    for col in categorical_cols:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Missing strings read from a columnar file are None, not the categorical's NaN
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    for col in downcast_dtype_dict:
+        if col in df.columns and col in dtype_dict:
+            df[col] = df[col].astype(dtype_dict[col])
+    return df
+
+def memory_usage_report(df, baseline=None):
+    """
+    Report the in-memory size of each column of a DataFrame.
+    
+    Parameters:
+    df (pd.DataFrame): The DataFrame to measure.
+    baseline (pd.DataFrame): Optional DataFrame to compare against, e.g. the stack before compact_stack.
+    
+    Returns:
+    pd.DataFrame: One row per column plus a "Total" row, with dtype and MB
+        (and baseline_MB and ratio if a baseline is given), largest first.
+    """
+    def usage(frame):
+        return frame.memory_usage(index=False, deep=True) / 1024 ** 2
+
+    report = pd.DataFrame({"dtype": df.dtypes.astype(str), "MB": usage(df)})
+    if baseline is not None:
+        report["baseline_MB"] = usage(baseline).reindex(report.index)
+    report = report.sort_values("MB", ascending=False)
+    report.loc["Total"] = report.sum(numeric_only=True)
+    report.loc["Total", "dtype"] = ""
+    if baseline is not None:
+        report["ratio"] = report["baseline_MB"] / report["MB"]
+    return report
+
+def write_stack_file(df, file_name: str, stack_type: StackType, cache_format: CacheFormat, compact: bool = False):
+    """
+    Write a stack, or one partition of it, to file_name in the requested format.
+    
+    Parameters:
+    df (pd.DataFrame): The raw or wide stack.
+    file_name (str): The path to write.
+    stack_type (StackType): StackType.RAW or StackType.WIDE.
+    cache_format (CacheFormat): PARQUET or FEATHER for a columnar cache, CSV for an export.
+    compact (bool): Store the compact_stack types (columnar formats only). Defaults to False.
+    """
+    if cache_format == CacheFormat.CSV:
+        df.to_csv(file_name, index=False)
+    else:
+        # Columnar formats store the types, so make them match what load_stack declares
+        df = conform_types(df.reset_index(drop=True), stack_dtypes(stack_type))
+        if compact:
+            df = compact_stack(df)
+        if cache_format == CacheFormat.PARQUET:
+            df.to_parquet(file_name, index=False, row_group_size=parquet_row_group_size)
+        else:
+            df.to_feather(file_name)
+
+def read_stack_file(file_name: str, stack_type: StackType, cache_format: CacheFormat, columns=None):
+    """
+    Read a stack file, or one partition of it, projecting to columns if given.
+    """
+    if cache_format == CacheFormat.PARQUET:
+        return pd.read_parquet(file_name, columns=columns)
+    elif cache_format == CacheFormat.FEATHER:
+        return pd.read_feather(file_name, columns=columns)
+    else:
+        dtype_dict = stack_dtypes(stack_type)
+        if columns is not None:
+            dtype_dict = {col: dtype for col, dtype in dtype_dict.items() if col in columns}
+        return pd.read_csv(file_name, dtype=dtype_dict, usecols=columns)
+
+def concat_partitions(frames):
+    """
+    Concatenate partition frames in year order, giving each column one dtype first.
+    Categorical columns, from compact partitions, get the union of every partition's
+    categories, since pandas turns categoricals with different categories into objects.
+    A column that is all missing in a partition, e.g. US_State in a year without it, gets
+    the column's dtype in the other partitions, which pandas warns it will stop doing.
+    """
+    for col in frames[0].columns:
+        present = [frame for frame in frames if col in frame.columns]
+        dtypes = [frame[col].dtype for frame in present if not frame[col].isna().all()]
+        if not dtypes:
+            continue
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            # Sorted, as astype("category") orders them
+            dtype = pd.CategoricalDtype(sorted(set().union(*(dtype.categories for dtype in dtypes))))
+        elif len(set(dtypes)) == 1 and dtypes[0].kind not in "iub":
+            dtype = dtypes[0]
+        else:
+            continue
+        for frame in present:
+            if frame[col].dtype != dtype:
+                frame[col] = frame[col].astype(dtype)
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+def normalize_filters(filters):
+    """
+    Return filters as a list of AND-ed (column, op, value) lists that are OR-ed together,
+    the disjunctive form pyarrow and pd.read_parquet use. A flat list of tuples is one AND group.
+    """
+    if not filters:
+        return None
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    for group in filters:
+        for column, op, value in group:
+            if op not in filter_ops:
+                raise ValueError(f"Invalid filter operator '{op}' for column '{column}'. Choose one of {list(filter_ops)}.")
+    return [list(group) for group in filters]
+
+def indicator_filters(filters, boolean: bool):
+    """
+    Rewrite the values of indicator column filters to how a stack stores them: True/False
+    where indicators are booleans (compact partitions), "yes"/"no" otherwise. Filters may
+    use either form, whatever the stack was built with.
+    """
+    def convert(value):
+        if isinstance(value, (list, tuple, set)):
+            return [convert(item) for item in value]
+        if boolean and isinstance(value, str) and value in ("yes", "no"):
+            return value == "yes"
+        if not boolean and isinstance(value, (bool, np.bool_)):
+            return indicator_values[int(value)]
+        return value
+
+    return [[(column, op, convert(value) if column in indicator_cols else value) for column, op, value in group]
+            for group in filters]
+
+def filter_mask(df, filters):
+    """
+    Evaluate normalized filters against a DataFrame.
+    
+    Returns:
+    pd.Series: Boolean mask of the rows that pass.
+    """
+    mask = pd.Series(False, index=df.index)
+    for group in filters:
+        group_mask = pd.Series(True, index=df.index)
+        for column, op, value in group:
+            group_mask &= filter_ops[op](df[column], value)
+        mask |= group_mask
+    return mask
+
+def partition_may_match(year: int, filters):
+    """
+    Check whether a year's partition can contain rows passing the filters, using only their Year predicates.
+    """
+    year_frame = pd.DataFrame({"Year": [year]})
+    for group in filters:
+        year_group = [condition for condition in group if condition[0] == "Year"]
+        if not year_group or filter_mask(year_frame, [year_group]).iloc[0]:
+            return True
+    return False
+
+def query_stack(data_dir: str, stack_type: StackType = StackType.WIDE, columns=None, filters=None,
+                cache_format: CacheFormat = None, compact: bool = False):
+    """
+    Load the rows of a stack that pass the filters, without materializing the full stack.
+    
+    Year partitions that cannot match are skipped without being opened. Columnar partitions
+    are scanned with the filter pushed down to pyarrow, which skips Parquet row groups whose
+    statistics rule them out and only keeps the passing rows of the rest. CSV caches are
+    filtered one partition at a time.
+    
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    stack_type (StackType): StackType.RAW or StackType.WIDE. Defaults to StackType.WIDE.
+    columns (list): Optional list of columns to return.
+    filters (list): Row predicates as (column, op, value) tuples, AND-ed together, e.g.
+        [("Year", "in", [2022, 2023]), ("Country", "==", "United States")]. A list of such
+        lists is OR-ed. Operators: ==, =, !=, <, <=, >, >=, in, not in. Indicator columns
+        match "yes"/"no" or True/False, whether or not the stack is compact.
+    cache_format (CacheFormat): Format to read. Defaults to any.
+    compact (bool): Return the compact_stack representation; otherwise partitions built with
+        compact=True are expanded back (see expand_stack). Defaults to False.
+    
+    Returns:
+    pd.DataFrame: The matching rows, in year order.
+    
+    Raises:
+    FileNotFoundError: If the stack has not been built.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    filters = normalize_filters(filters)
+    columns = list(columns) if columns is not None else None
+    partitions = stack_partitions(data_dir, stack_type, cache_format)
+    if not partitions:
+        # A single-file cache has nothing to prune, so filter it after loading
+        df = load_stack(data_dir, stack_type, cache_format=cache_format, cache=False)
+        df = df[filter_mask(df, indicator_filters(filters, False))] if filters else df
+        df = df[columns] if columns is not None else df
+        return compact_stack(df.reset_index(drop=True)) if compact else df.reset_index(drop=True)
+
+    frames = []
+    for year, fmt, file_name in partitions:
+        if filters and not partition_may_match(year, filters):
+            continue
+        if fmt == CacheFormat.CSV:
+            df = read_stack_file(file_name, stack_type, fmt)
+            df = df[filter_mask(df, indicator_filters(filters, False))] if filters else df
+            frames.append(df[columns] if columns is not None else df)
+        else:
+            dataset = ds.dataset(file_name, format="parquet" if fmt == CacheFormat.PARQUET else "ipc")
+            expression = None
+            if filters:
+                # Compact partitions store the indicators as booleans
+                boolean = any(field.name in indicator_cols and pa.types.is_boolean(field.type)
+                              for field in dataset.schema)
+                expression = pq.filters_to_expression(indicator_filters(filters, boolean))
+            frames.append(dataset.to_table(columns=columns, filter=expression).to_pandas())
+
+    if not frames:
+        df = read_stack_file(partitions[0][2], stack_type, partitions[0][1], columns).iloc[0:0]
+    else:
+        df = concat_partitions(frames)
+    return compact_stack(df) if compact else expand_stack(df, stack_type)
+
+def stack_source_files(data_dir: str, stack_type: StackType, cache_format: CacheFormat = None):
+    """
+    List the files load_stack reads: the stack's partitions, or else the first single-file cache found.
+    """
+    partitions = stack_partitions(data_dir, stack_type, cache_format)
+    if partitions:
+        return [file_name for _, _, file_name in partitions]
+    for fmt in [cache_format] if cache_format is not None else list(CacheFormat):
+        file_name = stack_file_path(data_dir, stack_type, fmt)
+        if os.path.exists(file_name):
+            return [file_name]
+    return []
+
+def load_stack(data_dir: str, stack_type: StackType = StackType.RAW, columns=None, cache_format: CacheFormat = None,
+               compact: bool = False, filters=None, cache: bool = True, copy: bool = True):
+    """
+    Load either the raw or wide stack file from the cache (filesystem).
     
-    # Attempt to load the file, or raise an error if it doesn't exist
-    if os.path.exists(file_name):
-        return pd.read_csv(file_name, dtype=dtype_dict)
+    Parameters:
+    data_dir (str): Directory where the data files are stored.
+    stack_type (StackType): StackType Enum, either StackType.RAW or StackType.WIDE. Defaults to StackType.RAW.
+    columns (list): Optional list of columns to read. Columnar caches only read these columns from disk.
+    cache_format (CacheFormat): Format to read. Defaults to the partitions written by build_stack,
+        then the first single file found of PARQUET, FEATHER, CSV.
+    compact (bool): Return the compact_stack representation; otherwise partitions built with
+        compact=True are expanded back (see expand_stack). Defaults to False.
+    filters (list): Optional row predicates, pushed down into the cache; see query_stack.
+    cache (bool): Keep the frame in frame_cache and reuse it for the same load until the files
+        change. Defaults to True.
+    copy (bool): Return a copy of a cached frame, shallow under pandas Copy-on-Write. False
+        returns the cached frame itself, which must be treated as read-only. Defaults to True.
+    
+    Returns:
+    pd.DataFrame: The loaded DataFrame (either raw or wide).
+    
+    Raises:
+    FileNotFoundError: If the specified stack file is not found on the filesystem.
+    """
+    if cache:
+        key = ("stack", stack_type, tuple(columns) if columns is not None else None, cache_format, compact,
+               repr(normalize_filters(filters)) if filters else None)
+        return frame_cache.load(key, data_dir, stack_source_files(data_dir, stack_type, cache_format),
+                                lambda: load_stack(data_dir, stack_type, columns, cache_format, compact, filters,
+                                                   cache=False), copy)
+
+    stack_dtypes(stack_type)
+    if filters:
+        return query_stack(data_dir, stack_type, columns, filters, cache_format, compact)
+    columns = list(columns) if columns is not None else None
+
+    # Read the per-year partitions written by build_stack, in year order
+    partitions = stack_partitions(data_dir, stack_type, cache_format)
+    if partitions:
+        frames = [read_stack_file(file_name, stack_type, fmt, columns) for _, fmt, file_name in partitions]
+        df = concat_partitions(frames)
     else:
-        raise FileNotFoundError(f"{stack_type.value.capitalize()} stack file '{file_name}' not found. Please run build() to generate the data.")
\ No newline at end of file
+        # Otherwise fall back to a single-file cache or CSV export, fastest format first
+        formats = [cache_format] if cache_format is not None else list(CacheFormat)
+        for fmt in formats:
+            file_name = stack_file_path(data_dir, stack_type, fmt)
+            if os.path.exists(file_name):
+                df = read_stack_file(file_name, stack_type, fmt, columns)
+                break
+        else:
+            raise FileNotFoundError(f"{stack_type.value.capitalize()} stack file '{file_name}' not found. Please run build_stack() to generate the data.")
+
+    return compact_stack(df) if compact else expand_stack(df, stack_type)
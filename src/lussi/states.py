@@ -0,0 +1,143 @@
+"""
+US state dimension shared by the ZipRecruiter and Stack Overflow data.
+
+Every state (and the District of Columbia) has a small integer code, its position in
+state_table. build_zip and build_stack encode their state columns against it into a
+state_code column (-1 where the state is missing or unknown), so the two sources join
+on integers instead of on spellings:
+
+    wide = load_stack(data_dir, StackType.WIDE)
+    joined = join_state_salaries(wide, load_zip(data_dir), job_title="Data Engineer")
+"""
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# (name, abbreviation) of each state; a state's code is its position
+state_table = [
+    ("Alabama", "AL"), ("Alaska", "AK"), ("Arizona", "AZ"), ("Arkansas", "AR"),
+    ("California", "CA"), ("Colorado", "CO"), ("Connecticut", "CT"), ("Delaware", "DE"),
+    ("District of Columbia", "DC"), ("Florida", "FL"), ("Georgia", "GA"), ("Hawaii", "HI"),
+    ("Idaho", "ID"), ("Illinois", "IL"), ("Indiana", "IN"), ("Iowa", "IA"),
+    ("Kansas", "KS"), ("Kentucky", "KY"), ("Louisiana", "LA"), ("Maine", "ME"),
+    ("Maryland", "MD"), ("Massachusetts", "MA"), ("Michigan", "MI"), ("Minnesota", "MN"),
+    ("Mississippi", "MS"), ("Missouri", "MO"), ("Montana", "MT"), ("Nebraska", "NE"),
+    ("Nevada", "NV"), ("New Hampshire", "NH"), ("New Jersey", "NJ"), ("New Mexico", "NM"),
+    ("New York", "NY"), ("North Carolina", "NC"), ("North Dakota", "ND"), ("Ohio", "OH"),
+    ("Oklahoma", "OK"), ("Oregon", "OR"), ("Pennsylvania", "PA"), ("Rhode Island", "RI"),
+    ("South Carolina", "SC"), ("South Dakota", "SD"), ("Tennessee", "TN"), ("Texas", "TX"),
+    ("Utah", "UT"), ("Vermont", "VT"), ("Virginia", "VA"), ("Washington", "WA"),
+    ("West Virginia", "WV"), ("Wisconsin", "WI"), ("Wyoming", "WY")
+]
+
+# Other spellings found in the sources, mapped to the state name
+state_variants = {
+    "Washington DC": "District of Columbia",
+    "Washington, D.C.": "District of Columbia",
+    "D.C.": "District of Columbia"
+}
+
+# Code of a missing or unrecognized state
+MISSING_STATE = -1
+
+# Type of the state_code columns
+STATE_CODE_DTYPE = "int8"
+
+
+def normalize_state_text(value: str):
+    """
+    Reduce a state spelling to lowercase letters, e.g. "Washington, D.C." -> "washingtondc".
+    """
+    return re.sub(r"[^a-z]", "", value.lower())
+
+
+@lru_cache(maxsize=None)
+def state_lookup():
+    """
+    Return the normalized spelling to code mapping of every name, abbreviation and variant.
+    """
+    lookup = {}
+    for code, (name, abbreviation) in enumerate(state_table):
+        lookup[normalize_state_text(name)] = code
+        lookup[normalize_state_text(abbreviation)] = code
+    for variant, name in state_variants.items():
+        lookup[normalize_state_text(variant)] = lookup[normalize_state_text(name)]
+    return lookup
+
+
+def state_dimension():
+    """
+    Return the state dimension as a DataFrame indexed by state_code, with name and abbreviation.
+    """
+    return pd.DataFrame(state_table, columns=["name", "abbreviation"]).rename_axis("state_code")
+
+
+def encode_states(series):
+    """
+    Encode a column of state names, abbreviations or variants as state codes.
+    Each distinct spelling is looked up once.
+
+    Parameters:
+    series (pd.Series): The state column.
+
+    Returns:
+    np.ndarray: int8 codes, MISSING_STATE where the state is missing or not recognized.
+    """
+    codes, uniques = pd.factorize(series)
+    lookup = state_lookup()
+    unique_codes = np.array([lookup.get(normalize_state_text(str(value)), MISSING_STATE) for value in uniques]
+                            + [MISSING_STATE], dtype=STATE_CODE_DTYPE)
+    # Missing values have code -1, which picks the trailing MISSING_STATE
+    return unique_codes[codes]
+
+
+def decode_states(codes, field: str = "name"):
+    """
+    Turn state codes back into names (field="name") or abbreviations (field="abbreviation").
+
+    Returns:
+    np.ndarray: Object array with NaN for MISSING_STATE.
+    """
+    values = np.array([row[1 if field == "abbreviation" else 0] for row in state_table] + [np.nan], dtype=object)
+    codes = np.asarray(codes)
+    return values[np.where(codes >= 0, codes, len(state_table))]
+
+
+def join_state_salaries(stack_df, zip_df, job_title: str = None, columns=("Annual Salary",)):
+    """
+    Add ZipRecruiter's per-state salaries to each stack respondent, joined on state_code.
+
+    The ZipRecruiter rows are laid out in a table with one row per state code, so the
+    join is a positional take of each respondent's code.
+
+    Parameters:
+    stack_df (pd.DataFrame): The stack, with state_code (the wide stack) or US_State.
+    zip_df (pd.DataFrame): The ZipRecruiter data from load_zip.
+    job_title (str): Join this job title's salaries only. Defaults to None, which adds one
+        column per job title, e.g. "Data Engineer Annual Salary".
+    columns (list): ZipRecruiter columns to add. Defaults to ["Annual Salary"].
+
+    Returns:
+    pd.DataFrame: stack_df with the ZipRecruiter columns added, NaN where the respondent's
+    state is unknown or has no salary data.
+    """
+    columns = list(columns)
+    stack_codes = stack_df["state_code"] if "state_code" in stack_df else encode_states(stack_df["US_State"])
+    zip_codes = zip_df["state_code"] if "state_code" in zip_df else encode_states(zip_df["State"])
+    zip_df = zip_df.assign(state_code=zip_codes)
+    zip_df = zip_df[zip_df["state_code"] != MISSING_STATE]
+
+    if job_title is not None:
+        zip_df = zip_df[zip_df["Job Title"] == job_title]
+        table = zip_df.drop_duplicates("state_code").set_index("state_code")[columns]
+    else:
+        table = zip_df.pivot_table(index="state_code", columns="Job Title", values=columns, aggfunc="first")
+        table.columns = [f"{title} {column}" for column, title in table.columns]
+
+    # One row per code plus a trailing all-NaN row that MISSING_STATE is sent to
+    table = table.reindex(np.arange(len(state_table) + 1))
+    codes = np.asarray(stack_codes)
+    joined = table.iloc[np.where(codes >= 0, codes, len(state_table))]
+    joined.index = stack_df.index
+    return pd.concat([stack_df, joined], axis=1)
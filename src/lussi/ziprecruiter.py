@@ -1,8 +1,22 @@
 import os
-import time
+import re
+import queue
+import random
+import asyncio
+import tempfile
+import logging
+import threading
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
 import pandas as pd
-from selenium import webdriver
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from lussi.frame_cache import frame_cache
+from lussi.instrumentation import run_report, stage
+from lussi.snapshots import SNAPSHOT_TTL, SnapshotStore
+from lussi.states import STATE_CODE_DTYPE, decode_states, encode_states
+
+logger = logging.getLogger(__name__)
 
 # Define the file name at the top of the file
 ZIP_FILENAME = 'combined_salaries.csv'
@@ -10,13 +24,132 @@ ZIP_FILENAME = 'combined_salaries.csv'
 # Base URL for the salary data
 BASE_URL = "https://www.ziprecruiter.com/Salaries/What-Is-the-Average-"
 
-def extract_salary_table(url, job_title):
+# Maximum number of seconds to wait for the salary table to appear on a page
+PAGE_TIMEOUT = 20
+
+# Job titles scraped by default, as (URL suffix, job title)
+JOB_URLS = [
+    ("DATA-Scientist-Salary-by-State", "Data Scientist"),
+    ("Data-Engineer-Salary-by-State", "Data Engineer"),
+    ("Data-Analyst-Salary-by-State", "Data Analyst"),
+    ("Machine-Learning-Engineer-Salary-by-State", "Machine Learning Engineer"),
+    ("Quantitative-Analyst-Salary-by-State", "Quantitative Analyst"),
+    ("BIG-DATA-Engineer-Salary-by-State", "Big Data Engineer"),
+    ("Statistician-Salary-by-State", "Statistician")
+]
+
+# Directory under data_dir holding the parsed table of each job title scraped so far
+CHECKPOINT_DIR = "zip_checkpoints"
+
+# Directory under data_dir holding the HTML of every page fetched, see lussi.snapshots
+SNAPSHOT_DIR = "zip_snapshots"
+
+# Seconds to wait before retrying a failed page, doubled on every further attempt up to MAX_BACKOFF
+RETRY_BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+
+class DriverPool:
+    """
+    A pool of Selenium WebDrivers that are reused across pages.
+    
+    Drivers are started lazily, up to size at a time. A driver that is released as
+    unhealthy is quit and its slot is given to a fresh driver on the next acquire.
+    
+    Parameters:
+    size (int): Maximum number of browsers running at once. Defaults to 1.
+    driver_factory (callable): Creates a WebDriver. Defaults to chrome_driver.
+    """
+
+    def __init__(self, size: int = 1, driver_factory=None):
+        self.driver_factory = driver_factory or chrome_driver
+        self._slots = threading.Semaphore(size)
+        self._idle = queue.Queue()
+
+    def acquire(self):
+        """
+        Take an idle driver from the pool, starting a new one if none is idle.
+        """
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self.driver_factory()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, driver, healthy: bool = True):
+        """
+        Return a driver to the pool, or quit it if it is no longer healthy.
+        """
+        if healthy:
+            self._idle.put(driver)
+        else:
+            quit_driver(driver)
+        self._slots.release()
+
+    def close(self):
+        """
+        Quit every idle driver.
+        """
+        while True:
+            try:
+                quit_driver(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def chrome_driver():
+    """
+    Start a Chrome WebDriver. Selenium is imported here so that loading cached data never imports it.
+    """
+    from selenium import webdriver
+    return webdriver.Chrome()  # Make sure ChromeDriver is installed and accessible
+
+def wait_for_table(driver, timeout: int = PAGE_TIMEOUT):
+    """
+    Wait until the salary table is on the driver's page instead of sleeping a fixed time.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, 'table')))
+
+def quit_driver(driver):
+    """
+    Quit a driver, ignoring errors from a browser that has already died.
+    """
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def driver_is_healthy(driver):
+    """
+    Check that a driver's browser still responds.
+    """
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+def extract_salary_table(url, job_title, driver=None, timeout: int = PAGE_TIMEOUT, snapshots: SnapshotStore = None):
     """
     Extract the salary table from a given ZipRecruiter URL.
     
     Parameters:
     url (str): The URL to scrape the salary data from.
     job_title (str): The job title for which the salary data is being scraped.
+    driver (WebDriver): Driver to load the page with, e.g. from a DriverPool. Defaults to a new Chrome that is quit afterwards.
+    timeout (int): Maximum number of seconds to wait for the salary table. Defaults to PAGE_TIMEOUT.
+    snapshots (SnapshotStore): Save the page's HTML here once its table has been parsed. Defaults to None.
     
     Returns:
     pd.DataFrame: DataFrame containing the salary data for the given job title.
@@ -24,68 +157,128 @@ def extract_salary_table(url, job_title):
     Raises:
     Exception: If no salary table is found on the page.
     """
-    # Set up Selenium WebDriver
-    driver = webdriver.Chrome()  # Make sure ChromeDriver is installed and accessible
+    if driver is None:
+        # Set up Selenium WebDriver for this page only
+        driver = chrome_driver()
+        try:
+            return extract_salary_table(url, job_title, driver, timeout, snapshots)
+        finally:
+            driver.quit()
+
     driver.get(url)
     
-    # Allow time for the page to load
-    time.sleep(5)
+    try:
+        wait_for_table(driver, timeout)
+    except Exception:
+        raise Exception(f"No table found on the page: {url}")
     
-    # Parse the page content using BeautifulSoup
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    table = soup.find('table')
+    html = driver.page_source
+    df = parse_salary_table(html, job_title, url)
+    if snapshots is not None:
+        snapshots.save(url, html)
+    return df
 
-    if not table:
-        driver.quit()
-        raise Exception(f"No table found on the page: {url}")
+class SalaryTableParser(HTMLParser):
+    """
+    Collects the text of the header cells and of the rows of the first table on a page.
     
-    # Extract table headers and rows
-    headers = [header.text.strip() for header in table.find_all('th')]
-    rows = [
-        [col.text.strip() for col in row.find_all('td')]
-        for row in table.find_all('tr')[1:]  # Skip header row
-    ]
+    Built on the standard library's HTMLParser, which streams through the page without
+    building a document tree, so parsing needs neither a browser nor BeautifulSoup.
+    """
 
-    # Create DataFrame and add a 'Job Title' column
-    df = pd.DataFrame(rows, columns=headers)
-    df['Job Title'] = job_title
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = False
+        self.headers = []
+        self.rows = []
+        self._depth = 0
+        self._done = False
+        self._cell = None
+        self._cell_tag = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+        if tag == "table":
+            self.found = True
+            self._depth += 1
+        elif self._depth == 0:
+            return
+        elif tag == "tr":
+            # An open cell ends with its row, also where the page leaves out the end tag
+            self._close_cell()
+            self.rows.append([])
+        elif tag in ("th", "td"):
+            self._close_cell()
+            self._cell = []
+            self._cell_tag = tag
+
+    def handle_endtag(self, tag):
+        if self._done or self._depth == 0:
+            return
+        if tag in ("th", "td", "tr"):
+            self._close_cell()
+        elif tag == "table":
+            self._close_cell()
+            self._depth -= 1
+            self._done = self._depth == 0
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _close_cell(self):
+        if self._cell is None:
+            return
+        text = "".join(self._cell).strip()
+        if self._cell_tag == "th":
+            self.headers.append(text)
+        elif self.rows:
+            self.rows[-1].append(text)
+        self._cell = None
+
+def parse_salary_table(html, job_title, url=None):
+    """
+    Parse the salary table out of a ZipRecruiter page: the first table's header cells
+    are the columns, and every row after the first is a state.
     
-    # Close the WebDriver
-    driver.quit()
+    Parameters:
+    html (str): The page source.
+    job_title (str): The job title the page is about.
+    url (str): The page's URL, for error messages.
+    
+    Returns:
+    pd.DataFrame: DataFrame containing the salary data for the given job title.
+    
+    Raises:
+    Exception: If no salary table is found on the page.
+    """
+    parser = SalaryTableParser()
+    parser.feed(html)
+    parser.close()
+
+    if not parser.found:
+        raise Exception(f"No table found on the page: {url}")
+    
+    # Create DataFrame from the rows after the header row and add a 'Job Title' column
+    df = pd.DataFrame(parser.rows[1:], columns=parser.headers)
+    df['Job Title'] = job_title
     return df
 
 def add_state_abbreviation(df):
     """
-    Add a 'State Abbreviation' column by merging with state abbreviations data.
+    Add the 'Abbreviation' and 'state_code' columns by encoding the 'State' column
+    against the state dimension (see lussi.states).
     
     Parameters:
     df (pd.DataFrame): The salary DataFrame.
     
     Returns:
-    pd.DataFrame: The DataFrame with state abbreviations added.
-    """
-    # Dictionary of state names and abbreviations
-    state_abbreviations = {
-        'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 
-        'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 
-        'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID', 
-        'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS', 
-        'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD', 
-        'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 
-        'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV', 
-        'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY', 
-        'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK', 
-        'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC', 
-        'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 
-        'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV', 
-        'Wisconsin': 'WI', 'Wyoming': 'WY'
-    }
-    
-    # Convert the dictionary to a DataFrame
-    state_df = pd.DataFrame(list(state_abbreviations.items()), columns=['State', 'Abbreviation'])
-    
-    # Merge the state abbreviations with the salary data
-    df = df.merge(state_df, how='left', on='State')
+    pd.DataFrame: The DataFrame with state abbreviations and codes added.
+    """
+    codes = encode_states(df['State'])
+    df['Abbreviation'] = decode_states(codes, 'abbreviation')
+    df['state_code'] = codes
     
     return df
 
@@ -130,12 +323,215 @@ def clean_salary_data(df):
     
     return df
 
-def load_zip(data_dir: str):
+class RateLimiter:
+    """
+    Spaces out requests so that all tasks together start at most rate requests per second.
+    
+    Parameters:
+    rate (float): Requests per second; 0 or None disables the limit.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+
+    async def wait(self):
+        """
+        Wait for the next request slot.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Claim the slot before sleeping; the event loop runs one task at a time, so no lock is needed
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+def http_fetcher(timeout: int = PAGE_TIMEOUT):
+    """
+    Return a coroutine function that fetches a page's HTML with a plain HTTP GET,
+    for servers that do not need a browser, such as a local stand-in serving fixture pages.
+    """
+    def get(url):
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+
+    async def fetch(url):
+        return await asyncio.get_running_loop().run_in_executor(None, get, url)
+    return fetch
+
+def browser_fetcher(driver_pool: DriverPool, timeout: int = PAGE_TIMEOUT):
+    """
+    Return a coroutine function that loads a page in a browser from driver_pool and
+    returns its HTML once the salary table is present.
+    """
+    def get(url):
+        driver = driver_pool.acquire()
+        healthy = True
+        try:
+            driver.get(url)
+            wait_for_table(driver, timeout)
+            return driver.page_source
+        except Exception:
+            healthy = driver_is_healthy(driver)
+            raise
+        finally:
+            driver_pool.release(driver, healthy)
+
+    async def fetch(url):
+        return await asyncio.get_running_loop().run_in_executor(None, get, url)
+    return fetch
+
+def checkpoint_path(checkpoint_dir: str, url_suffix: str):
+    """
+    Build the path of a job title's checkpoint, e.g. <checkpoint_dir>/Data-Engineer-Salary-by-State.csv.
+    """
+    return os.path.join(checkpoint_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", url_suffix) + ".csv")
+
+def retryable(error):
+    """
+    Decide whether a failed page is worth retrying: anything but a client error other than 429.
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return True
+
+def write_checkpoint(df, path: str):
+    """
+    Write a job title's parsed table to its checkpoint.
+    """
+    # Write to a temporary file so a killed run never leaves a truncated checkpoint
+    df.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+async def scrape_titles(job_urls, fetch_page, checkpoint_dir: str, base_url: str = BASE_URL, concurrency: int = 1,
+                        requests_per_second: float = 1.0, retries: int = 2, backoff: float = RETRY_BACKOFF,
+                        snapshots: SnapshotStore = None, offline: bool = False):
+    """
+    Scrape job titles concurrently, writing each title's parsed table to checkpoint_dir
+    as soon as it is done. Titles that already have a checkpoint are skipped.
+    
+    With a snapshot store, a title whose page has a fresh snapshot is parsed from it
+    instead of being fetched, and every page fetched is saved to it.
+    
+    Parameters:
+    job_urls (list): (URL suffix, job title) tuples.
+    fetch_page (callable): Coroutine function returning the HTML of a URL, e.g. from http_fetcher or browser_fetcher.
+    checkpoint_dir (str): Directory of the checkpoints.
+    base_url (str): Prefix of every URL suffix. Defaults to BASE_URL.
+    concurrency (int): Maximum number of pages loading at once. Defaults to 1.
+    requests_per_second (float): Global rate limit across all pages. Defaults to 1.0.
+    retries (int): Number of extra attempts for a page that fails. Defaults to 2.
+    backoff (float): Seconds before the first retry, doubled for each further one. Defaults to RETRY_BACKOFF.
+    snapshots (SnapshotStore): Store of the fetched pages. Defaults to None.
+    offline (bool): Never fetch: parse each title from its newest snapshot, however old, and
+        fail titles without one. Defaults to False.
+    
+    Returns:
+    list: True for each title that has a checkpoint afterwards, False for each that failed, in job_urls order.
+    """
+    limiter = RateLimiter(requests_per_second)
+    loading = asyncio.Semaphore(max(concurrency, 1))
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    async def scrape(url_suffix, job_title):
+        path = checkpoint_path(checkpoint_dir, url_suffix)
+        if os.path.exists(path):
+            logger.info(f"Skipping {job_title}, already scraped to {path}")
+            return True
+        url = base_url + url_suffix
+        html = snapshots.get(url, fresh_only=not offline) if snapshots is not None else None
+        if html is not None:
+            try:
+                with stage("reparse", job_title=job_title) as record:
+                    df = parse_salary_table(html, job_title, url)
+                    record["rows"] = len(df)
+                write_checkpoint(df, path)
+                logger.info(f"Extracted data for {job_title} from its snapshot")
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to parse the snapshot of {job_title}: {e}")
+        if offline:
+            logger.warning(f"No usable snapshot of {job_title} ({url}) to build from offline")
+            return False
+        for attempt in range(retries + 1):
+            try:
+                async with loading:
+                    await limiter.wait()
+                    with stage("scrape", job_title=job_title, attempt=attempt + 1) as record:
+                        html = await fetch_page(url)
+                        df = parse_salary_table(html, job_title, url)
+                        record["rows"] = len(df)
+                # Only pages that parse are saved, so a broken page is fetched again next time
+                if snapshots is not None:
+                    snapshots.save(url, html)
+                write_checkpoint(df, path)
+                logger.info(f"Successfully extracted data for {job_title}")
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to extract data for {job_title} (attempt {attempt + 1} of {retries + 1}): {e}")
+                if attempt == retries or not retryable(e):
+                    return False
+                delay = min(backoff * 2 ** attempt, MAX_BACKOFF)
+                # Jitter keeps retries of pages that failed together from hitting the server together
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    return await asyncio.gather(*(scrape(url_suffix, job_title) for url_suffix, job_title in job_urls))
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine to completion, also from code that already runs an event loop such as a notebook.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def scrape_job_urls(job_urls, checkpoint_dir: str, fetch_page=None, workers: int = 1, **kwargs):
+    """
+    Scrape job titles with scrape_titles and combine their checkpoints.
+    
+    Parameters:
+    job_urls (list): (URL suffix, job title) tuples.
+    checkpoint_dir (str): Directory of the checkpoints.
+    fetch_page (callable): Coroutine function returning the HTML of a URL. Defaults to
+        browser_fetcher over a new DriverPool of size workers, closed afterwards; its
+        browsers are only started once a page is fetched.
+    workers (int): Number of pages loading concurrently. Defaults to 1.
+    kwargs: Passed on to scrape_titles, e.g. base_url, requests_per_second, retries, snapshots.
+    
+    Returns:
+    tuple: (the combined DataFrame in job_urls order or None if no title was scraped,
+    list of the job titles that failed).
+    """
+    pool = None
+    if fetch_page is None:
+        pool = DriverPool(workers)
+        fetch_page = browser_fetcher(pool)
+    try:
+        done = run_coroutine(scrape_titles(job_urls, fetch_page, checkpoint_dir, concurrency=workers, **kwargs))
+    finally:
+        if pool is not None:
+            pool.close()
+
+    # Read the raw strings back, as clean_salary_data expects them
+    dfs = [pd.read_csv(checkpoint_path(checkpoint_dir, url_suffix), dtype=str)
+           for (url_suffix, _), ok in zip(job_urls, done) if ok]
+    failed = [job_title for (_, job_title), ok in zip(job_urls, done) if not ok]
+    return (pd.concat(dfs, ignore_index=True) if dfs else None), failed
+
+def load_zip(data_dir: str, cache: bool = True, copy: bool = True):
     """
     Load the CSV file from the specified data directory if it exists; otherwise, raise an error.
     
     Parameters:
     data_dir (str): The directory where the data files are stored.
+    cache (bool): Keep the frame in frame_cache and reuse it until the file changes. Defaults to True.
+    copy (bool): Return a copy of a cached frame, shallow under pandas Copy-on-Write. False
+        returns the cached frame itself, which must be treated as read-only. Defaults to True.
     
     Returns:
     pd.DataFrame: The loaded DataFrame.
@@ -146,79 +542,134 @@ def load_zip(data_dir: str):
     zip_filename = os.path.join(data_dir, ZIP_FILENAME)
     if os.path.exists(zip_filename):
         # print(f"Loading data from {zip_filename}")
-        return pd.read_csv(zip_filename)
+        if cache:
+            return frame_cache.load(("zip",), data_dir, [zip_filename],
+                                    lambda: pd.read_csv(zip_filename, dtype={'state_code': STATE_CODE_DTYPE}), copy)
+        return pd.read_csv(zip_filename, dtype={'state_code': STATE_CODE_DTYPE})
     else:
         raise FileNotFoundError(f"The file '{zip_filename}' does not exist.")
 
-def process_job_urls(job_urls):
+def process_job_urls(job_urls, workers: int = 1, retries: int = 2, driver_pool: DriverPool = None,
+                     checkpoint_dir: str = None, **kwargs):
     """
     Process a list of job URLs to extract salary data for multiple job titles.
     
+    A thin wrapper over scrape_job_urls, so pages are fetched under the same rate limit,
+    backoff, checkpoints and snapshots as in build_zip.
+    
     Parameters:
     job_urls (list): List of tuples containing (URL suffix, job title).
+    workers (int): Number of browsers scraping concurrently. Defaults to 1.
+    retries (int): Number of extra attempts for a page that fails. Defaults to 2.
+    driver_pool (DriverPool): Pool to take drivers from. Defaults to a new pool of size workers, closed afterwards.
+    checkpoint_dir (str): Directory of the checkpoints. Defaults to a temporary directory.
+    kwargs: Passed on to scrape_titles, e.g. base_url, requests_per_second, snapshots.
     
     Returns:
-    pd.DataFrame: Combined DataFrame of all extracted data.
+    pd.DataFrame: Combined DataFrame of all extracted data, in the order of job_urls, or
+    None if no title was scraped.
     """
-    dfs = []
-    for url_suffix, job_title in job_urls:
-        full_url = BASE_URL + url_suffix
-        try:
-            df = extract_salary_table(full_url, job_title)
-            dfs.append(df)
-            print(f"Successfully extracted data for {job_title}")
-        except Exception as e:
-            print(f"Failed to extract data for {job_title}: {e}")
-    
-    if dfs:
-        # Concatenate all DataFrames into one combined DataFrame
-        return pd.concat(dfs, ignore_index=True)
-    else:
-        print("No data was extracted.")
+    fetch_page = browser_fetcher(driver_pool) if driver_pool is not None else None
+    with tempfile.TemporaryDirectory(prefix="lussi-zip-") as temp_dir:
+        df, _ = scrape_job_urls(job_urls, checkpoint_dir or temp_dir, fetch_page, workers, retries=retries, **kwargs)
+    if df is None:
+        logger.warning("No data was extracted.")
+    return df
 
-def build_zip(data_dir: str):
+def build_zip(data_dir: str, workers: int = 1, report_file: str = None, track_memory: bool = False,
+              job_urls=None, fetch_page=None, base_url: str = BASE_URL, requests_per_second: float = 1.0,
+              retries: int = 2, resume: bool = True, snapshot_ttl: float = SNAPSHOT_TTL, offline: bool = False):
     """
     Build the salary data file by downloading data from the provided job URLs,
     cleaning it, adding the state abbreviations and salary tiers, 
     and saving it to a CSV file in the specified data directory.
     
+    Pages are scraped asynchronously under a global rate limit, and each job title's
+    table is checkpointed under <data_dir>/zip_checkpoints as soon as it is parsed. If
+    some titles fail, the file is written from the others and their checkpoints are
+    kept, so running build_zip again only scrapes the missing titles. After a complete
+    run the checkpoints are removed.
+    
+    The HTML of every page fetched is kept in a timestamped snapshot store under
+    <data_dir>/zip_snapshots (see lussi.snapshots). Titles whose newest snapshot is
+    younger than snapshot_ttl are parsed from it rather than fetched, so after a change to
+    the cleaning code build_zip rebuilds the file in milliseconds without a browser, and
+    only titles whose snapshots have expired are scraped again. With offline=True nothing
+    is fetched at all, e.g. to build from fixture pages in tests.
+    
     Parameters:
     data_dir (str): The directory where the data files should be saved.
+    workers (int): Number of pages (browsers) loading concurrently. Defaults to 1.
+    report_file (str): Write a JSON report of each stage's time, rows and memory here. Defaults to None.
+    track_memory (bool): Record each stage's peak memory with tracemalloc (slower). Defaults to False.
+    job_urls (list): (URL suffix, job title) tuples to scrape. Defaults to JOB_URLS.
+    fetch_page (callable): Coroutine function returning a page's HTML, e.g. http_fetcher() for a
+        local stand-in. Defaults to a browser_fetcher over a pool of workers browsers.
+    base_url (str): Prefix of the URL suffixes. Defaults to BASE_URL.
+    requests_per_second (float): Global rate limit on page loads. Defaults to 1.0.
+    retries (int): Number of extra attempts, with exponential backoff, for a page that fails. Defaults to 2.
+    resume (bool): Reuse the checkpoints of an earlier incomplete run. Defaults to True.
+    snapshot_ttl (float): Seconds a page snapshot is reused before the page is fetched again;
+        0 fetches every page, None reuses snapshots forever. Defaults to SNAPSHOT_TTL (a week).
+    offline (bool): Build from the newest snapshot of each title whatever its age, without
+        fetching or starting a browser; titles without a snapshot fail. Defaults to False.
+    
+    Returns:
+    RunReport: The stages of the build, see lussi.instrumentation.
     """
-    # Ensure the data directory exists
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"Created directory: {data_dir}")
-
-    zip_filename = os.path.join(data_dir, 'combined_salaries.csv')
-
-    # List of job URL suffixes and corresponding job titles
-    job_urls = [
-        ("DATA-Scientist-Salary-by-State", "Data Scientist"),
-        ("Data-Engineer-Salary-by-State", "Data Engineer"),
-        ("Data-Analyst-Salary-by-State", "Data Analyst"),
-        ("Machine-Learning-Engineer-Salary-by-State", "Machine Learning Engineer"),
-        ("Quantitative-Analyst-Salary-by-State", "Quantitative Analyst"),
-        ("BIG-DATA-Engineer-Salary-by-State", "Big Data Engineer"),
-        ("Statistician-Salary-by-State", "Statistician")
-    ]
-    
-    # Process the job URLs and extract salary data
-    df_combined = process_job_urls(job_urls)
-    
-    # Clean the salary data and add the new columns
-    if not df_combined.empty:
-        # Clean the salary columns (Annual Salary, Monthly Pay, Weekly Pay, Hourly Wage)
-        df_combined = clean_salary_data(df_combined)
-
-        # Add the state abbreviation column
-        df_combined = add_state_abbreviation(df_combined)
-        
-        # Add the salary tier column
-        df_combined = add_salary_tier_column(df_combined)
+    job_urls = list(job_urls or JOB_URLS)
+    with run_report("build_zip", report_file, track_memory, data_dir=data_dir, workers=workers,
+                    titles=len(job_urls), requests_per_second=requests_per_second, snapshot_ttl=snapshot_ttl,
+                    offline=offline) as report:
+        # Ensure the data directory exists
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+            logger.info(f"Created directory: {data_dir}")
+
+        zip_filename = os.path.join(data_dir, ZIP_FILENAME)
+        checkpoint_dir = os.path.join(data_dir, CHECKPOINT_DIR)
+        if not resume:
+            remove_checkpoints(checkpoint_dir)
+        snapshots = SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR), snapshot_ttl)
+    
+        # Process the job URLs and extract salary data
+        df_combined, failed = scrape_job_urls(job_urls, checkpoint_dir, fetch_page, workers, base_url=base_url,
+                                              requests_per_second=requests_per_second, retries=retries,
+                                              snapshots=snapshots, offline=offline)
+        report.params["failed_titles"] = failed
+    
+        # Clean the salary data and add the new columns
+        if df_combined is not None and not df_combined.empty:
+            with stage("clean", rows=len(df_combined)):
+                # Clean the salary columns (Annual Salary, Monthly Pay, Weekly Pay, Hourly Wage)
+                df_combined = clean_salary_data(df_combined)
+
+                # Add the state abbreviation column
+                df_combined = add_state_abbreviation(df_combined)
+            
+                # Add the salary tier column
+                df_combined = add_salary_tier_column(df_combined)
         
-        # Save the DataFrame to CSV
-        df_combined.to_csv(zip_filename, index=False)
-        print(f"Combined data with state abbreviations and salary tiers saved to {zip_filename}")
-    else:
-        print("No data to save.")
+            # Save the DataFrame to CSV
+            with stage("write", rows=len(df_combined)):
+                df_combined.to_csv(zip_filename, index=False)
+            frame_cache.invalidate(data_dir)
+            logger.info(f"Combined data with state abbreviations and salary tiers saved to {zip_filename}")
+        else:
+            logger.warning("No data to save.")
+
+        if failed:
+            logger.warning(f"Could not scrape {len(failed)} of {len(job_urls)} job titles: {failed}. "
+                           "Run build_zip again to retry them.")
+        else:
+            remove_checkpoints(checkpoint_dir)
+    return report
+
+def remove_checkpoints(checkpoint_dir: str):
+    """
+    Delete the scraping checkpoints.
+    """
+    if os.path.isdir(checkpoint_dir):
+        for file_name in os.listdir(checkpoint_dir):
+            os.remove(os.path.join(checkpoint_dir, file_name))
+        os.rmdir(checkpoint_dir)
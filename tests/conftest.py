@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The package is used from the source tree (see run.py), not installed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from lussi.benchmark import generate_surveys
+from lussi.stackoverflow import build_stack
+
+# Synthetic survey rows per test build, split across the years
+SURVEY_ROWS = 3000
+SURVEY_YEARS = [2017, 2020, 2023]
+
+
+@pytest.fixture(scope="session")
+def survey_prefix(tmp_path_factory):
+    """
+    Synthetic surveys (see lussi.benchmark) laid out like the S3 bucket, as a build_stack source_prefix.
+    """
+    root = tmp_path_factory.mktemp("surveys")
+    generate_surveys(str(root), SURVEY_ROWS, SURVEY_YEARS)
+    return str(root) + os.sep
+
+
+@pytest.fixture(scope="session")
+def stack_dir(survey_prefix, tmp_path_factory):
+    """
+    A data directory built from the synthetic surveys. Tests must not modify it.
+    """
+    data_dir = str(tmp_path_factory.mktemp("stack"))
+    build_stack(data_dir, years=SURVEY_YEARS, source_prefix=survey_prefix)
+    return data_dir
@@ -0,0 +1,16 @@
+import pyarrow as pa
+
+from lussi.benchmark import measure
+
+
+def test_measure_sees_arrow_allocations():
+    _, result = measure("allocate", lambda: pa.array(range(2_000_000), type=pa.int64()))
+    # 16 MB of Arrow buffers, which tracemalloc cannot see
+    assert result["arrow_peak_mb"] >= 15
+    assert result["max_rss_mb"] >= result["arrow_peak_mb"]
+
+
+def test_measure_without_memory():
+    result, stats = measure("noop", lambda: 42, track_memory=False)
+    assert result == 42
+    assert stats["peak_mb"] is None and stats["arrow_peak_mb"] is None and stats["max_rss_mb"] is None
@@ -0,0 +1,25 @@
+import numpy as np
+
+from lussi.bitmap_index import load_technology_index
+from lussi.stackoverflow import StackType, load_stack
+
+
+def lists(series, token):
+    return series.fillna("").str.split(";").apply(lambda tokens: token in [t.strip() for t in tokens]).to_numpy()
+
+
+def test_bitmaps_match_the_stack_rows(stack_dir):
+    wide = load_stack(stack_dir, StackType.WIDE)
+    index = load_technology_index(stack_dir)
+    assert index.size == len(wide)
+
+    rust = lists(wide["LanguageWorkedWith"], "Rust")
+    postgres = lists(wide["DatabaseWorkedWith"], "PostgreSQL")
+    windows = lists(wide["PlatformWorkedWith"], "Windows")
+    hits = index["language:Rust"] & index["database:PostgreSQL"] & ~index["platform:Windows"]
+    expected = rust & postgres & ~windows
+    assert expected.any()
+    np.testing.assert_array_equal(hits.mask(), expected)
+    assert hits.count() == expected.sum()
+    assert (index["language:Rust"] | index["platform:Windows"]).count() == (rust | windows).sum()
+    assert hits.select(wide).index.tolist() == np.flatnonzero(expected).tolist()
@@ -0,0 +1,9 @@
+from lussi.benchmark import check_imports
+
+
+def test_commands_import_only_what_they_need(tmp_path):
+    results = {result["command"]: result["forbidden"] for result in check_imports(work_dir=str(tmp_path))}
+    # As the lussi.cli docstring promises: --help and info import none of pandas, selenium
+    # and bs4, load and an offline build-zip import neither selenium nor bs4
+    assert {"--help", "info", "load --stack wide", "load --stack zip", "build-zip --offline"} <= set(results)
+    assert results == {command: [] for command in results}
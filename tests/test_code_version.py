@@ -0,0 +1,48 @@
+import json
+import os
+
+from lussi.bitmap_index import INDEX_DIR, update_technology_index
+from lussi.cube import CUBE_DIR, cube_partition_path, update_salary_cube
+from lussi.feature_store import FEATURES_DIR, SCHEMA_FN, feature_store_current
+from lussi.stackoverflow import (build_stack, code_version, load_partition_versions, load_stack_manifest,
+                                 stack_code_modules, stack_code_version)
+
+YEAR = 2023
+
+
+def test_stack_version_covers_every_module_shaping_partitions():
+    assert {"stackoverflow.py", "states.py", "polars_engine.py"} <= set(stack_code_modules)
+    assert stack_code_version() == code_version(stack_code_modules)
+    assert stack_code_version() != code_version(["stackoverflow.py"])
+
+
+def test_stale_derived_artifacts_are_rebuilt(survey_prefix, tmp_path):
+    data_dir = str(tmp_path)
+    build_stack(data_dir, years=[YEAR], source_prefix=survey_prefix, feature_store=True)
+    manifest = load_stack_manifest(data_dir)
+    assert manifest[str(YEAR)]["code_version"] == stack_code_version()
+    assert feature_store_current(data_dir, manifest)
+
+    # Pretend the cube, the index and the feature store were written by older code
+    for artifact_dir in [CUBE_DIR, INDEX_DIR]:
+        versions_fn = os.path.join(data_dir, artifact_dir, "versions.json")
+        with open(versions_fn, "w") as f:
+            json.dump({str(YEAR): "old"}, f)
+    schema_fn = os.path.join(data_dir, FEATURES_DIR, SCHEMA_FN)
+    with open(schema_fn) as f:
+        schema = json.load(f)
+    schema["code_version"] = "old"
+    with open(schema_fn, "w") as f:
+        json.dump(schema, f)
+    assert not feature_store_current(data_dir, manifest)
+
+    cube_mtime = os.stat(cube_partition_path(data_dir, YEAR)).st_mtime_ns
+    update_salary_cube(data_dir, [YEAR])
+    update_technology_index(data_dir, [YEAR])
+    assert os.stat(cube_partition_path(data_dir, YEAR)).st_mtime_ns != cube_mtime
+    for artifact_dir in [CUBE_DIR, INDEX_DIR]:
+        assert load_partition_versions(os.path.join(data_dir, artifact_dir))[str(YEAR)] != "old"
+
+    # A rebuild with unchanged code reuses the partitions but rewrites the stale feature store
+    build_stack(data_dir, years=[YEAR], source_prefix=survey_prefix, feature_store=True)
+    assert feature_store_current(data_dir, load_stack_manifest(data_dir))
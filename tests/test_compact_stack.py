@@ -0,0 +1,60 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SURVEY_YEARS
+from lussi.stackoverflow import StackType, build_stack, downcast_dtype_dict, load_stack
+
+
+@pytest.fixture(scope="module")
+def compact_dir(survey_prefix, tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp("compact"))
+    build_stack(data_dir, years=SURVEY_YEARS, source_prefix=survey_prefix, compact=True)
+    return data_dir
+
+
+def assert_same_stack(df, expected):
+    assert df.dtypes.to_dict() == expected.dtypes.to_dict()
+    floats = list(downcast_dtype_dict)[1:]
+    # The averages keep the float32 precision they were stored with
+    np.testing.assert_allclose(df[floats].to_numpy(), expected[floats].to_numpy(), rtol=1e-6)
+    pd.testing.assert_frame_equal(df.drop(columns=floats), expected.drop(columns=floats))
+
+
+@pytest.mark.parametrize("stack_type", [StackType.RAW, StackType.WIDE])
+def test_compact_partitions_load_expanded(stack_dir, compact_dir, stack_type):
+    expected = load_stack(stack_dir, stack_type, cache=False)
+    assert_same_stack(load_stack(compact_dir, stack_type, cache=False), expected)
+
+
+def test_compact_partitions_load_expanded_filtered(stack_dir, compact_dir):
+    # A single partition keeps its categories, which concatenating several would drop
+    filters = [("Year", "==", SURVEY_YEARS[-1])]
+    expected = load_stack(stack_dir, StackType.WIDE, filters=filters, cache=False)
+    assert_same_stack(load_stack(compact_dir, StackType.WIDE, filters=filters, cache=False), expected)
+
+
+@pytest.mark.parametrize("value", ["yes", True])
+@pytest.mark.parametrize("compact", [False, True])
+def test_indicator_filters_on_compact_partitions(stack_dir, compact_dir, value, compact):
+    filters = [("python", "==", value), ("Year", ">=", SURVEY_YEARS[1])]
+    expected = load_stack(stack_dir, StackType.WIDE, filters=[("python", "==", "yes"), ("Year", ">=", SURVEY_YEARS[1])],
+                          cache=False)
+    assert len(expected) > 0 and (expected["python"] == "yes").all()
+    df = load_stack(compact_dir, StackType.WIDE, filters=filters, compact=compact, cache=False)
+    assert len(df) == len(expected)
+    assert df["python"].eq(True if compact else "yes").all()
+    assert len(load_stack(stack_dir, StackType.WIDE, filters=filters, cache=False)) == len(expected)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_partitions_concatenate_without_dtype_warnings(stack_dir, compact_dir, compact):
+    # The first year has no US_State or Sexuality answers, so those columns are all missing there
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        for data_dir in [stack_dir, compact_dir]:
+            df = load_stack(data_dir, StackType.WIDE, compact=compact, cache=False)
+    if compact:
+        assert isinstance(df["sexuality_grouped"].dtype, pd.CategoricalDtype)
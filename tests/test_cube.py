@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from lussi.cube import SKETCH_ACCURACY, query_cube
+from lussi.stackoverflow import StackType, load_stack
+
+
+def test_cube_answers_match_the_wide_stack(stack_dir):
+    wide = load_stack(stack_dir, StackType.WIDE)
+    python = wide[wide["python"] == "yes"]
+    result = query_cube(stack_dir, by=["Year"], filters=[("technology", "==", "python")]).set_index("Year")
+
+    salaries = python.groupby("Year")["AnnualSalary"]
+    pd.testing.assert_series_equal(result["respondents"], python.groupby("Year").size(), check_names=False)
+    pd.testing.assert_series_equal(result["salary_count"], salaries.count(), check_names=False)
+    np.testing.assert_allclose(result["salary_mean"], salaries.mean(), rtol=1e-9)
+    np.testing.assert_allclose(result["salary_std"], salaries.std(), rtol=1e-6)
+    np.testing.assert_array_equal(result["salary_max"], salaries.max())
+    # The median comes from the sketch, within its relative accuracy of a sample median
+    low, high = salaries.quantile(0.5, interpolation="lower"), salaries.quantile(0.5, interpolation="higher")
+    assert (result["salary_p50"] >= low * (1 - SKETCH_ACCURACY)).all()
+    assert (result["salary_p50"] <= high * (1 + SKETCH_ACCURACY)).all()
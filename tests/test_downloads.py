@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lussi.downloads import DownloadCache
+
+BODY = b"Year,Country\n" + b"2023,Canada\n" * 1000
+ETAG = f'"{hashlib.md5(BODY).hexdigest()}"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves BODY with an MD5 ETag, honouring Range like S3: 416 for a range past the end,
+    and If-None-Match: 304 when the client already holds BODY.
+    """
+    requests = []
+    statuses = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        RangeHandler.requests.append(range_header)
+        if not range_header and self.headers.get("If-None-Match") == ETAG:
+            RangeHandler.statuses.append(304)
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(BODY):
+                RangeHandler.statuses.append(416)
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(BODY)}")
+                self.end_headers()
+                return
+            RangeHandler.statuses.append(206)
+            self.send_response(206)
+            body = BODY[start:]
+        else:
+            RangeHandler.statuses.append(200)
+            self.send_response(200)
+            body = BODY
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RangeHandler.requests = []
+    RangeHandler.statuses = []
+    yield f"http://127.0.0.1:{server.server_port}/y=2023/survey_results_public.csv"
+    server.shutdown()
+
+
+def test_complete_partial_download_is_recovered(tmp_path, server_url):
+    cache = DownloadCache(str(tmp_path))
+    # A run that received every byte but was killed before moving the file into place
+    partial_path = cache._partial_path(server_url)
+    (tmp_path / "partial").mkdir()
+    with open(partial_path, "wb") as f:
+        f.write(BODY)
+    with open(partial_path + ".json", "w") as f:
+        json.dump({"url": server_url, "etag": ETAG, "last_modified": None}, f)
+
+    with open(cache.fetch(server_url), "rb") as f:
+        assert f.read() == BODY
+    assert RangeHandler.requests == [f"bytes={len(BODY)}-", None]
+
+    # The next fetch revalidates the cached copy instead of failing again
+    with open(cache.fetch(server_url), "rb") as f:
+        assert f.read() == BODY
+
+
+def test_interrupted_download_resumes(tmp_path, server_url):
+    cache = DownloadCache(str(tmp_path))
+    partial_path = cache._partial_path(server_url)
+    (tmp_path / "partial").mkdir()
+    with open(partial_path, "wb") as f:
+        f.write(BODY[:100])
+    with open(partial_path + ".json", "w") as f:
+        json.dump({"url": server_url, "etag": ETAG, "last_modified": None}, f)
+
+    with open(cache.fetch(server_url), "rb") as f:
+        assert f.read() == BODY
+    assert RangeHandler.requests == ["bytes=100-"]
+
+
+def test_cached_url_is_revalidated_not_downloaded(tmp_path, server_url):
+    cache = DownloadCache(str(tmp_path))
+    assert cache.entry(server_url) is None
+    path = cache.fetch(server_url)
+    assert RangeHandler.statuses == [200]
+    assert cache.entry(server_url)["etag"] == ETAG
+
+    # A hit sends a conditional GET and serves the same object on 304
+    assert cache.fetch(server_url) == path
+    assert RangeHandler.statuses == [200, 304]
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+
+    offline = DownloadCache(str(tmp_path), offline=True)
+    assert offline.fetch(server_url) == path
+    assert RangeHandler.statuses == [200, 304]
+    with pytest.raises(FileNotFoundError):
+        offline.fetch(server_url.replace("y=2023", "y=2024"))
+    assert RangeHandler.statuses == [200, 304]
@@ -0,0 +1,22 @@
+import pytest
+
+from lussi.benchmark import check_engine_parity
+
+YEARS = [2017, 2020, 2023]
+
+
+def test_engines_write_identical_partitions(tmp_path):
+    # The polars engine is optional at runtime
+    pytest.importorskip("polars")
+    assert check_engine_parity(3000, str(tmp_path), YEARS, missing={2020: ["Ethnicity"]}) == []
+
+
+def test_sharded_transforms_write_identical_partitions(tmp_path):
+    assert check_engine_parity(3000, str(tmp_path), YEARS, engines=["pandas"], transform_workers=2,
+                               shard_rows=400) == []
+
+
+def test_sharded_transforms_without_fork(tmp_path, monkeypatch):
+    monkeypatch.setattr("multiprocessing.get_all_start_methods", lambda: ["spawn"])
+    assert check_engine_parity(3000, str(tmp_path), YEARS, engines=["pandas"], transform_workers=2,
+                               shard_rows=400) == []
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from conftest import SURVEY_YEARS
+from lussi.feature_store import category_features, load_feature_store, numeric_features
+from lussi.stackoverflow import StackType, build_stack, indicator_cols, load_stack
+
+
+def test_features_decode_to_the_wide_stack(survey_prefix, tmp_path):
+    data_dir = str(tmp_path)
+    build_stack(data_dir, years=SURVEY_YEARS, source_prefix=survey_prefix, feature_store=True)
+    wide = load_stack(data_dir, StackType.WIDE)
+    store = load_feature_store(data_dir)
+    assert isinstance(store.matrix, np.memmap) and store.shape[0] == len(wide)
+
+    features = store.to_frame(decode=True)
+    for col in indicator_cols:
+        np.testing.assert_array_equal(features[col].to_numpy(), (wide[col] == "yes").to_numpy())
+    for col in numeric_features:
+        np.testing.assert_allclose(features[col], wide[col].astype(np.float32), rtol=1e-6)
+    for col in category_features:
+        assert features[col].astype(object).where(features[col].notna(), None).tolist() == \
+            wide[col].where(wide[col].notna(), None).tolist(), col
+
+    year = SURVEY_YEARS[-1]
+    np.testing.assert_array_equal(store.year_rows(year)[:, store.columns.index("AnnualSalary")],
+                                  wide.loc[wide["Year"] == year, "AnnualSalary"].astype(np.float32))
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from lussi.frame_cache import FrameCache, frame_cache
+from lussi.stackoverflow import StackType, load_stack, memory_usage_report
+
+
+def test_memory_usage_report_of_cached_load(stack_dir):
+    load_stack(stack_dir, StackType.WIDE)
+    report = memory_usage_report(load_stack(stack_dir, StackType.WIDE))
+    assert report.loc["Total", "MB"] > 0
+    assert frame_cache.info()["hits"] >= 1
+
+
+def test_loads_are_independent_of_the_cache(stack_dir):
+    wide = load_stack(stack_dir, StackType.WIDE)
+    expected = wide["Country"].copy()
+    wide["Country"] = wide["Country"].fillna("Nowhere")
+    wide.loc[0, "Country"] = "Changed"
+    wide["AnnualSalary"] *= 2
+    reloaded = load_stack(stack_dir, StackType.WIDE)
+    pd.testing.assert_series_equal(reloaded["Country"], expected)
+    assert not reloaded["AnnualSalary"].equals(wide["AnnualSalary"])
+
+
+def test_loads_under_copy_on_write(stack_dir):
+    with pd.option_context("mode.copy_on_write", True):
+        wide = load_stack(stack_dir, StackType.WIDE)
+        expected = wide["Country"].copy()
+        wide.loc[0, "Country"] = "Changed"
+        pd.testing.assert_series_equal(load_stack(stack_dir, StackType.WIDE)["Country"], expected)
+
+
+def test_frame_over_the_bound_is_returned_uncopied(tmp_path):
+    file_name = tmp_path / "frame.csv"
+    file_name.write_text("a\n1\n")
+    df = pd.DataFrame({"a": range(1000)})
+    cache = FrameCache(max_bytes=1)
+    assert cache.load(("frame",), str(tmp_path), [str(file_name)], lambda: df) is df
+    assert cache.info()["entries"] == 0
+
+
+def test_shared_loads_skip_the_copy(stack_dir):
+    shared = load_stack(stack_dir, StackType.WIDE, copy=False)
+    assert load_stack(stack_dir, StackType.WIDE, copy=False) is shared
+    assert load_stack(stack_dir, StackType.WIDE) is not shared
+
+
+def test_default_bound_fits_the_wide_stack():
+    # The full wide stack is about 1.55 GB in memory
+    assert FrameCache().max_bytes >= 1.55e9
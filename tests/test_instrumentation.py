@@ -0,0 +1,16 @@
+import pytest
+
+from lussi.instrumentation import run_report
+from lussi.stackoverflow import StackType, build_wide_stack, load_stack
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_wide_transforms_report_each_phase(stack_dir, workers):
+    raw = load_stack(stack_dir, StackType.RAW)
+    with run_report("build_wide_stack") as report:
+        build_wide_stack(raw, workers=workers, shard_rows=400)
+    stages = [(record["stage"], record.get("column")) for record in report.stages]
+    assert stages == [("vectorization", None), ("mutations", None), ("vectorization", "aws")]
+    assert all(record["rows"] == len(raw) for record in report.stages)
+    if workers > 1:
+        assert all(record["shards"] > 1 for record in report.stages)
@@ -0,0 +1,62 @@
+import csv
+import os
+
+import pandas as pd
+import pytest
+
+from lussi.stackoverflow import build_stack, process_year, read_survey, read_survey_batches, survey_schema
+
+YEAR = 2022
+
+
+def write_survey(path, rows, bad_row=None):
+    """
+    Write a survey file whose free-text DevType answers span several lines, as real answers can.
+    """
+    columns = list(survey_schema(YEAR).source_columns())
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(rows):
+            row = {col: "" for col in columns}
+            row.update({"Country": "Canada" if i % 2 else "Germany", "EdLevel": "Master's degree",
+                        "DevType": f"Developer, back-end\nand line {i} of a\nmulti-line answer",
+                        "ConvertedCompYearly": str(50000 + i), "YearsCodePro": str(i % 30)})
+            writer.writerow([row[col] for col in columns])
+            if i == bad_row:
+                f.write("too,few,fields\n")
+
+
+def test_newlines_in_values_across_blocks(tmp_path):
+    path = tmp_path / "survey_results_public.csv"
+    write_survey(path, 5000)
+    block_size = 1 << 16
+    assert os.path.getsize(path) > 4 * block_size
+
+    df = read_survey(str(path), survey_schema(YEAR), block_size=block_size)
+    expected = pd.read_csv(path, usecols=list(df.columns))
+    assert len(df) == 5000
+    assert df["DevType"].tolist() == expected["DevType"].tolist()
+    assert df["ConvertedCompYearly"].tolist() == expected["ConvertedCompYearly"].tolist()
+
+
+def test_build_stack_fails_on_unparsable_year(tmp_path):
+    source_dir = tmp_path / "surveys" / f"y={YEAR}"
+    source_dir.mkdir(parents=True)
+    write_survey(source_dir / "survey_results_public.csv", 100, bad_row=50)
+    data_dir = tmp_path / "data"
+
+    with pytest.raises(RuntimeError, match=str(YEAR)):
+        build_stack(str(data_dir), years=[YEAR], source_prefix=str(tmp_path / "surveys") + os.sep)
+    assert not os.path.exists(data_dir / "merged_stack_raw")
+
+
+def test_process_year_streams_blocks(tmp_path):
+    path = tmp_path / "survey_results_public.csv"
+    write_survey(path, 5000)
+    block_size = 1 << 16
+    assert len(list(read_survey_batches(str(path), survey_schema(YEAR), block_size=block_size))) > 4
+
+    streamed = process_year(YEAR, block_size=block_size, source=str(path))
+    whole = process_year(YEAR, block_size=1 << 30, source=str(path))
+    pd.testing.assert_frame_equal(streamed, whole)
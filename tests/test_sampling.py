@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from conftest import SURVEY_YEARS
+from lussi.stackoverflow import StackType, build_stack, load_stack, sample_data_dir, stratified_sample
+
+ROWS_PER_YEAR = 200
+
+
+def test_sampled_build_is_deterministic(survey_prefix, tmp_path):
+    stacks = []
+    for run in ["first", "second"]:
+        data_dir = str(tmp_path / run)
+        build_stack(data_dir, years=SURVEY_YEARS, source_prefix=survey_prefix, sample=ROWS_PER_YEAR, seed=7)
+        stacks.append(load_stack(sample_data_dir(data_dir, ROWS_PER_YEAR, 7), StackType.RAW, cache=False))
+    pd.testing.assert_frame_equal(stacks[0], stacks[1])
+    assert stacks[0].groupby("Year").size().to_dict() == {year: ROWS_PER_YEAR for year in SURVEY_YEARS}
+
+
+def test_stratified_sample_keeps_each_strata_share():
+    df = pd.DataFrame({"Year": 2023, "Country": np.repeat(["Canada", "Germany", "India"], [500, 300, 200])})
+    sample = stratified_sample(df, 0.1, seed=1)
+    assert sample["Country"].value_counts().to_dict() == {"Canada": 50, "Germany": 30, "India": 20}
+    assert sample.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(stratified_sample(df, 0.1, seed=1), sample)
+    other = stratified_sample(df, 0.1, seed=2)
+    assert not other.index.equals(sample.index)
+    assert other["Country"].value_counts().to_dict() == sample["Country"].value_counts().to_dict()
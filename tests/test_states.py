@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from lussi.states import MISSING_STATE, STATE_CODE_DTYPE, decode_states, encode_states, state_table
+from lussi.stackoverflow import StackType, load_stack
+
+
+def test_state_codes_round_trip():
+    names = [name for name, _ in state_table]
+    abbreviations = [abbreviation for _, abbreviation in state_table]
+    codes = encode_states(pd.Series(names))
+    assert codes.dtype == STATE_CODE_DTYPE
+    np.testing.assert_array_equal(codes, np.arange(len(state_table)))
+    np.testing.assert_array_equal(encode_states(pd.Series(abbreviations)), codes)
+    assert decode_states(codes).tolist() == names
+    assert decode_states(codes, "abbreviation").tolist() == abbreviations
+
+
+def test_variants_and_missing_states():
+    codes = encode_states(pd.Series(["Washington, D.C.", "new york", None, "Atlantis", np.nan, "tx"]))
+    assert codes.dtype == STATE_CODE_DTYPE
+    assert decode_states(codes, "abbreviation")[[0, 1, 5]].tolist() == ["DC", "NY", "TX"]
+    assert codes[[2, 3, 4]].tolist() == [MISSING_STATE] * 3
+    assert pd.isna(decode_states(codes)[[2, 3, 4]]).all()
+
+
+def test_wide_stack_state_codes(stack_dir):
+    wide = load_stack(stack_dir, StackType.WIDE)
+    assert wide["state_code"].dtype == STATE_CODE_DTYPE
+    decoded = pd.Series(decode_states(wide["state_code"]), index=wide.index)
+    known = wide["state_code"] != MISSING_STATE
+    assert known.any()
+    pd.testing.assert_series_equal(decoded[known], wide.loc[known, "US_State"].astype(object), check_names=False)
+    assert wide.loc[~known, "US_State"].isna().all()
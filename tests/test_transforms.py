@@ -0,0 +1,78 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from lussi.stackoverflow import (add_average_columns, aws_entries, cached_extract_and_average, databases,
+                                 extract_and_average, extract_list_cols, extract_vector_cols, indicator_column_name,
+                                 languages, post_build_mutations)
+
+
+def row_matches(series, pattern):
+    # How the indicator columns were computed before match_tokens: re.search over every row
+    return series.apply(lambda x: "yes" if re.search(pattern, str(x), re.IGNORECASE) else "no")
+
+
+def test_match_tokens_agrees_with_searching_every_row():
+    answers = pd.Series(["Python;SQL", "JavaScript;Java", "C++;C;R", "Rust;Ruby", "python;sql", np.nan,
+                         "TypeScript;Go", "Microsoft SQL Server;SQLite", "Scala; Julia ", "PHP", "Swift;Objective-C",
+                         "MySQL;MariaDB;PostgreSQL", "Amazon Web Services (AWS);Linux", "aws", None] * 3)
+    df = pd.DataFrame({"LanguageWorkedWith": answers, "DatabaseWorkedWith": answers, "PlatformWorkedWith": answers})
+    df = extract_vector_cols(df, "LanguageWorkedWith", languages)
+    df = extract_vector_cols(df, "DatabaseWorkedWith", databases)
+    df = extract_list_cols(df, "PlatformWorkedWith", aws_entries)
+
+    for colname, values in [("LanguageWorkedWith", languages), ("DatabaseWorkedWith", databases)]:
+        for value in values:
+            expected = row_matches(answers, fr"\b{re.escape(value)}\b")
+            assert df[indicator_column_name(value)].tolist() == expected.tolist(), value
+    expected = row_matches(answers, fr"\b({'|'.join(aws_entries['aws'])})\b")
+    assert df["aws"].tolist() == expected.tolist()
+
+
+def test_average_columns_agree_with_averaging_every_row():
+    ranges = ["25-34 years old", "Under 18 years old", "Less than 1 year", "More than 50 years", "7", np.nan,
+              "20 to 99 employees", "10,000 or more employees", "Prefer not to say", None]
+    df = pd.DataFrame({"YearsCodePro": ranges * 5, "OrgSize": ranges[::-1] * 5, "Age": ranges * 5})
+    expected = {col: df[col].apply(lambda x: extract_and_average(str(x))).to_numpy() for col in df.columns}
+    cached_extract_and_average.cache_clear()
+
+    df = add_average_columns(df)
+    for col in ["YearsCodePro", "OrgSize", "Age"]:
+        np.testing.assert_array_equal(df[f"{col}Avg"].to_numpy(), expected[col])
+    # Each distinct value is parsed once across all three columns, NaN and None as one missing value
+    assert cached_extract_and_average.cache_info().misses == len(set(value for value in ranges if pd.notna(value))) + 1
+
+
+def test_post_build_mutations_rule_tables():
+    # NaN is a missing answer and None a column the year's survey lacks; the rules tell them apart
+    df = pd.DataFrame({
+        "EdLevel": ["Master’s degree (M.A., M.S.)", "Some college/university study without earning a degree",
+                    np.nan, "Other", None],
+        "Sexuality": ["Straight / Heterosexual", "Bisexual", np.nan, "Other", None],
+        "Ethnicity": ["White or of European descent", "Prefer not to say", np.nan, "Hispanic or Latino/a", None],
+        "Gender": ["Woman", "Man", np.nan, "Non-binary", None],
+        "Employment": ["Employed full-time", "Independent contractor, freelancer, or self-employed", np.nan,
+                       "Student", None],
+        "Country": ["United States of America", "Germany", np.nan, "South America", None]
+    })
+    # The results of the row-wise np.select/np.where code the rule tables replaced
+    expected = {
+        "EdLevel": ["Masters", "Some College", "nan", "Other", "None"],
+        "Gender": ["Female", "Male", np.nan, "Non-binary", None],
+        "Employment": ["Full-Time", "Self-Employed", np.nan, "Student", None],
+        "Country": ["United States", "Germany", np.nan, "United States", None],
+        "sexuality_grouped": ["straight", "lgbtq", "nan", "nan", "nan"],
+        "ethnicity_grouped": ["non-minority", "nan", "nan", "minority", "minority"]
+    }
+
+    def spelled(values):
+        return [value if isinstance(value, str) else repr(value) for value in values]
+
+    result = post_build_mutations(df.copy())
+    for col, values in expected.items():
+        assert spelled(result[col]) == spelled(values), col
+    # Every distinct value is classified once, so shuffling the rows shuffles the results
+    shuffled = post_build_mutations(pd.concat([df] * 3, ignore_index=True).iloc[::-1].reset_index(drop=True))
+    for col in expected:
+        assert spelled(shuffled[col]) == spelled(list(result[col]) * 3)[::-1], col
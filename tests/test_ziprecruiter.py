@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+from lussi.benchmark import fixture_salary_page
+from lussi.snapshots import SnapshotStore
+from lussi.ziprecruiter import BASE_URL, SNAPSHOT_DIR, build_zip, load_zip, parse_salary_table, process_job_urls
+
+JOB_URLS = [("Data-Engineer-Salary-by-State", "Data Engineer"), ("Statistician-Salary-by-State", "Statistician")]
+
+
+def save_fixture_pages(snapshot_dir):
+    snapshots = SnapshotStore(snapshot_dir)
+    for url_suffix, _ in JOB_URLS:
+        snapshots.save(BASE_URL + url_suffix, fixture_salary_page)
+    return snapshots
+
+
+def test_process_job_urls_reads_snapshots(tmp_path):
+    snapshots = save_fixture_pages(str(tmp_path / "snapshots"))
+    df = process_job_urls(JOB_URLS, snapshots=snapshots, offline=True)
+    assert df["Job Title"].tolist() == ["Data Engineer"] * 2 + ["Statistician"] * 2
+    assert df["State"].tolist() == ["New York", "Texas"] * 2
+
+
+def test_build_zip_offline_from_fixture_pages(tmp_path):
+    data_dir = str(tmp_path)
+    save_fixture_pages(os.path.join(data_dir, SNAPSHOT_DIR))
+    report = build_zip(data_dir, job_urls=JOB_URLS + [("Missing-Salary-by-State", "Missing")], offline=True)
+    assert report.params["failed_titles"] == ["Missing"]
+    df = load_zip(data_dir)
+    assert df["Annual Salary"].tolist() == [120000, 100500] * 2
+    assert df["Abbreviation"].tolist() == ["NY", "TX"] * 2
+
+
+def read_fixture_page(name):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_parse_salary_table_from_saved_page():
+    df = parse_salary_table(read_fixture_page("ziprecruiter_salary_page.html"), "Data Engineer")
+    assert df.columns.tolist() == ["State", "Annual Salary", "Monthly Pay", "Weekly Pay", "Hourly Wage", "Job Title"]
+    # Only the first table is read, rows whose end tags are left out included, and text is unescaped
+    assert df["State"].tolist() == ["New York", "Washington", "Washington, D.C.", "Texas"]
+    assert df["Annual Salary"].tolist() == ["$134,823", "$131,592", "$124,021", "$118,560"]
+    assert df["Hourly Wage"].tolist() == ["$64.82", "$63.27", "$59.63", "$57.00"]
+    assert (df["Job Title"] == "Data Engineer").all()
+
+    with pytest.raises(Exception, match="No table found"):
+        parse_salary_table("<html><body><p>No salaries</p></body></html>", "Data Engineer")
+
+
+def test_build_zip_reuses_fresh_snapshots(tmp_path):
+    data_dir = str(tmp_path)
+    fetched = []
+
+    async def fetch_page(url):
+        fetched.append(url)
+        return fixture_salary_page
+
+    build_zip(data_dir, job_urls=JOB_URLS, fetch_page=fetch_page, requests_per_second=1000)
+    assert sorted(fetched) == sorted(BASE_URL + url_suffix for url_suffix, _ in JOB_URLS)
+    first = load_zip(data_dir)
+
+    # Within the TTL the pages are parsed from their snapshots instead of fetched
+    build_zip(data_dir, job_urls=JOB_URLS, fetch_page=fetch_page, requests_per_second=1000)
+    assert len(fetched) == 2
+    pd.testing.assert_frame_equal(load_zip(data_dir, cache=False), first)
+
+    build_zip(data_dir, job_urls=JOB_URLS, fetch_page=fetch_page, requests_per_second=1000, snapshot_ttl=0)
+    assert len(fetched) == 4